@@ -1,6 +1,10 @@
+import asyncio
 import json
 import logging
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
+from assistant import llm_client
+from assistant.history import new_conversation_id, valid_conversation_id
 from assistant.llm_client import AIService
 
 logger = logging.getLogger(__name__)
@@ -8,13 +12,25 @@ logger = logging.getLogger(__name__)
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope.get("user")
-        self.service = AIService(user=self.user)
+        # ?conversation=<id> continues a stored conversation after a reconnect.
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        conversation = (query.get("conversation") or [None])[0]
+        self.conversation = conversation if valid_conversation_id(conversation) else new_conversation_id()
+        self.service = AIService(user=self.user, conversation_id=self.conversation)
+        self.replies = set()
+        # One reply at a time per socket keeps the chat history in order.
+        self.reply_lock = asyncio.Lock()
         await self.accept()
         await self.send(text_data=json.dumps({
             'type': 'connection_established',
-            'message': f"<p>Connected as <b>{getattr(self.user, 'username', 'anonymous')}</b></p>"
+            'message': f"<p>Connected as <b>{getattr(self.user, 'username', 'anonymous')}</b></p>",
+            'conversation': self.conversation,
         }))
 
+    async def disconnect(self, code):
+        for task in self.replies:
+            task.cancel()
+
     async def receive(self, text_data):
         try:
             payload = json.loads(text_data)
@@ -24,17 +40,44 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'type': 'chat',
                 'message': f"<p>You: {user_msg}</p>"
             }))
+        except Exception as e:
+            logger.error(f"WS receive error: {e}")
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': f"<p>Error: {e}</p>"
+            }))
+            return
+
+        # Answer in a task so this consumer keeps reading the socket: further
+        # messages are accepted and a disconnect cancels the upstream call.
+        task = asyncio.create_task(self.reply(user_msg))
+        self.replies.add(task)
+        task.add_done_callback(self.replies.discard)
 
-            from asgiref.sync import sync_to_async
-            chat_answer = await sync_to_async(self.service.get_response)(user_msg)
+    async def reply(self, user_msg):
+        try:
+            async with self.reply_lock, llm_client.LLM_SLOTS:
+                chunks = []
+                # Partial text is forwarded as it arrives; the closing 'chat'
+                # frame still carries the whole answer.
+                async for kind, text in self.service.astream_response(user_msg):
+                    if kind == "error":
+                        await self.send(text_data=json.dumps({'type': 'error', 'message': text}))
+                        return
+                    if kind == "text":
+                        chunks.append(text)
+                    await self.send(text_data=json.dumps({
+                        'type': 'chat_chunk' if kind == "text" else 'chat_tool',
+                        'message': text
+                    }))
 
             await self.send(text_data=json.dumps({
                 'type': 'chat',
-                'message': f"<p>Chat: {chat_answer}</p>"
+                'message': f"<p>Chat: {''.join(chunks)}</p>"
             }))
         except Exception as e:
-            logger.error(f"WS receive error: {e}")
+            logger.error(f"WS reply error: {e}")
             await self.send(text_data=json.dumps({
                 'type': 'error',
                 'message': f"<p>Error: {e}</p>"
-            }))
\ No newline at end of file
+            }))
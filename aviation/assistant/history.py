@@ -0,0 +1,156 @@
+import hashlib
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.html import strip_tags
+from google.genai import types
+
+HISTORY_KEY = "assistant:history:{}:{}"
+TOOLS_KEY = "assistant:tools:{}:{}:{}:{}"
+CONVERSATION_ID = re.compile(r"^[\w-]{1,64}$")
+SUMMARY_PROMPT = (
+    "Summarize this conversation between a user and an airline booking assistant "
+    "in at most 120 words. Keep airports, dates, flight numbers, ticket ids, prices "
+    "and what the user still wants; drop pleasantries.\n\n"
+)
+
+
+def new_conversation_id():
+    return uuid.uuid4().hex
+
+
+def valid_conversation_id(value):
+    return isinstance(value, str) and bool(CONVERSATION_ID.match(value))
+
+
+def user_scope(user):
+    return f"user:{user.pk}" if getattr(user, "is_authenticated", False) else "anonymous"
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for Gemini; exact counts cost an API call.
+    return len(text) // 4 + 1
+
+
+class ConversationHistory:
+    """
+    Turns of one assistant conversation, kept within a token budget.
+
+    With a ``conversation_id`` the history is stored in the cache under the
+    user's scope, so any worker can continue it and it survives reconnects;
+    without one it lives only as long as the object. Only the question and the
+    final answer of each turn are kept. Once the turns outgrow
+    ``ASSISTANT_HISTORY_TOKENS`` the oldest ones are folded into a short summary
+    that opens the history sent to the model.
+    """
+
+    def __init__(self, user, conversation_id=None):
+        self.key = HISTORY_KEY.format(user_scope(user), conversation_id) if conversation_id else None
+        self.budget = settings.ASSISTANT_HISTORY_TOKENS
+        self.summary = ""
+        self.turns = []
+
+    def __bool__(self):
+        return bool(self.summary or self.turns)
+
+    def restore(self, state):
+        if state:
+            self.summary = state["summary"]
+            self.turns = [tuple(turn) for turn in state["turns"]]
+
+    def state(self):
+        return {"summary": self.summary, "turns": self.turns}
+
+    def load(self):
+        if self.key:
+            self.restore(cache.get(self.key))
+
+    def save(self):
+        if self.key:
+            cache.set(self.key, self.state(), settings.ASSISTANT_HISTORY_TIMEOUT)
+
+    async def aload(self):
+        if self.key:
+            self.restore(await cache.aget(self.key))
+
+    async def asave(self):
+        if self.key:
+            await cache.aset(self.key, self.state(), settings.ASSISTANT_HISTORY_TIMEOUT)
+
+    def add(self, question, answer):
+        self.turns.append((question, answer))
+
+    def tokens(self):
+        return estimate_tokens(self.summary) + sum(
+            estimate_tokens(question) + estimate_tokens(answer) for question, answer in self.turns
+        )
+
+    def overflow(self):
+        """Number of oldest turns to fold so the rest fits the budget; the latest turn always stays."""
+        excess = self.tokens() - self.budget
+        count = 0
+        while excess > 0 and count < len(self.turns) - 1:
+            question, answer = self.turns[count]
+            excess -= estimate_tokens(question) + estimate_tokens(answer)
+            count += 1
+        return count
+
+    def summary_prompt(self, count):
+        lines = [f"Earlier summary: {self.summary}"] if self.summary else []
+        for question, answer in self.turns[:count]:
+            lines += [f"User: {question}", f"Assistant: {strip_tags(answer)}"]
+        return SUMMARY_PROMPT + "\n".join(lines)
+
+    def fold(self, count, summary):
+        # Capped so a verbose summary cannot take over the budget.
+        self.summary = (summary or "").strip()[:self.budget * 2]
+        self.turns = self.turns[count:]
+
+    def contents(self):
+        contents = []
+        if self.summary:
+            contents += [
+                types.Content(role="user", parts=[types.Part(text=f"Summary of our conversation so far: {self.summary}")]),
+                types.Content(role="model", parts=[types.Part(text="Understood.")]),
+            ]
+        for question, answer in self.turns:
+            contents += [
+                types.Content(role="user", parts=[types.Part(text=question)]),
+                types.Content(role="model", parts=[types.Part(text=answer)]),
+            ]
+        return contents
+
+
+class ToolResults:
+    """
+    Tool results of one conversation for the current ``version()`` of the data.
+
+    Stored in the cache under the user's scope like the history, so follow-up
+    questions reuse them whichever worker and request serves them; without a
+    ``conversation_id`` they live only as long as the object. Results of an older
+    version are never looked up again and expire with the history.
+    """
+
+    def __init__(self, user, conversation_id, version):
+        self.scope = (user_scope(user), conversation_id) if conversation_id else None
+        self.version = version
+        self.local = {}
+
+    def key(self, call):
+        if not self.scope:
+            return (self.version(), call)
+        digest = hashlib.sha256(repr(call).encode()).hexdigest()
+        return TOOLS_KEY.format(*self.scope, self.version(), digest)
+
+    def get(self, call):
+        key = self.key(call)
+        return cache.get(key) if self.scope else self.local.get(key)
+
+    def set(self, call, result):
+        key = self.key(call)
+        if self.scope:
+            cache.set(key, result, settings.ASSISTANT_HISTORY_TIMEOUT)
+        else:
+            self.local[key] = result
@@ -1,10 +1,17 @@
+import asyncio
 import os
 import datetime
+import functools
 import logging
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 from django.conf import settings
 from google import genai
+from google.genai import types
 from google.genai.types import GenerateContentConfig, AutomaticFunctionCallingConfig
-from .tools import search_flights, get_ticket_details, get_user_orders
+from .history import ConversationHistory, ToolResults
+from .response_cache import ResponseCache, data_version
+from .tools import search_flights, get_ticket_details, get_user_orders, memoized
 
 logger = logging.getLogger("assistant")
 
@@ -12,56 +19,224 @@ PROMPT_PATH = os.path.join(os.path.dirname(__file__), "prompt.txt")
 with open(PROMPT_PATH, "r", encoding="utf-8") as f:
     BASE_PROMPT = f.read()
 
+# Async Gemini calls in flight in this process (chat sockets and SSE streams);
+# callers beyond the cap wait for a slot instead of piling up on the API.
+LLM_SLOTS = asyncio.Semaphore(settings.ASSISTANT_MAX_CONCURRENT_REQUESTS)
+
+TOOLS = [search_flights, get_ticket_details, get_user_orders]
+
+
+def async_tool(func):
+    """
+    Coroutine twin of a sync tool for the aio client. google-genai would run a
+    plain function in a fresh thread; this keeps ORM access on Django's sync
+    thread with connections closed like in any other request.
+    """
+    run = database_sync_to_async(func)
+
+    @functools.wraps(func)
+    async def tool(*args, **kwargs):
+        return await run(*args, **kwargs)
+    return tool
+
+
+MODEL = "gemini-2.5-flash"
+
+
+@functools.lru_cache(maxsize=1)
 def get_client():
+    """
+    Process-wide Gemini client. Its HTTP connection pools are reused by every
+    request instead of paying DNS, TCP and TLS setup for each question.
+    """
     api_key = settings.GEMINI_API_KEY
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY is missing")
-    return genai.Client(api_key=api_key)
+    http_options = types.HttpOptions(base_url=settings.GEMINI_BASE_URL) if settings.GEMINI_BASE_URL else None
+    return genai.Client(api_key=api_key, http_options=http_options)
 
-class AIService:
-    def __init__(self, user):
-        today = datetime.date.today().strftime("%Y-%m-%d")
-        weekday = datetime.date.today().strftime("%A")
-
-        time_context = (
-            f"\nSYSTEM CONTEXT:\n"
-            f"Today is {weekday}, {today}.\n"
-            f"When user says 'next week' or 'tomorrow', calculate dates based on today.\n"
-        )
 
-        username = getattr(user, "username", "guest")
-        email = getattr(user, "email", "guest@example.com")
+@functools.lru_cache(maxsize=1024)
+def get_config(day: datetime.date, username: str, email: str):
+    """
+    Chat config for one user on one day, without tools.
 
-        user_context = (
-            "\n--- CURRENT USER CONTEXT ---\n"
-            f"Username: {username}\n"
-            f"Email: {email}\n"
-            "------------------------------\n"
-        )
+    The static prompt.txt comes first and the day and user context last, so every
+    request shares the same prefix and Gemini's implicit prefix caching bills it
+    at the cached rate. Explicit context caching does not fit here: the prompt is
+    below the model's minimum cacheable size, and cached content cannot be
+    combined with the per-request tools automatic function calling needs.
+    """
+    time_context = (
+        f"\nSYSTEM CONTEXT:\n"
+        f"Today is {day.strftime('%A')}, {day.strftime('%Y-%m-%d')}.\n"
+        f"When user says 'next week' or 'tomorrow', calculate dates based on today.\n"
+    )
 
-        system_instruction = BASE_PROMPT + time_context + user_context
+    user_context = (
+        "\n--- CURRENT USER CONTEXT ---\n"
+        f"Username: {username}\n"
+        f"Email: {email}\n"
+        "------------------------------\n"
+    )
+
+    return AIService.build_config(BASE_PROMPT + time_context + user_context)
 
+class AIService:
+    """
+    Answers questions in one conversation. A chat is opened per question from
+    the stored history, so the history, not this object, is the source of truth
+    and any worker can serve the next question.
+    """
+
+    def __init__(self, user, conversation_id=None):
+        self.user = user
         self.client = get_client()
-        self.config = GenerateContentConfig(
-            tools=[search_flights, get_ticket_details, get_user_orders],
+        # Tool results for this conversation, reused across its questions while the
+        # data is unchanged, so repeated calls skip the database.
+        tools = memoized(TOOLS, ToolResults(user, conversation_id, data_version))
+        config = get_config(
+            datetime.date.today(),
+            getattr(user, "username", "guest"),
+            getattr(user, "email", "guest@example.com"),
+        )
+        # Copies: the SDK writes request headers into the config it is given.
+        self.config = config.model_copy(update={"tools": tools})
+        self.async_config = config.model_copy(update={"tools": [async_tool(tool) for tool in tools]})
+        self.history = ConversationHistory(user, conversation_id)
+
+    @staticmethod
+    def build_config(system_instruction):
+        return GenerateContentConfig(
             automatic_function_calling=AutomaticFunctionCallingConfig(
                 disable=False,
                 maximum_remote_calls=3,
             ),
             system_instruction=system_instruction,
         )
-        self.chat = self.client.chats.create(
-            model="gemini-2.5-flash",
-            config=self.config,
-        )
+
+    def response_cache(self, user_message: str):
+        """ResponseCache for the opening question; follow-ups depend on the conversation."""
+        if self.history:
+            return None
+        return ResponseCache(self.user, user_message)
 
     def get_response(self, user_message: str) -> str:
+        self.history.load()
+        cached = self.response_cache(user_message)
+        answer = cached.get() if cached else None
+        if answer is None:
+            chat = self.client.chats.create(model=MODEL, config=self.config, history=self.history.contents())
+            try:
+                response = chat.send_message(user_message)
+                log_usage(response)
+            except Exception:
+                logger.exception("LLM error")
+                return "<p>LLM service temporarily unavailable.</p>"
+            answer = response.text
+            if cached:
+                cached.set(answer, called_tools(response))
+        self.history.add(user_message, answer)
+        self.compact()
+        self.history.save()
+        return answer
+
+    async def astream_response(self, user_message: str):
+        """
+        Yields ("text", chunk) as the answer is generated, ("tool", name) after the
+        model called a tool and before it answers with the result, and a final
+        ("error", message) if the call fails midway. A cached answer comes as one chunk.
+        """
+        await self.history.aload()
+        cached = self.response_cache(user_message)
+        answer = await sync_to_async(cached.get)() if cached else None
+        if answer is not None:
+            yield "text", answer
+        else:
+            chat = self.client.aio.chats.create(
+                model=MODEL, config=self.async_config, history=self.history.contents(),
+            )
+            chunks, tools = [], set()
+            try:
+                async for chunk in await chat.send_message_stream(user_message):
+                    for kind, text in chunk_events(chunk):
+                        (chunks.append if kind == "text" else tools.add)(text)
+                        yield kind, text
+            except Exception:
+                logger.exception("LLM stream error")
+                yield "error", "<p>LLM service temporarily unavailable.</p>"
+                return
+            answer = "".join(chunks)
+            if cached:
+                await sync_to_async(cached.set)(answer, tools)
+        self.history.add(user_message, answer)
+        await self.acompact()
+        await self.history.asave()
+
+    async def aget_response(self, user_message: str) -> str:
+        """Non-blocking get_response; cancelling the caller aborts the upstream request."""
+        chunks = []
+        async for kind, text in self.astream_response(user_message):
+            if kind == "error":
+                return text
+            if kind == "text":
+                chunks.append(text)
+        return "".join(chunks)
+
+    def compact(self):
+        """Folds the turns over the history budget into its summary."""
+        count = self.history.overflow()
+        if not count:
+            return
+        summary = self.history.summary
+        try:
+            response = self.client.models.generate_content(model=MODEL, contents=self.history.summary_prompt(count))
+            log_usage(response)
+            summary = response.text
+        except Exception:
+            # Dropping the oldest turns still keeps the prompt bounded.
+            logger.exception("History summary failed")
+        self.history.fold(count, summary)
+
+    async def acompact(self):
+        count = self.history.overflow()
+        if not count:
+            return
+        summary = self.history.summary
         try:
-            response = self.chat.send_message(user_message)
-            return response.text
+            response = await self.client.aio.models.generate_content(
+                model=MODEL, contents=self.history.summary_prompt(count),
+            )
+            log_usage(response)
+            summary = response.text
         except Exception:
-            logger.exception("LLM error")
-            return "<p>LLM service temporarily unavailable.</p>"
+            logger.exception("History summary failed")
+        self.history.fold(count, summary)
+
+def called_tools(response):
+    return {
+        part.function_call.name
+        for content in response.automatic_function_calling_history or []
+        for part in content.parts or []
+        if part.function_call
+    }
+
+def log_usage(response):
+    usage = response.usage_metadata
+    if usage is not None:
+        logger.info("LLM tokens: prompt=%s cached=%s output=%s", usage.prompt_token_count,
+                    usage.cached_content_token_count, usage.candidates_token_count)
+
+def chunk_events(chunk):
+    """Yields ("text", str) and ("tool", name) for the parts of a streamed chunk."""
+    for candidate in chunk.candidates or []:
+        if candidate.content is None:
+            continue
+        for part in candidate.content.parts or []:
+            if part.function_call:
+                yield "tool", part.function_call.name
+            elif part.text:
+                yield "text", part.text
 
 def stream_response(prompt: str):
     client = get_client()
@@ -72,10 +247,9 @@ def stream_response(prompt: str):
 
     for chunk in response:
         try:
-            for candidate in chunk.candidates or []:
-                for part in candidate.content.parts or []:
-                    if hasattr(part, "text") and part.text:
-                        yield part.text
+            for kind, text in chunk_events(chunk):
+                if kind == "text":
+                    yield text
         except Exception:
             logger.exception("Stream chunk parse failed")
             continue
\ No newline at end of file
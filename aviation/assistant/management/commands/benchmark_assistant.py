@@ -0,0 +1,42 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from assistant.llm_client import AIService, get_client, get_config
+from assistant.stub_llm import stub_gemini_server
+
+
+def percentile(timings, share):
+    return sorted(timings)[min(len(timings) - 1, int(len(timings) * share))]
+
+
+class Command(BaseCommand):
+    help = "Measure per-question client overhead of the assistant against a local stub Gemini server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--delay-ms", type=float, default=0, help="Simulated model latency of the stub.")
+
+    def handle(self, *args, **options):
+        with stub_gemini_server(delay=options["delay_ms"] / 1000) as url, \
+                override_settings(GEMINI_API_KEY="stub", GEMINI_BASE_URL=url):
+            for mode, fresh in (("new client per request", True), ("pooled client", False)):
+                get_client.cache_clear()
+                get_config.cache_clear()
+                AIService(AnonymousUser()).get_response("warm up")
+                timings = []
+                for _ in range(options["requests"]):
+                    if fresh:
+                        # What every request paid before the client and configs were shared.
+                        get_client.cache_clear()
+                        get_config.cache_clear()
+                    started = time.perf_counter()
+                    AIService(AnonymousUser()).get_response("Flights from Lviv to Krakow tomorrow")
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"{mode:<24} mean {sum(timings) / len(timings):7.2f} ms  "
+                    f"p50 {percentile(timings, 0.5):7.2f} ms  p95 {percentile(timings, 0.95):7.2f} ms"
+                )
+        get_client.cache_clear()
@@ -0,0 +1,89 @@
+import hashlib
+import re
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.cache import get_version, incr
+
+ANSWER_KEY = "assistant:answer:{}"
+STATS_KEY = "assistant:cache:{}"
+# Answers built from these tools are about the asking user and never shared.
+PERSONAL_TOOLS = {"get_user_orders"}
+DATA_SETS = ("flights", "inventory")
+
+
+def data_version():
+    """Changes whenever flights or seat inventory, and so bookings, change."""
+    return ".".join(str(get_version(name)) for name in DATA_SETS)
+
+
+def normalize_prompt(prompt):
+    """Case, punctuation and whitespace-insensitive form of a question."""
+    text = unicodedata.normalize("NFKC", prompt).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+class ResponseCache:
+    """
+    Cached assistant answer for one question.
+
+    Keys combine the normalized prompt, the day relative dates resolve against,
+    a scope and the current flight and inventory data versions, so any schedule,
+    booking or payment change makes older answers unreachable. Answers that used
+    no personal tool and do not mention the user are stored in the shared
+    "public" scope; the rest only for the asking user.
+    """
+
+    def __init__(self, user, prompt, day=None):
+        self.prompt = normalize_prompt(prompt)
+        self.day = day or timezone.localdate()
+        authenticated = getattr(user, "is_authenticated", False)
+        self.user_scope = f"user:{user.pk}" if authenticated else "anonymous"
+        self.identifiers = [value for value in (getattr(user, "username", ""), getattr(user, "email", "")) if value]
+        self.version = None
+        self.started = None
+
+    def key(self, scope):
+        raw = "|".join([self.prompt, self.day.isoformat(), scope, self.version])
+        return ANSWER_KEY.format(hashlib.sha256(raw.encode()).hexdigest())
+
+    def get(self):
+        self.version = data_version()
+        keys = [self.key(self.user_scope), self.key("public")]
+        found = cache.get_many(keys)
+        for key in keys:
+            if key in found:
+                incr(STATS_KEY.format("hit"))
+                incr(STATS_KEY.format("saved_ms"), found[key]["latency_ms"])
+                return found[key]["answer"]
+        incr(STATS_KEY.format("miss"))
+        self.started = time.perf_counter()
+        return None
+
+    def set(self, answer, tools):
+        if self.started is None or not answer:
+            return
+        personal = PERSONAL_TOOLS & set(tools) or any(value in answer for value in self.identifiers)
+        latency_ms = round((time.perf_counter() - self.started) * 1000)
+        cache.set(
+            self.key(self.user_scope if personal else "public"),
+            {"answer": answer, "latency_ms": latency_ms},
+            settings.ASSISTANT_CACHE_TIMEOUT,
+        )
+
+
+def stats():
+    values = cache.get_many([STATS_KEY.format(name) for name in ("hit", "miss", "saved_ms")])
+    hits, misses, saved_ms = (values.get(STATS_KEY.format(name), 0) for name in ("hit", "miss", "saved_ms"))
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 4) if lookups else None,
+        "saved_ms": saved_ms,
+        "avg_saved_ms": round(saved_ms / hits) if hits else None,
+    }
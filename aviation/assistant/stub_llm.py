@@ -0,0 +1,66 @@
+"""
+Local stand-in for the Gemini generateContent API, used by tests and by the
+benchmark_assistant command to measure client overhead without the network.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_ANSWER = "<p>Stub answer.</p>"
+
+
+def stub_response(text):
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+        }],
+        "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1, "totalTokenCount": 2},
+    }
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    delay = 0.0
+    requests = None
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.requests is not None:
+            self.requests.append((self.path, body))
+        time.sleep(self.delay)
+
+        if ":streamGenerateContent" in self.path:
+            payload = b"".join(
+                b"data: " + json.dumps(stub_response(STUB_ANSWER[start:start + 6])).encode() + b"\r\n\r\n"
+                for start in range(0, len(STUB_ANSWER), 6)
+            )
+            content_type = "text/event-stream"
+        else:
+            payload = json.dumps(stub_response(STUB_ANSWER)).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def stub_gemini_server(delay=0.0, requests=None):
+    """Yields the base URL of a stub server answering every prompt with STUB_ANSWER."""
+    handler = type("Handler", (StubGeminiHandler,), {"delay": delay, "requests": requests})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,417 @@
+import asyncio
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from assistant import consumers, llm_client, views
+from assistant.history import ConversationHistory, ToolResults
+from assistant.llm_client import BASE_PROMPT, AIService, get_client, get_config
+from assistant.response_cache import ResponseCache, data_version, normalize_prompt, stats
+from assistant.stub_llm import STUB_ANSWER, stub_gemini_server
+from assistant.tools import get_ticket_details, get_user_orders, memoized, search_flights
+from core.cache import bump_version
+from core.inventory import refresh_flight_inventory
+from core.models import Ticket
+from core.tests import ConstantQueriesMixin, create_flight, fresh_resolver
+from orders.booking import book_tickets
+
+
+class ToolQueryCountTests(ConstantQueriesMixin, TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="u", email="u@example.com", password="x")
+        self.flight = create_flight("TA0")
+        self.flights = iter(range(1, 100))
+        self.grow()
+        fresh_resolver()
+
+    def grow(self):
+        for _ in range(2):
+            flight = create_flight(f"TA{next(self.flights)}", departure=self.flight.departure_time)
+            tickets = [
+                Ticket.objects.create(flight=flight, seat_number=seat, price=Decimal("10.00"))
+                for seat in ("1A", "1B", "1C")
+            ]
+            book_tickets(self.user, [tickets[0].id, tickets[1].id], payment_method="card")
+
+    def test_search_flights(self):
+        self.assertConstantQueries(lambda: search_flights("KRK", "Lviv"), self.grow)
+
+    def test_get_user_orders(self):
+        self.assertConstantQueries(lambda: get_user_orders("U@example.com"), self.grow)
+
+    def test_get_ticket_details(self):
+        self.assertConstantQueries(lambda: get_ticket_details(self.flight.id), self.grow)
+
+
+class ToolPayloadTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="u", email="u@example.com", password="x")
+        self.flight = create_flight("TA1")
+        tickets = [
+            Ticket.objects.create(flight=self.flight, seat_number=seat, price=Decimal(price), cabin=cabin)
+            for seat, price, cabin in (("1A", "90.00", "business"), ("10A", "20.00", "economy"),
+                                       ("10B", "25.50", "economy"), ("10C", "30.00", "economy"))
+        ]
+        self.order = book_tickets(self.user, [tickets[3].id], payment_method="card")
+        fresh_resolver()
+
+    def test_search_flights(self):
+        with self.assertNumQueries(1):
+            flights = search_flights("Krakow", "LWO")
+        self.assertEqual([flight.model_dump(mode="json") for flight in flights], [{
+            "id": self.flight.id, "number": "TA1", "origin": "Lviv", "destination": "Krakow",
+            "departs": self.flight.departure_time.strftime("%Y-%m-%d %H:%M"),
+            "arrives": self.flight.arrival_time.strftime("%Y-%m-%d %H:%M"),
+            "seats": 3, "min_price": "32.00",
+        }])
+        self.assertEqual(search_flights("Paris"), [])
+
+        # The quoted fare is what booking the cheapest seat charges.
+        cheapest = Ticket.objects.get(flight=self.flight, seat_number="10A")
+        order = book_tickets(self.user, [cheapest.id], payment_method="card")
+        self.assertEqual(order.amount, flights[0].min_price)
+
+    def test_get_user_orders(self):
+        with self.assertNumQueries(1):
+            orders = get_user_orders("U@example.com")
+        self.assertEqual([order.model_dump(mode="json") for order in orders], [{
+            "order_id": self.order.id, "status": "pending", "total_price": "48.00", "currency": "USD",
+            "tickets": [{
+                "flight": "Lviv -> Krakow", "date": self.flight.departure_time.date().isoformat(),
+                "seat": "10C", "status": "held", "price": "48.00",
+            }],
+        }])
+
+    def test_get_ticket_details(self):
+        with self.assertNumQueries(1):
+            details = get_ticket_details(self.flight.id)
+        self.assertEqual(details.seats, 3)
+        self.assertEqual(details.model_dump(mode="json")["cabins"], [
+            {"cabin": "business", "seats": 1, "min_price": "117.00", "max_price": "117.00"},
+            {"cabin": "economy", "seats": 2, "min_price": "32.00", "max_price": "40.80"},
+        ])
+        with self.assertRaisesMessage(ValueError, "Flight ID not found."):
+            get_ticket_details(0)
+
+    def test_results_memoized_per_conversation_and_data_version(self):
+        search, = memoized([search_flights], ToolResults(self.user, "c1", data_version))
+        search("Krakow")
+        # A later request of the same conversation reuses them; another conversation does not.
+        search, = memoized([search_flights], ToolResults(self.user, "c1", data_version))
+        with self.assertNumQueries(0):
+            self.assertEqual(search("Krakow")[0].seats, 3)
+        other, = memoized([search_flights], ToolResults(self.user, "c2", data_version))
+        with self.assertNumQueries(1):
+            other("Krakow")
+
+        Ticket.objects.filter(seat_number="10A").update(status=Ticket.Status.BOOKED)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_flight_inventory([self.flight.id])
+        self.assertEqual(search("Krakow")[0].seats, 2)
+
+
+class FakeService:
+    """
+    Stands in for AIService: streams "re: ", then the message once ``release`` is
+    set for "slow" ones, and records cancellations.
+    """
+    release = None
+    cancelled = 0
+    in_flight = 0
+    peak = 0
+
+    def __init__(self, user, conversation_id=None):
+        self.conversations.append(conversation_id)
+
+    async def astream_response(self, message):
+        cls = type(self)
+        cls.in_flight += 1
+        cls.peak = max(cls.peak, cls.in_flight)
+        try:
+            yield "text", "re: "
+            if message == "slow":
+                await cls.release.wait()
+            yield "tool", "search_flights"
+            yield "text", message
+        except asyncio.CancelledError:
+            cls.cancelled += 1
+            raise
+        finally:
+            cls.in_flight -= 1
+
+
+class Socket(ApplicationCommunicator):
+    # channels.testing needs daphne; the consumer only needs the raw ASGI events.
+    def __init__(self, query_string=b""):
+        super().__init__(consumers.ChatConsumer.as_asgi(),
+                         {"type": "websocket", "path": "/ws/assistant/", "query_string": query_string})
+
+    async def connect(self):
+        await self.send_input({"type": "websocket.connect"})
+        return (await self.receive_output(1))["type"] == "websocket.accept"
+
+    async def send_json_to(self, data):
+        await self.send_input({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json_from(self, timeout=1):
+        return json.loads((await self.receive_output(timeout))["text"])
+
+    async def receive_reply(self):
+        frames = []
+        while not frames or frames[-1]["type"] not in ("chat", "error"):
+            frames.append(await self.receive_json_from())
+        return frames
+
+    async def disconnect(self):
+        await self.send_input({"type": "websocket.disconnect", "code": 1000})
+        await self.wait(1)
+
+
+class FakeServiceMixin:
+    def setUp(self):
+        self.service = type("Service", (FakeService,), {})
+        self.service.release = asyncio.Event()
+        self.service.conversations = []
+        for target in (consumers, views):
+            patcher = mock.patch.object(target, "AIService", self.service)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ChatConsumerTests(FakeServiceMixin, SimpleTestCase):
+    async def connect(self, query_string=b""):
+        communicator = Socket(query_string)
+        self.assertTrue(await communicator.connect())
+        self.welcome = await communicator.receive_json_from()
+        return communicator
+
+    async def test_reconnect_continues_conversation(self):
+        first = await self.connect()
+        conversation = self.welcome["conversation"]
+        await first.disconnect()
+        second = await self.connect(f"conversation={conversation}".encode())
+        await second.disconnect()
+        third = await self.connect(b"conversation=../../x")
+        await third.disconnect()
+
+        self.assertEqual(self.service.conversations[:2], [conversation, conversation])
+        self.assertNotIn(self.service.conversations[2], ("../../x", conversation))
+
+    async def ask(self, communicator, message):
+        await communicator.send_json_to({"message": message})
+        self.assertEqual((await communicator.receive_json_from())["message"], f"<p>You: {message}</p>")
+
+    async def test_slow_reply_does_not_block_other_sockets(self):
+        slow, fast = await self.connect(), await self.connect()
+        await self.ask(slow, "slow")
+        await self.ask(fast, "fast")
+
+        self.assertEqual(
+            [(frame["type"], frame["message"]) for frame in await fast.receive_reply()],
+            [("chat_chunk", "re: "), ("chat_tool", "search_flights"), ("chat_chunk", "fast"),
+             ("chat", "<p>Chat: re: fast</p>")],
+        )
+        # The first chunk is on the socket before the rest of the answer exists.
+        self.assertEqual(await slow.receive_json_from(), {"type": "chat_chunk", "message": "re: "})
+        self.service.release.set()
+        self.assertEqual((await slow.receive_reply())[-1]["message"], "<p>Chat: re: slow</p>")
+        await slow.disconnect()
+        await fast.disconnect()
+
+    async def test_disconnect_cancels_upstream_call(self):
+        communicator = await self.connect()
+        await self.ask(communicator, "slow")
+        await communicator.receive_json_from()
+        await communicator.disconnect()
+        await asyncio.sleep(0)
+
+        self.assertEqual(self.service.cancelled, 1)
+
+    async def test_concurrency_cap(self):
+        sockets = [await self.connect() for _ in range(3)]
+        with mock.patch.object(llm_client, "LLM_SLOTS", asyncio.Semaphore(2)):
+            for communicator in sockets:
+                await self.ask(communicator, "slow")
+            await asyncio.sleep(0.05)
+            self.assertEqual(self.service.in_flight, 2)
+
+            self.service.release.set()
+            for communicator in sockets:
+                self.assertEqual((await communicator.receive_reply())[-1]["type"], "chat")
+        self.assertEqual(self.service.peak, 2)
+        for communicator in sockets:
+            await communicator.disconnect()
+
+
+class NaturalLanguageQueryStreamTests(FakeServiceMixin, SimpleTestCase):
+    async def test_server_sent_events(self):
+        self.service.release.set()
+        response = await self.async_client.post(
+            reverse("nl-query"), {"prompt": "to Krakow", "conversation": "c1"}, content_type="application/json",
+            headers={"Accept": "text/event-stream"},
+        )
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        events = [
+            (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+            for block in body.strip().split("\n\n")
+        ]
+        self.assertEqual(events, [
+            ("chunk", {"text": "re: "}),
+            ("tool", {"text": "search_flights"}),
+            ("chunk", {"text": "to Krakow"}),
+            ("done", {"status": "success", "message": "Success", "data": "re: to Krakow", "conversation": "c1"}),
+        ])
+
+
+class StubGeminiMixin:
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.requests = []
+        server = stub_gemini_server(requests=self.requests)
+        url = server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        settings = override_settings(GEMINI_API_KEY="stub", GEMINI_BASE_URL=url)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for cached in (get_client, get_config):
+            cached.cache_clear()
+            self.addCleanup(cached.cache_clear)
+        self.user = SimpleNamespace(username="ann", email="ann@example.com")
+
+
+class GeminiClientReuseTests(StubGeminiMixin, SimpleTestCase):
+    def test_services_share_client_and_config(self):
+        first, second = AIService(self.user), AIService(self.user)
+
+        self.assertIs(first.client, second.client)
+        self.assertEqual(get_config.cache_info().hits, 1)
+        self.assertEqual(first.get_response("hi"), STUB_ANSWER)
+        self.assertEqual(second.get_response("hello"), STUB_ANSWER)
+        path, body = self.requests[-1]
+        self.assertTrue(path.endswith("models/gemini-2.5-flash:generateContent"))
+        self.assertEqual(len(body["contents"]), 1)
+        instruction = body["systemInstruction"]["parts"][0]["text"]
+        self.assertTrue(instruction.startswith(BASE_PROMPT))
+        self.assertIn("ann@example.com", instruction)
+
+    async def test_stream_through_async_client(self):
+        events = [event async for event in AIService(self.user).astream_response("hi")]
+
+        self.assertGreater(len(events), 1)
+        self.assertEqual("".join(text for kind, text in events if kind == "text"), STUB_ANSWER)
+        self.assertIn(":streamGenerateContent", self.requests[-1][0])
+
+
+class ResponseCacheTests(StubGeminiMixin, SimpleTestCase):
+    def test_normalize_prompt(self):
+        self.assertEqual(normalize_prompt("  Flights to  KRAKÓW?! "), normalize_prompt("flights to kraków"))
+        self.assertNotEqual(normalize_prompt("flights to Krakow"), normalize_prompt("flights to Kraków"))
+
+    def test_public_answer_shared_between_users(self):
+        other = SimpleNamespace(username="bob", email="bob@example.com")
+
+        self.assertEqual(AIService(self.user).get_response("Flights to Paris?"), STUB_ANSWER)
+        self.assertEqual(AIService(other).get_response("flights to paris"), STUB_ANSWER)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(stats()["hits"], 1)
+        self.assertEqual(stats()["misses"], 1)
+
+    async def test_stream_served_from_cache(self):
+        await AIService(self.user).aget_response("hi")
+        events = [event async for event in AIService(self.user).astream_response("Hi!")]
+
+        self.assertEqual(events, [("text", STUB_ANSWER)])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_cached_answer_kept_in_history(self):
+        AIService(self.user).get_response("hi")
+        service = AIService(self.user)
+        service.get_response("hi")
+        service.get_response("and tomorrow?")
+
+        self.assertEqual(len(self.requests), 2)
+        contents = self.requests[-1][1]["contents"]
+        self.assertEqual([content["role"] for content in contents], ["user", "model", "user"])
+
+    def test_personal_answers_scoped_to_user(self):
+        ann = SimpleNamespace(pk=1, is_authenticated=True, username="ann", email="ann@example.com")
+        bob = SimpleNamespace(pk=2, is_authenticated=True, username="bob", email="bob@example.com")
+        for tools, answer in (({"get_user_orders"}, "<p>No orders.</p>"), (set(), "<p>Hello ann.</p>")):
+            with self.subTest(answer=answer):
+                first = ResponseCache(ann, answer)
+                first.get()
+                first.set(answer, tools)
+
+                self.assertEqual(ResponseCache(ann, answer).get(), answer)
+                self.assertIsNone(ResponseCache(bob, answer).get())
+
+    def test_data_change_invalidates(self):
+        for name in ("flights", "inventory"):
+            with self.subTest(name=name):
+                first = ResponseCache(self.user, "seats to Rome")
+                first.get()
+                first.set("<p>Plenty.</p>", set())
+                self.assertEqual(ResponseCache(self.user, "seats to Rome").get(), "<p>Plenty.</p>")
+
+                bump_version(name)
+                self.assertIsNone(ResponseCache(self.user, "seats to Rome").get())
+
+
+class ConversationHistoryTests(StubGeminiMixin, SimpleTestCase):
+    def contents(self, request):
+        return [(content["role"], content["parts"][0]["text"]) for content in request[1]["contents"]]
+
+    def test_history_shared_between_services(self):
+        AIService(self.user, conversation_id="c1").get_response("Flights to Rome?")
+        AIService(self.user, conversation_id="c1").get_response("And back?")
+        AIService(self.user, conversation_id="c2").get_response("Hello")
+
+        self.assertEqual(self.contents(self.requests[1]), [
+            ("user", "Flights to Rome?"), ("model", STUB_ANSWER), ("user", "And back?"),
+        ])
+        self.assertEqual(self.contents(self.requests[2]), [("user", "Hello")])
+
+    def test_history_scoped_to_user(self):
+        ann = SimpleNamespace(pk=1, is_authenticated=True, username="ann", email="ann@example.com")
+        bob = SimpleNamespace(pk=2, is_authenticated=True, username="bob", email="bob@example.com")
+        AIService(ann, conversation_id="c1").get_response("My orders?")
+
+        history = ConversationHistory(bob, "c1")
+        history.load()
+        self.assertFalse(history)
+
+    async def test_stream_saves_history(self):
+        await AIService(self.user, conversation_id="c1").aget_response("Flights to Rome?")
+        await AIService(self.user, conversation_id="c1").aget_response("And back?")
+
+        self.assertEqual(len(self.requests[-1][1]["contents"]), 3)
+
+    @override_settings(ASSISTANT_HISTORY_TOKENS=40)
+    def test_old_turns_summarized_within_budget(self):
+        for number in range(6):
+            AIService(self.user, conversation_id="c1").get_response(f"Question {number} about flights to Rome")
+
+        history = ConversationHistory(self.user, "c1")
+        history.load()
+        self.assertLessEqual(history.tokens(), 40)
+        self.assertEqual(history.summary, STUB_ANSWER)
+        self.assertEqual(history.turns[-1][0], "Question 5 about flights to Rome")
+
+        summaries = [body for path, body in self.requests if "systemInstruction" not in body]
+        self.assertTrue(summaries)
+        self.assertIn("Question 0 about flights to Rome", summaries[0]["contents"][0]["parts"][0]["text"])
+        # Later summaries build on the previous one instead of the dropped turns.
+        self.assertIn(f"Earlier summary: {STUB_ANSWER}", summaries[-1]["contents"][0]["parts"][0]["text"])
+        questions = [request for request in self.requests if "systemInstruction" in request[1]]
+        self.assertEqual(self.contents(questions[-1])[0][1], f"Summary of our conversation so far: {STUB_ANSWER}")
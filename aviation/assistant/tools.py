@@ -1,94 +1,183 @@
-import json
+import datetime
+import functools
+from decimal import Decimal
+from typing import Optional
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import CharField, F, JSONField, OuterRef, Q, Value
+from django.db.models.functions import Cast, Coalesce, Concat, JSONObject, TruncDate
 from django.utils import timezone
-from django.db.models import Min, Q
-from core.models import Flight, Ticket
+from pydantic import BaseModel
+from core.airport_resolver import airport_resolver
+from core.models import FareBucket, Flight
 from orders.models import Order
 
-def search_flights(destination: str, departure_city: str = None,
-                   date_from: str = None, date_to: str = None):
+def departure_range(date_from: str = None, date_to: str = None):
+    """
+    Turns inclusive calendar dates into a half-open [start, end) datetime range,
+    so filters hit the departure_time indexes instead of casting every row to a date.
+    """
+    def day_start(day):
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+    if not date_from:
+        return day_start(timezone.localdate()), None
+    first = datetime.date.fromisoformat(date_from)
+    last = datetime.date.fromisoformat(date_to) if date_to else first
+    return day_start(first), day_start(last + datetime.timedelta(days=1))
+
+def matching_airports(place: str):
+    return airport_resolver().resolve(place)
+
+# Tool results are pydantic models: google-genai derives the response schema from
+# them and serializes them without the None fields, which keeps tool turns short.
+class FlightOption(BaseModel):
+    id: int
+    number: str
+    origin: str
+    destination: str
+    departs: str
+    arrives: str
+    seats: int
+    min_price: Optional[Decimal] = None
+
+
+class CabinAvailability(BaseModel):
+    cabin: str
+    seats: int
+    min_price: Decimal
+    max_price: Decimal
+
+
+class FlightSeats(BaseModel):
+    flight_id: int
+    number: str
+    departs: str
+    seats: int
+    cabins: list[CabinAvailability]
+
+
+class OrderTicket(BaseModel):
+    flight: str
+    date: str
+    seat: str
+    status: str
+    price: Decimal
+
+
+class OrderSummary(BaseModel):
+    order_id: int
+    status: str
+    total_price: Decimal
+    currency: str
+    tickets: list[OrderTicket]
+
+
+def minutes(value):
+    return value.strftime("%Y-%m-%d %H:%M")
 
-    flights = Flight.objects.filter(
-        Q(destination__name__icontains=destination) |
-        Q(destination__iata_code__iexact=destination),
-        status=Flight.Status.SCHEDULED
+def search_flights(destination: str, departure_city: str = None,
+                   date_from: str = None, date_to: str = None) -> list[FlightOption]:
+    """Up to 5 scheduled flights to ``destination``, soonest first; an empty list if none match."""
+    destinations = matching_airports(destination)
+    origins = matching_airports(departure_city) if departure_city else None
+    if not destinations or origins == []:
+        return []
+
+    flights = Flight.objects.filter(destination__in=destinations, status=Flight.Status.SCHEDULED)
+    if origins:
+        flights = flights.filter(origin__in=origins)
+
+    start, end = departure_range(date_from, date_to)
+    flights = flights.filter(departure_time__gte=start)
+    if end:
+        flights = flights.filter(departure_time__lt=end)
+
+    rows = flights.order_by("departure_time").values(
+        "id", "number", "departure_time", "arrival_time",
+        origin_name=F("origin__name"), destination_name=F("destination__name"),
+        seats=Coalesce("inventory__available_count", 0), min_price=F("inventory__min_price"),
+    )[:5]
+    return [FlightOption(
+        id=row["id"],
+        number=row["number"],
+        origin=row["origin_name"],
+        destination=row["destination_name"],
+        departs=minutes(row["departure_time"]),
+        arrives=minutes(row["arrival_time"]),
+        seats=row["seats"],
+        min_price=row["min_price"],
+    ) for row in rows]
+
+def get_user_orders(email: str) -> list[OrderSummary]:
+    """The user's 5 latest orders with their tickets; an empty list if there are none."""
+    tickets = JSONBAgg(
+        JSONObject(
+            flight=Concat("tickets__flight__origin__name", Value(" -> "), "tickets__flight__destination__name"),
+            date=Cast(TruncDate("tickets__flight__departure_time"), CharField()),
+            seat="tickets__seat_number",
+            status="tickets__status",
+            # As text: JSON numbers would come back as floats.
+            price=Cast(Coalesce("tickets__fare", "tickets__price"), CharField()),
+        ),
+        filter=Q(tickets__isnull=False),
+        order_by="tickets__id",
+        default=Value([], output_field=JSONField()),
+    )
+    rows = (
+        Order.objects.filter(user__email__iexact=email)
+        .order_by("-created_at")
+        .values("id", "status", "amount", "currency")
+        .annotate(ticket_list=tickets)[:5]
+    )
+    return [OrderSummary(
+        order_id=row["id"],
+        status=row["status"],
+        total_price=row["amount"],
+        currency=row["currency"],
+        tickets=row["ticket_list"],
+    ) for row in rows]
+
+def get_ticket_details(flight_id: int) -> FlightSeats:
+    """Available seats of a flight per cabin with their current fare range."""
+    cabins = (
+        FareBucket.objects.filter(flight=OuterRef("pk"), available_count__gt=0)
+        .annotate(summary=JSONObject(
+            cabin="cabin", seats="available_count",
+            min_price=Cast("min_fare", CharField()), max_price=Cast("max_fare", CharField()),
+        ))
+        .order_by("cabin").values("summary")
+    )
+    row = Flight.objects.filter(id=flight_id).values(
+        "id", "number", "departure_time", cabins=ArraySubquery(cabins),
+    ).first()
+    if row is None:
+        raise ValueError("Flight ID not found.")
+    return FlightSeats(
+        flight_id=row["id"],
+        number=row["number"],
+        departs=minutes(row["departure_time"]),
+        seats=sum(cabin["seats"] for cabin in row["cabins"]),
+        cabins=row["cabins"],
     )
 
-    if departure_city:
-        flights = flights.filter(
-            Q(origin__name__icontains=departure_city) |
-            Q(origin__iata_code__iexact=departure_city)
-        )
-
-    if date_from and date_to:
-        flights = flights.filter(departure_time__date__range=[date_from, date_to])
-    elif date_from:
-        flights = flights.filter(departure_time__date=date_from)
-    else:
-        today = timezone.now().date()
-        flights = flights.filter(departure_time__date__gte=today)
-
-    flights = flights.order_by("departure_time")[:5]
-
-    data = [{
-        "id": f.id,
-        "route": f"{f.origin.name} -> {f.destination.name}",
-        "departure_time": f.departure_time.strftime("%Y-%m-%d %H:%M"),
-        "arrival_time": f.arrival_time.strftime("%Y-%m-%d %H:%M"),
-        "status": f.status,
-    } for f in flights]
-
-    if not data:
-        return "No flights found."
-
-    return json.dumps(data)
-
-def get_user_orders(email: str):
-    orders = Order.objects.filter(user__email__iexact=email).order_by("-created_at")[:5]
-
-    if not orders.exists():
-        return "No orders found."
-
-    data = []
-    for o in orders:
-        tickets_info = [{
-            "flight": f"{t.flight.origin.name} -> {t.flight.destination.name}",
-            "date": t.flight.departure_time.strftime("%Y-%m-%d"),
-            "seat": t.seat_number,
-            "status": t.status,
-            "price": str(t.price)
-        } for t in o.tickets.all()]
-
-        data.append({
-            "order_id": o.id,
-            "status": o.status,
-            "total_price": str(o.amount),
-            "tickets": tickets_info
-        })
-
-    return json.dumps(data)
-
-def get_ticket_details(flight_id: int):
-    try:
-        flight = Flight.objects.get(id=flight_id)
-    except Flight.DoesNotExist:
-        return "Flight ID not found."
-
-    available = Ticket.objects.filter(flight=flight, status="available")
-    total_free = available.count()
-    if total_free == 0:
-        return "No seats available."
-
-    prices = {}
-    min_price = available.aggregate(Min("price"))["price__min"]
-    if min_price:
-        prices["min_price"] = str(min_price)
 
-    response = {
-        "flight_id": flight.id,
-        "available_seats": total_free,
-        "prices": prices
-    }
-    return json.dumps(response)
+def memoized(tools, results):
+    """
+    Wraps tools so a repeated call with the same arguments returns the result
+    ``results``, an assistant.history.ToolResults, has stored for it.
+    """
+    def memoize(tool):
+        @functools.wraps(tool)
+        def wrapper(*args, **kwargs):
+            call = (tool.__name__, args, tuple(sorted(kwargs.items())))
+            result = results.get(call)
+            if result is None:
+                result = tool(*args, **kwargs)
+                results.set(call, result)
+            return result
+        return wrapper
+    return [memoize(tool) for tool in tools]
 
 
 SUGGESTIONS = {
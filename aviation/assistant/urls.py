@@ -1,6 +1,7 @@
 from django.urls import path
-from assistant.views import NaturalLanguageQueryView
+from assistant.views import NaturalLanguageQueryView, ResponseCacheStatsView
 
 urlpatterns = [
     path("nl-query/", NaturalLanguageQueryView.as_view(), name="nl-query"),
+    path("cache-stats/", ResponseCacheStatsView.as_view(), name="assistant-cache-stats"),
 ]
\ No newline at end of file
@@ -1,8 +1,47 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiResponse
+from assistant import llm_client, response_cache
+from assistant.history import new_conversation_id, valid_conversation_id
 from assistant.llm_client import AIService
 
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients negotiate ``Accept: text/event-stream``; the view streams the body itself."""
+    media_type = "text/event-stream"
+    format = "sse"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data)
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def answer_events(service, prompt, conversation):
+    """
+    Server-sent events for one answer: 'chunk' per piece of text, 'tool' when the
+    model called a tool, then 'done' with the whole answer or a single 'error'.
+    """
+    chunks = []
+    async with llm_client.LLM_SLOTS:
+        async for kind, text in service.astream_response(prompt):
+            if kind == "error":
+                yield sse("error", {"status": "error", "message": text})
+                return
+            if kind == "text":
+                chunks.append(text)
+            yield sse("chunk" if kind == "text" else "tool", {"text": text})
+    yield sse("done", {"status": "success", "message": "Success", "data": "".join(chunks),
+                       "conversation": conversation})
+
 @extend_schema(
     tags=["LLM"],
     summary="Natural language query to AirportAPI",
@@ -11,27 +50,49 @@ from assistant.llm_client import AIService
             "type": "object",
             "properties": {
                 "prompt": {"type": "string", "example": "Show flights from Lviv to Krakow tomorrow"},
-                "lang": {"type": "string", "example": "en"}
+                "lang": {"type": "string", "example": "en"},
+                "conversation": {"type": "string", "description": "Id returned by an earlier answer, "
+                                                                   "to ask a follow-up question"},
             },
             "required": ["prompt"]
         }
     },
     responses={
-        200: OpenApiResponse(description="Success response with structured data"),
+        200: OpenApiResponse(description="Success response with structured data, or server-sent "
+                                         "events (chunk, tool, done, error) with Accept: text/event-stream"),
         400: OpenApiResponse(description="Invalid or unknown action"),
         500: OpenApiResponse(description="LLM error or internal failure"),
     },
 )
 class NaturalLanguageQueryView(APIView):
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer]
+
     def post(self, request):
         prompt = request.data.get("prompt")
         if not prompt:
             return Response({"status": "error", "message": "Missing prompt"}, status=400)
+        conversation = request.data.get("conversation") or new_conversation_id()
+        if not valid_conversation_id(conversation):
+            return Response({"status": "error", "message": "Invalid conversation"}, status=400)
 
         try:
-            service = AIService(user=request.user)
+            service = AIService(user=request.user, conversation_id=conversation)
+            if isinstance(request.accepted_renderer, EventStreamRenderer):
+                response = StreamingHttpResponse(answer_events(service, prompt, conversation),
+                                                 content_type="text/event-stream")
+                response["Cache-Control"] = "no-cache"
+                response["X-Accel-Buffering"] = "no"
+                return response
             answer = service.get_response(prompt)
         except Exception as e:
             return Response({"status": "error", "message": str(e)}, status=500)
 
-        return Response({"status": "success", "message": "Success", "data": answer}, status=200)
\ No newline at end of file
+        return Response({"status": "success", "message": "Success", "data": answer,
+                         "conversation": conversation}, status=200)
+
+@extend_schema(tags=['Monitoring'], responses=dict)
+class ResponseCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.stats())
@@ -106,10 +106,13 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 5,
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.IdCursorPagination',
+    'PAGE_SIZE': int(os.getenv("API_PAGE_SIZE", "5")),
 }
 
+# Upper bound for the ?page_size= query parameter on paginated lists
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "100"))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Airport API',
     'DESCRIPTION': 'API for managing flights, tickets, and users',
@@ -196,9 +199,59 @@ STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY", "")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
 STRIPE_SUCCESS_URL = os.getenv("STRIPE_SUCCESS_URL", "http://localhost:8000/payments/success")
 STRIPE_CANCEL_URL = os.getenv("STRIPE_CANCEL_URL", "http://localhost:8000/payments/cancel")
+# Stored webhook events still pending after this long are enqueued again
+STRIPE_EVENT_RETRY_SECONDS = int(os.getenv("STRIPE_EVENT_RETRY_SECONDS", "120"))
+# API host override for the Stripe client, e.g. a local fake server in tests
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "3"))
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", "8"))
+STRIPE_POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", "20"))
+# Transient failures (network, 429, 5xx) are retried this often, backing off with full jitter
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+STRIPE_RETRY_BACKOFF = float(os.getenv("STRIPE_RETRY_BACKOFF", "0.25"))
+# After this many failed calls in a row Stripe calls fail fast for the cooldown, then one probe is let through
+STRIPE_BREAKER_THRESHOLD = int(os.getenv("STRIPE_BREAKER_THRESHOLD", "5"))
+STRIPE_BREAKER_COOLDOWN = int(os.getenv("STRIPE_BREAKER_COOLDOWN", "30"))
+# Payments are reconciled against the checkout sessions Stripe created in this many past hours, that often
+STRIPE_RECONCILE_HOURS = int(os.getenv("STRIPE_RECONCILE_HOURS", "24"))
+
+# Seats stay held for an unpaid order for as long as its checkout session is valid
+TICKET_HOLD_MINUTES = int(os.getenv("TICKET_HOLD_MINUTES", "45"))
+TICKET_HOLD_SWEEP_SECONDS = int(os.getenv("TICKET_HOLD_SWEEP_SECONDS", "60"))
+TICKET_HOLD_SWEEP_BATCH = int(os.getenv("TICKET_HOLD_SWEEP_BATCH", "500"))
+
+# Upper bound for cached fare quotes; repricing a flight drops its quote sooner
+FARE_QUOTE_TIMEOUT = int(os.getenv("FARE_QUOTE_TIMEOUT", "300"))
+# How often flights whose fares reached the next days-to-departure tier are repriced
+FARE_REFRESH_SECONDS = int(os.getenv("FARE_REFRESH_SECONDS", "300"))
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_API_URL = os.getenv("GEMINI_API_URL")
+# API host override for the genai client, e.g. a local stub server in benchmarks
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+# Concurrent Gemini calls per process from the assistant WebSocket consumer
+ASSISTANT_MAX_CONCURRENT_REQUESTS = int(os.getenv("ASSISTANT_MAX_CONCURRENT_REQUESTS", "20"))
+# Upper bound for cached assistant answers; data changes invalidate them sooner
+ASSISTANT_CACHE_TIMEOUT = int(os.getenv("ASSISTANT_CACHE_TIMEOUT", str(60 * 60)))
+# Estimated tokens of conversation history sent with each question; older turns are summarized
+ASSISTANT_HISTORY_TOKENS = int(os.getenv("ASSISTANT_HISTORY_TOKENS", "2000"))
+# Idle time after which a stored assistant conversation expires
+ASSISTANT_HISTORY_TIMEOUT = int(os.getenv("ASSISTANT_HISTORY_TIMEOUT", str(24 * 60 * 60)))
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.redis.RedisCache"),
+        "LOCATION": os.environ.get("CACHE_REDIS_URL", os.environ.get("REDIS_URL", "redis://localhost:6379/1")),
+    }
+}
+
+# URL names served by the async views in core.async_views instead of DRF,
+# e.g. ASYNC_VIEWS=flight-list,flight-detail,flight-availability,airport-lookup
+ASYNC_VIEWS = {name.strip() for name in os.getenv("ASYNC_VIEWS", "").split(",") if name.strip()}
+
+# Reference data (countries, airports, airlines, airplanes) list responses
+REFERENCE_CACHE_TIMEOUT = int(os.getenv("REFERENCE_CACHE_TIMEOUT", str(60 * 60)))
 
 CHANNEL_LAYERS = {
     "default": {
@@ -215,6 +268,24 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Europe/Kyiv"
+CELERY_BEAT_SCHEDULE = {
+    "release-expired-ticket-holds": {
+        "task": "orders.tasks.release_expired_holds",
+        "schedule": TICKET_HOLD_SWEEP_SECONDS,
+    },
+    "enqueue-stuck-stripe-events": {
+        "task": "payments.tasks.enqueue_stuck_stripe_events",
+        "schedule": STRIPE_EVENT_RETRY_SECONDS,
+    },
+    "reconcile-recent-payments": {
+        "task": "payments.tasks.reconcile_recent_payments",
+        "schedule": STRIPE_RECONCILE_HOURS * 60 * 60,
+    },
+    "refresh-stale-fares": {
+        "task": "core.tasks.refresh_stale_fares",
+        "schedule": FARE_REFRESH_SECONDS,
+    },
+}
 
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
@@ -1,9 +1,12 @@
 from django.contrib import admin
-from .models import Country, Airport, Airline, Airplane, Flight, Ticket
+from .models import Country, Airport, AirportAlias, Airline, Airplane, Flight, FlightInventory, SeatMapSection, Ticket
 
 admin.site.register(Country)
 admin.site.register(Airport)
+admin.site.register(AirportAlias)
 admin.site.register(Airline)
 admin.site.register(Airplane)
 admin.site.register(Flight)
-admin.site.register(Ticket)
\ No newline at end of file
+admin.site.register(Ticket)
+admin.site.register(FlightInventory)
+admin.site.register(SeatMapSection)
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+In-memory resolver from free text ("Kraków", "krakow", "KRK", "NYC", "Krakw")
+to airports, for the assistant tools and airport autocomplete.
+
+Every process builds it once from Airport, AirportAlias and Country and keeps
+it until the "airports" data version changes, so a lookup is a few dict
+operations instead of an unindexable name scan.
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from .cache import get_version
+from .models import Airport, AirportAlias
+from .serializers import AirportSerializer
+
+# Letters NFKD does not decompose into a base letter and a combining mark.
+FOLD_TABLE = str.maketrans({"ł": "l", "ø": "o", "đ": "d", "ħ": "h", "ı": "i", "æ": "ae", "œ": "oe", "þ": "th"})
+# How often a process checks whether the airports changed elsewhere.
+VERSION_CHECK_INTERVAL = 1.0
+MIN_SIMILARITY = 0.4
+# Ranks of a match; a lower rank always wins over a better similarity.
+CODE, NAME, COUNTRY, PREFIX, FUZZY = range(5)
+
+
+def fold(text):
+    """Lower-case ASCII-ish form: diacritics, punctuation and extra spaces removed."""
+    text = unicodedata.normalize("NFKD", text.casefold()).translate(FOLD_TABLE)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[\W_]+", " ", text).split())
+
+
+def trigrams(text):
+    """Trigrams of every word padded like pg_trgm, so short words and word starts count."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class AirportResolver:
+    def __init__(self, airports, aliases):
+        self.airports = {}
+        self.codes = {}
+        # Folded term -> (rank, airport ids) for exact matches.
+        self.terms = {}
+        self.by_trigram = defaultdict(set)
+        self.term_trigrams = {}
+
+        for airport in airports:
+            self.airports[airport["id"]] = airport
+            self.codes[airport["iata_code"].upper()] = airport["id"]
+            self.add(airport["iata_code"], airport["id"], CODE)
+            self.add(airport["name"], airport["id"], NAME)
+            # A country name stands for all of its airports, unless it also names an airport.
+            self.add(airport["country"]["name"], airport["id"], COUNTRY)
+        for airport_id, name in aliases:
+            if airport_id in self.airports:
+                self.add(name, airport_id, NAME)
+
+        for term in self.terms:
+            grams = trigrams(term)
+            self.term_trigrams[term] = grams
+            for gram in grams:
+                self.by_trigram[gram].add(term)
+
+    def add(self, text, airport_id, rank):
+        """Makes ``text`` match the airport, unless it already matches others with a better rank."""
+        term = fold(text)
+        if not term:
+            return
+        current = self.terms.get(term)
+        if current is None or rank < current[0]:
+            self.terms[term] = (rank, {airport_id})
+        elif rank == current[0]:
+            current[1].add(airport_id)
+
+    def matches(self, text):
+        """{airport id: (rank, similarity)} for every airport the text may refer to."""
+        query = fold(text)
+        if not query:
+            return {}
+        found = {}
+
+        def offer(ids, rank, similarity):
+            for airport_id in ids:
+                best = found.get(airport_id)
+                if best is None or (rank, -similarity) < (best[0], -best[1]):
+                    found[airport_id] = (rank, similarity)
+
+        if query in self.terms:
+            rank, ids = self.terms[query]
+            offer(ids, rank, 1.0)
+
+        query_grams = trigrams(query)
+        candidates = set()
+        for gram in query_grams:
+            candidates.update(self.by_trigram.get(gram, ()))
+        for term in candidates:
+            if term == query:
+                continue
+            _, ids = self.terms[term]
+            if term.startswith(query) or f" {query}" in f" {term}":
+                offer(ids, PREFIX, len(query) / len(term))
+                continue
+            grams = self.term_trigrams[term]
+            similarity = len(query_grams & grams) / len(query_grams | grams)
+            if similarity >= MIN_SIMILARITY:
+                offer(ids, FUZZY, similarity)
+        return found
+
+    def resolve(self, text, limit=5):
+        """
+        Ids of the airports the text most likely means: all exact matches of the
+        best kind, or else the ``limit`` closest partial or fuzzy matches.
+        """
+        found = self.matches(text)
+        if not found:
+            return []
+        best = min(rank for rank, _ in found.values())
+        ranked = sorted(
+            (airport_id for airport_id, (rank, _) in found.items() if rank == best),
+            key=lambda airport_id: -found[airport_id][1],
+        )
+        return ranked if best < PREFIX else ranked[:limit]
+
+    def by_code(self, code):
+        """Id of the airport with this IATA code, or None."""
+        return self.codes.get(code.strip().upper())
+
+    def autocomplete(self, text, limit=10):
+        """Serialized airports for a partly typed name or code, best first."""
+        found = self.matches(text)
+        ranked = sorted(found, key=lambda airport_id: (
+            found[airport_id][0], -found[airport_id][1], self.airports[airport_id]["name"],
+        ))
+        return [self.airports[airport_id] for airport_id in ranked[:limit]]
+
+
+_lock = threading.Lock()
+_state = {"resolver": None, "version": None, "checked": 0.0}
+
+
+def load():
+    airports = AirportSerializer(Airport.objects.select_related("country").order_by("id"), many=True).data
+    return AirportResolver(airports, AirportAlias.objects.values_list("airport_id", "name"))
+
+
+def airport_resolver():
+    """The process-wide resolver, rebuilt when the airports data version changes."""
+    now = time.monotonic()
+    if _state["resolver"] is not None and now - _state["checked"] < VERSION_CHECK_INTERVAL:
+        return _state["resolver"]
+    with _lock:
+        version = get_version("airports")
+        if _state["resolver"] is None or _state["version"] != version:
+            _state["resolver"] = load()
+            _state["version"] = version
+        _state["checked"] = time.monotonic()
+        return _state["resolver"]
+
+
+def invalidate():
+    """Drops this process's resolver, so the next lookup sees a change committed here at once."""
+    _state["resolver"] = None
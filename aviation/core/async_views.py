@@ -0,0 +1,114 @@
+"""
+Async variants of the read-heavy endpoints, for deployments under uvicorn.
+
+Each one serves GET/HEAD on the same URL and with the same payload as its DRF
+counterpart in core.views and is only routed when its URL name is listed in
+settings.ASYNC_VIEWS; other methods on the URL fall through to the DRF view.
+Authentication is taken from the JWT alone, like the cached reference lists,
+so the only database work is the async ORM queries themselves.
+"""
+import functools
+
+import django_filters
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from .models import Airport, Flight, Ticket
+from .pagination import AsyncFlightCursorPagination
+from .pricing import ticket_fare
+from .serializers import AirportSerializer, FlightAvailabilitySerializer, FlightSerializer
+
+READ_METHODS = ("GET", "HEAD")
+
+
+class FlightFilter(django_filters.FilterSet):
+    # Plain id filters: ModelChoiceFilter validates ids with a synchronous query.
+    origin = django_filters.NumberFilter(field_name='origin_id')
+    destination = django_filters.NumberFilter(field_name='destination_id')
+    airplane = django_filters.NumberFilter(field_name='airplane_id')
+    status = django_filters.ChoiceFilter(choices=Flight.Status.choices)
+    departure_time__gte = django_filters.IsoDateTimeFilter(field_name='departure_time', lookup_expr='gte')
+    departure_time__lt = django_filters.IsoDateTimeFilter(field_name='departure_time', lookup_expr='lt')
+
+    class Meta:
+        model = Flight
+        fields = []
+
+
+def async_api_view(view):
+    """
+    Runs an async view with a DRF Request authenticated from the token and turns
+    API exceptions into DRF-style JSON errors. The view returns response data.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request = Request(request, authenticators=[JWTStatelessUserAuthentication()])
+        try:
+            if not request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            data = await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            detail = {"detail": exc.detail} if isinstance(exc.detail, str) else exc.detail
+            return JsonResponse(detail, status=exc.status_code, safe=False)
+        return JsonResponse(data, safe=False)
+    return wrapper
+
+
+def with_sync_fallback(async_view, sync_view):
+    """Serves reads with ``async_view`` and every other method with the DRF ``sync_view``."""
+    fallback = sync_to_async(sync_view)
+
+    @csrf_exempt
+    async def dispatch(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await async_view(request, *args, **kwargs)
+        return await fallback(request, *args, **kwargs)
+    return dispatch
+
+
+async def aget_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise exceptions.NotFound(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+def flight_queryset():
+    return Flight.objects.select_related('origin', 'destination', 'airplane', 'inventory')
+
+
+@async_api_view
+async def flight_list(request):
+    filterset = FlightFilter(request.query_params, queryset=flight_queryset())
+    if not filterset.is_valid():
+        raise exceptions.ValidationError(filterset.errors)
+    paginator = AsyncFlightCursorPagination()
+    page = await paginator.apaginate_queryset(filterset.qs, request)
+    return paginator.get_paginated_response(FlightSerializer(page, many=True).data).data
+
+
+@async_api_view
+async def flight_detail(request, pk):
+    flight = await aget_or_404(flight_queryset(), pk=pk)
+    return FlightSerializer(flight).data
+
+
+@async_api_view
+async def flight_availability(request, pk):
+    flight = await aget_or_404(Flight.objects.select_related('inventory'), pk=pk)
+    flight.seats = [
+        ticket async for ticket in
+        Ticket.objects.filter(flight_id=pk, status=Ticket.Status.AVAILABLE).order_by('id')
+        .only('id', 'seat_number', 'cabin', 'price').annotate(current_fare=ticket_fare())
+    ]
+    return FlightAvailabilitySerializer(flight).data
+
+
+@async_api_view
+async def airport_lookup(request, code):
+    airport = await aget_or_404(Airport.objects.select_related('country'), iata_code__iexact=code)
+    return AirportSerializer(airport).data
@@ -0,0 +1,105 @@
+"""
+Cheapest available fare per route and departure day.
+
+RouteFareDay materializes, for every (origin, destination, day) that has had
+flights, the lowest fare among the fare buckets of its bookable flights with
+seats left. It is refreshed incrementally: whenever core.inventory reprices
+flights, their route-days are re-aggregated from the buckets in the same
+transaction, and moved or deleted flights refresh the route-day they left.
+The route-day rows are locked in key order before the aggregate runs, so
+concurrent refreshes of one day serialize like inventory refreshes do. A
+calendar is then one range scan of the unique (origin, destination, day)
+index.
+"""
+import datetime
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import FareBucket, Flight, RouteFareDay
+
+BOOKABLE = [Flight.Status.SCHEDULED, Flight.Status.DELAYED]
+CALENDAR_FIELDS = ['min_fare', 'cheapest_flight', 'flight_count', 'available_count', 'updated_at']
+
+
+def route_day(origin_id, destination_id, departure_time):
+    """Route-day key of a departure, in the current time zone like TruncDate."""
+    return origin_id, destination_id, timezone.localdate(departure_time)
+
+
+def flight_route_days(flight_ids):
+    if not flight_ids:
+        return set()
+    return set(
+        Flight.objects.filter(pk__in=flight_ids)
+        .values_list('origin_id', 'destination_id', TruncDate('departure_time'))
+    )
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def refresh_fare_calendar(route_days):
+    """
+    Re-aggregates the given ``(origin_id, destination_id, day)`` route-days
+    inside the caller's transaction: an upsert that creates and locks their
+    rows in key order, one grouped query over their fare buckets and one
+    bulk UPDATE.
+    """
+    keys = sorted(set(route_days))
+    if not keys:
+        return
+    # Part of the caller's transaction; a savepoint would only add round trips.
+    with transaction.atomic(savepoint=False):
+        # ON CONFLICT DO UPDATE locks existing rows like SELECT ... FOR UPDATE, in VALUES order.
+        now = timezone.now()
+        locked = RouteFareDay.objects.bulk_create(
+            [RouteFareDay(origin_id=origin, destination_id=destination, day=day, updated_at=now)
+             for origin, destination, day in keys],
+            update_conflicts=True, unique_fields=['origin', 'destination', 'day'], update_fields=['updated_at'],
+        )
+        # Departure ranges rather than dates, so the flight route index applies.
+        flights = reduce(or_, (
+            Q(flight__origin_id=origin, flight__destination_id=destination,
+              flight__departure_time__gte=start, flight__departure_time__lt=end)
+            for origin, destination, (start, end) in ((o, d, day_bounds(day)) for o, d, day in keys)
+        ))
+        rows = (
+            FareBucket.objects.filter(flights, available_count__gt=0, flight__status__in=BOOKABLE)
+            .values(origin=F('flight__origin_id'), destination=F('flight__destination_id'),
+                    departure_day=TruncDate('flight__departure_time'))
+            .annotate(
+                lowest=Min('min_fare'),
+                flights=Count('flight', distinct=True),
+                seats=Sum('available_count'),
+                cheapest_first=ArrayAgg('flight_id', ordering=('min_fare', 'flight_id')),
+            )
+        )
+        found = {(row['origin'], row['destination'], row['departure_day']): row for row in rows}
+        for calendar_day in locked:
+            row = found.get((calendar_day.origin_id, calendar_day.destination_id, calendar_day.day))
+            calendar_day.min_fare = row['lowest'] if row else None
+            calendar_day.cheapest_flight_id = row['cheapest_first'][0] if row else None
+            calendar_day.flight_count = row['flights'] if row else 0
+            calendar_day.available_count = row['seats'] if row else 0
+            calendar_day.updated_at = now
+        RouteFareDay.objects.bulk_update(locked, CALENDAR_FIELDS)
+
+
+def fare_calendar(origin_id, destination_id, start, days):
+    """Days in ``[start, start + days)`` with seats left on the route, cheapest fare first per day."""
+    return (
+        RouteFareDay.objects.filter(
+            origin_id=origin_id, destination_id=destination_id,
+            day__gte=start, day__lt=start + datetime.timedelta(days=days), min_fare__isnull=False,
+        )
+        .order_by('day')
+        .values('day', 'min_fare', 'cheapest_flight_id', 'flight_count', 'available_count')
+    )
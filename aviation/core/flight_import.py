@@ -0,0 +1,156 @@
+import codecs
+import csv
+import json
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import bump_version
+from .fare_calendar import route_day
+from .inventory import refresh_flight_inventory
+from .models import Airplane, Airport, Flight
+
+IMPORT_CHUNK = 2000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("csv", "jsonl")
+UPDATE_FIELDS = ["origin", "destination", "departure_time", "arrival_time", "airplane", "status"]
+NUMBER_MAX_LENGTH = Flight._meta.get_field("number").max_length
+STATUSES = set(Flight.Status.values)
+
+
+def detect_format(filename):
+    return "csv" if filename.lower().endswith(".csv") else "jsonl"
+
+
+def read_rows(stream, fmt):
+    """
+    Yields ``(line, row)`` from a binary file without loading it into memory.
+    A JSON line that does not parse is yielded as ``(line, None)``.
+    """
+    text = codecs.iterdecode(stream, "utf-8-sig")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError:
+            row = None
+        yield line, row if isinstance(row, dict) else None
+
+
+class FlightImporter:
+    """
+    Upserts flights on ``number`` from an iterable of rows.
+
+    Airports and airplanes are resolved from dicts loaded once per import, rows
+    are validated in plain Python and written ``chunk_size`` at a time with a
+    single INSERT ... ON CONFLICT (number) DO UPDATE, so the cost per row does
+    not depend on how many airports or airplanes a schedule refers to.
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK, dry_run=False):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.airports = {code.upper(): pk for pk, code in Airport.objects.values_list("id", "iata_code")}
+        self.airplanes = {reg.upper(): pk for pk, reg in Airplane.objects.values_list("id", "registration")}
+        self.report = {"rows": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+
+    def run(self, rows):
+        chunk = {}
+        for line, row in rows:
+            self.report["rows"] += 1
+            flight, errors = self.parse(row)
+            if errors:
+                self.fail(line, errors)
+                continue
+            # Within a chunk the last row for a number wins, as it does across chunks.
+            chunk[flight.number] = flight
+            if len(chunk) >= self.chunk_size:
+                self.save(chunk)
+                chunk = {}
+        if chunk:
+            self.save(chunk)
+        return self.report
+
+    def fail(self, line, errors):
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < MAX_REPORTED_ERRORS:
+            self.report["errors"].append({"line": line, "errors": errors})
+
+    def parse(self, row):
+        if row is None:
+            return None, {"row": "Not a JSON object."}
+        errors = {}
+
+        number = str(row.get("number") or "").strip().upper()
+        if not number:
+            errors["number"] = "Required."
+        elif len(number) > NUMBER_MAX_LENGTH:
+            errors["number"] = f"At most {NUMBER_MAX_LENGTH} characters."
+
+        refs = {}
+        for field, lookup in (("origin", self.airports), ("destination", self.airports),
+                              ("airplane", self.airplanes)):
+            value = str(row.get(field) or "").strip().upper()
+            refs[field] = lookup.get(value)
+            if refs[field] is None:
+                errors[field] = f"Unknown {field} '{value}'." if value else "Required."
+        if refs["origin"] is not None and refs["origin"] == refs["destination"]:
+            errors["destination"] = "Must differ from origin."
+
+        times = {}
+        for field in ("departure_time", "arrival_time"):
+            value = row.get(field)
+            try:
+                parsed = parse_datetime(str(value or "").strip())
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                errors[field] = "Invalid ISO 8601 datetime." if value else "Required."
+            elif timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            times[field] = parsed
+        if times["departure_time"] and times["arrival_time"] and times["arrival_time"] <= times["departure_time"]:
+            errors["arrival_time"] = "Must be after departure_time."
+
+        status = str(row.get("status") or Flight.Status.SCHEDULED).strip().lower()
+        if status not in STATUSES:
+            errors["status"] = f"Must be one of {', '.join(sorted(STATUSES))}."
+
+        if errors:
+            return None, errors
+        return Flight(
+            number=number, origin_id=refs["origin"], destination_id=refs["destination"],
+            airplane_id=refs["airplane"], status=status, **times,
+        ), None
+
+    def save(self, chunk):
+        with transaction.atomic():
+            previous = list(
+                Flight.objects.filter(number__in=list(chunk))
+                .values_list("id", "origin_id", "destination_id", "departure_time")
+            )
+            if not self.dry_run:
+                Flight.objects.bulk_create(
+                    chunk.values(), update_conflicts=True, unique_fields=["number"], update_fields=UPDATE_FIELDS,
+                )
+                if previous:
+                    # Updated flights are repriced, and the route-days they left refreshed.
+                    refresh_flight_inventory(
+                        [row[0] for row in previous], route_days=[route_day(*row[1:]) for row in previous],
+                    )
+                transaction.on_commit(partial(bump_version, "flights"))
+        existing = len(previous)
+        self.report["updated"] += existing
+        self.report["created"] += len(chunk) - existing
+
+
+def import_flights(stream, fmt, chunk_size=IMPORT_CHUNK, dry_run=False):
+    return FlightImporter(chunk_size=chunk_size, dry_run=dry_run).run(read_rows(stream, fmt))
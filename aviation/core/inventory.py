@@ -0,0 +1,117 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q
+from django.utils import timezone
+
+from .cache import bump_version
+from .fare_calendar import flight_route_days, refresh_fare_calendar, route_day
+from .models import FareBucket, FlightInventory, Ticket
+from .pricing import price_cabins, refresh_fare_buckets
+
+INVENTORY_FIELDS = ['available_count', 'held_count', 'booked_count', 'min_price', 'max_price']
+COUNT_FIELDS = ['available_count', 'held_count', 'booked_count']
+
+
+def compute_cabins(flight_ids, now=None):
+    """
+    Ticket counts, available price range and current fares per flight and
+    cabin, with the flight's route and departure time, from one grouped query.
+    """
+    available = Q(status=Ticket.Status.AVAILABLE)
+    return price_cabins(list(
+        Ticket.objects.filter(flight_id__in=flight_ids)
+        .order_by()
+        .values('flight_id', 'cabin', departure_time=F('flight__departure_time'),
+                origin_id=F('flight__origin_id'), destination_id=F('flight__destination_id'))
+        .annotate(
+            seat_count=Count('id'),
+            available_count=Count('id', filter=available),
+            held_count=Count('id', filter=Q(status=Ticket.Status.HELD)),
+            booked_count=Count('id', filter=Q(status=Ticket.Status.BOOKED)),
+            min_price=Min('price', filter=available),
+            max_price=Max('price', filter=available),
+        )
+    ), now)
+
+
+def compute_inventory(flight_ids, cabins=None):
+    """
+    Per-flight ticket counts and the range of current fares of available seats,
+    summed up from the per-cabin rows of ``compute_cabins``.
+    """
+    if cabins is None:
+        cabins = compute_cabins(flight_ids)
+    empty = dict.fromkeys(INVENTORY_FIELDS)
+    empty.update(available_count=0, held_count=0, booked_count=0)
+    result = {flight_id: dict(empty) for flight_id in flight_ids}
+    for row in cabins:
+        inventory = result[row['flight_id']]
+        for field in COUNT_FIELDS:
+            inventory[field] += row[field]
+        if row['min_fare'] is None:
+            continue
+        if inventory['min_price'] is None or row['min_fare'] < inventory['min_price']:
+            inventory['min_price'] = row['min_fare']
+        if inventory['max_price'] is None or row['max_fare'] > inventory['max_price']:
+            inventory['max_price'] = row['max_fare']
+    return result
+
+
+def refresh_flight_inventory(flight_ids, now=None, route_days=()):
+    """
+    Recomputes inventory rows for the given flights inside the caller's transaction.
+
+    Rows are locked in flight order before the aggregate runs, so concurrent writers
+    on the same flight serialize and the last one always sees every committed change.
+    The flights' fare buckets are repriced from the same aggregate and their
+    route-days in the fare calendar follow, along with any ``route_days`` the
+    flights just left; the "inventory" data version is bumped once the change
+    is committed.
+    """
+    flight_ids = sorted({fid for fid in flight_ids if fid is not None})
+    if not flight_ids:
+        return
+    with transaction.atomic():
+        FlightInventory.objects.bulk_create(
+            [FlightInventory(flight_id=fid) for fid in flight_ids],
+            ignore_conflicts=True,
+        )
+        locked = list(
+            FlightInventory.objects.select_for_update()
+            .filter(flight_id__in=flight_ids)
+            .order_by('flight_id')
+        )
+        now = now or timezone.now()
+        cabins = compute_cabins(flight_ids, now)
+        computed = compute_inventory(flight_ids, cabins)
+        for inventory in locked:
+            inventory.updated_at = now
+            for field, value in computed[inventory.flight_id].items():
+                setattr(inventory, field, value)
+        FlightInventory.objects.bulk_update(locked, INVENTORY_FIELDS + ['updated_at'])
+        refresh_fare_buckets(flight_ids, cabins, now)
+        # Flights left without tickets have no cabin rows to take their route-day from.
+        days = {route_day(row['origin_id'], row['destination_id'], row['departure_time']) for row in cabins}
+        days |= flight_route_days(set(flight_ids) - {row['flight_id'] for row in cabins})
+        refresh_fare_calendar(days | set(route_days))
+        transaction.on_commit(partial(bump_version, "inventory"))
+
+
+def refresh_stale_fares(now=None, batch_size=500):
+    """
+    Reprices, a batch at a time, the flights whose fare buckets reached the
+    next days-to-departure tier, and returns how many there were. Goes through
+    refresh_flight_inventory so it takes the same locks as booking does.
+    """
+    now = now or timezone.now()
+    refreshed = 0
+    while True:
+        flight_ids = list(
+            FareBucket.objects.filter(valid_until__lte=now)
+            .order_by().values_list('flight_id', flat=True).distinct()[:batch_size]
+        )
+        if not flight_ids:
+            return refreshed
+        refresh_flight_inventory(flight_ids, now)
+        refreshed += len(flight_ids)
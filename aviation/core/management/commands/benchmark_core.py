@@ -0,0 +1,221 @@
+import io
+import json
+import random
+import time
+import string
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.airport_resolver import AirportResolver
+from core.cache import bump_version
+from core.flight_import import import_flights
+from core.inventory import refresh_flight_inventory
+from core.models import Airline, Airplane, Airport, Country, Flight, FlightInventory, Ticket
+from core.search import search_routes
+from orders.booking import TicketsUnavailable, book_tickets
+
+CASES = ["search", "resolver", "import", "booking"]
+# Budgets the cases are reported against
+SEARCH_P95_MS = 100
+SEARCH_COLD_MS = 1000
+RESOLVE_MS = 1
+IMPORT_FLIGHTS_PER_MINUTE = 50_000
+BOOKING_ATTEMPTS_PER_SECOND = 200
+BOOKINGS_PER_SECOND = 50
+CODE_CHARS = string.digits + string.ascii_uppercase
+SYLLABLES = ["ka", "ro", "va", "lin", "mo", "dan", "sk", "ber", "to", "wa", "ny", "gra", "pol", "es", "ur"]
+
+
+def percentile(timings, share):
+    timings = sorted(timings)
+    return timings[min(int(len(timings) * share), len(timings) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Time core's in-process hot paths on synthetic data and report them against their budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--case", action="append", dest="cases", choices=CASES,
+                            help="Case to run (repeatable, default all).")
+        parser.add_argument("--flights", type=int, default=20_000, help="Flights in the search graph.")
+        parser.add_argument("--searches", type=int, default=100)
+        parser.add_argument("--airports", type=int, default=1_000, help="Airports in the resolver.")
+        parser.add_argument("--lookups", type=int, default=1_000)
+        parser.add_argument("--rows", type=int, default=20_000, help="Schedule rows to import.")
+        parser.add_argument("--bookings", type=int, default=500, help="Two-seat booking attempts on one flight.")
+        parser.add_argument("--threads", type=int, default=12, help="Parallel buyers.")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        for case in options["cases"] or CASES:
+            getattr(self, f"time_{case}")(options)
+
+    def report(self, case, value, unit, budget, higher_is_better=False):
+        within = value >= budget if higher_is_better else value <= budget
+        style = self.style.SUCCESS if within else self.style.ERROR
+        self.stdout.write(style(f"{case:<10} {value:10.2f} {unit:<14} budget {budget}"))
+
+    def fleet(self, count):
+        """Benchmark airports and an airplane to fly between them, in the caller's transaction."""
+        country, _ = Country.objects.get_or_create(code="ZZZ", defaults={"name": "Benchmark"})
+        airports = Airport.objects.bulk_create(
+            Airport(iata_code=f"Z{CODE_CHARS[n // 36]}{CODE_CHARS[n % 36]}", name=f"Benchmark {n}", country=country)
+            for n in range(count)
+        )
+        airline = Airline.objects.create(name="Benchmark", code="ZZZZZ", airport=airports[0])
+        airplane = Airplane.objects.create(registration="BENCH", model="Benchmark", seats_count=180,
+                                           airline=airline)
+        return airports, airplane
+
+    def time_search(self, options):
+        """
+        /api/search/ between random spokes of a hub-and-spoke day, through search_routes.
+        The first search loads the graph from the database; the flights are rolled back.
+        """
+        rnd = random.Random(options["seed"])
+        hubs, day = 12, date(2030, 1, 1)
+        start = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+        with transaction.atomic():
+            airports, airplane = self.fleet(300)
+            flights = []
+            for n in range(options["flights"]):
+                # Most flights touch one of the hubs.
+                origin = rnd.choice(airports[:hubs]) if n % 2 else rnd.choice(airports)
+                destination = rnd.choice(airports) if n % 2 else rnd.choice(airports[:hubs])
+                if origin == destination:
+                    continue
+                departs = start + timedelta(minutes=rnd.randrange(24 * 60))
+                arrives = departs + timedelta(minutes=rnd.randrange(60, 600))
+                flights.append(Flight(number=f"ZS{n}", origin=origin, destination=destination, airplane=airplane,
+                                      departure_time=departs, arrival_time=arrives))
+            flights = Flight.objects.bulk_create(flights, batch_size=5000)
+            # One flight in ten is sold out.
+            FlightInventory.objects.bulk_create(
+                (FlightInventory(flight=flight, available_count=0 if n % 10 == 0 else 10, min_price=Decimal("50.00"))
+                 for n, flight in enumerate(flights)),
+                batch_size=5000,
+            )
+            # As a schedule change would, so no graph cached for the day is reused.
+            bump_version("flights")
+
+            timings = []
+            for _ in range(options["searches"]):
+                origin, destination = rnd.sample(airports[hubs:], 2)
+                started = time.perf_counter()
+                search_routes(origin.pk, destination.pk, day)
+                timings.append((time.perf_counter() - started) * 1000)
+            transaction.set_rollback(True)
+        # Drop the graph of the rolled-back flights.
+        bump_version("flights")
+
+        self.report("search", percentile(timings, 0.95), "ms p95", SEARCH_P95_MS)
+        self.report("search", timings[0], "ms graph load", SEARCH_COLD_MS)
+
+    def time_resolver(self, options):
+        """Misspelled airport names, which fall through to the trigram lookup."""
+        rnd = random.Random(options["seed"])
+        countries = [{"id": n, "name": f"Country {n}", "code": f"C{n}"} for n in range(50)]
+        names = [
+            "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randrange(2, 5))).title()
+            for _ in range(options["airports"])
+        ]
+        resolver = AirportResolver(
+            [{"id": n, "iata_code": f"{n:03d}", "name": name, "country": countries[n % 50]}
+             for n, name in enumerate(names)],
+            [],
+        )
+        queries = []
+        for _ in range(options["lookups"]):
+            name = rnd.choice(names)
+            drop = rnd.randrange(len(name))
+            queries.append(name[:drop] + name[drop + 1:])
+
+        started = time.perf_counter()
+        for query in queries:
+            resolver.resolve(query)
+        self.report("resolver", (time.perf_counter() - started) * 1000 / len(queries), "ms per lookup", RESOLVE_MS)
+
+    def time_import(self, options):
+        """A JSON-lines schedule through core.flight_import; the flights are rolled back."""
+        with transaction.atomic():
+            airports, airplane = self.fleet(30)
+            start = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+            lines = []
+            for n in range(options["rows"]):
+                departs = start + timedelta(minutes=n)
+                lines.append(json.dumps({
+                    "number": f"ZZ{n}", "origin": airports[n % 30].iata_code,
+                    "destination": airports[(n + 1) % 30].iata_code, "airplane": airplane.registration,
+                    "departure_time": departs.isoformat(), "arrival_time": (departs + timedelta(hours=2)).isoformat(),
+                }))
+            stream = io.BytesIO("\n".join(lines).encode())
+
+            started = time.perf_counter()
+            imported = import_flights(stream, "jsonl")
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        self.report("import", imported["created"] / elapsed * 60, "flights/min", IMPORT_FLIGHTS_PER_MINUTE,
+                    higher_is_better=True)
+
+    def time_booking(self, options):
+        """
+        Parallel book_tickets calls for two random seats of one 180-seat flight. The
+        buyers need committed rows, so the flight and its orders are deleted afterwards.
+        """
+        rnd = random.Random(options["seed"])
+        with transaction.atomic():
+            airports, airplane = self.fleet(2)
+            flight = Flight.objects.create(
+                number="ZB1", origin=airports[0], destination=airports[1], airplane=airplane,
+                departure_time=datetime(2030, 1, 1, tzinfo=dt_timezone.utc),
+                arrival_time=datetime(2030, 1, 1, 2, tzinfo=dt_timezone.utc),
+            )
+            tickets = Ticket.objects.bulk_create(
+                Ticket(flight=flight, seat_number=f"{row}{letter}", price=Decimal("50.00"))
+                for row in range(1, 31) for letter in "ABCDEF"
+            )
+            refresh_flight_inventory([flight.pk])
+            users = get_user_model().objects.bulk_create(
+                get_user_model()(username=f"benchmark-{n}", email=f"benchmark-{n}@example.com") for n in range(options["threads"])
+            )
+        ticket_ids = [ticket.pk for ticket in tickets]
+        attempts = [rnd.sample(ticket_ids, 2) for _ in range(options["bookings"])]
+        booked = []
+
+        def buyer(user, chunk):
+            try:
+                for wanted in chunk:
+                    try:
+                        book_tickets(user, wanted, payment_method="card")
+                    except TicketsUnavailable:
+                        continue
+                    booked.append(wanted)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=buyer, args=(user, attempts[n::len(users)])) for n, user in enumerate(users)
+        ]
+        try:
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            # Users take their orders with them, the flight its tickets and inventory.
+            get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+            flight.delete()
+            Airport.objects.filter(pk__in=[airport.pk for airport in airports]).delete()
+            Country.objects.filter(code="ZZZ", airports__isnull=True).delete()
+
+        self.report("booking", len(attempts) / elapsed, "attempts/s", BOOKING_ATTEMPTS_PER_SECOND,
+                    higher_is_better=True)
+        self.report("booking", len(booked) / elapsed, "bookings/s", BOOKINGS_PER_SECOND, higher_is_better=True)
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import httpx
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Airport, Flight
+
+ROUTES = ["flight-list", "flight-detail", "flight-availability", "airport-lookup"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = "Compare sync and async views under uvicorn with concurrent requests against the current database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per route and mode.")
+        parser.add_argument("--concurrency", type=int, default=200)
+        parser.add_argument("--route", action="append", dest="routes", choices=ROUTES,
+                            help="Route to benchmark (repeatable, default all).")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.order_by("id").first()
+        flight = Flight.objects.order_by("id").first()
+        airport = Airport.objects.order_by("id").first()
+        if not (user and flight and airport):
+            raise CommandError("Needs at least one user, flight and airport; run the seed command first.")
+        paths = {
+            "flight-list": "/api/flights/?page_size=20",
+            "flight-detail": f"/api/flights/{flight.pk}/",
+            "flight-availability": f"/api/flights/{flight.pk}/availability/",
+            "airport-lookup": f"/api/airports/{airport.iata_code}/",
+        }
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+        routes = options["routes"] or ROUTES
+
+        for mode, enabled in (("sync", ""), ("async", ",".join(routes))):
+            with self.server(enabled) as base_url:
+                for route in routes:
+                    stats = asyncio.run(self.load(base_url + paths[route], headers,
+                                                  options["requests"], options["concurrency"]))
+                    self.stdout.write(
+                        f"{route:<20} {mode:<5} {stats['rps']:8.0f} req/s  p50 {stats['p50']:6.1f} ms  "
+                        f"p95 {stats['p95']:6.1f} ms  errors {stats['errors']}"
+                    )
+
+    @contextmanager
+    def server(self, async_views):
+        port = free_port()
+        env = {**os.environ, "ASYNC_VIEWS": async_views}
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "aviation.asgi:application", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        url = f"http://localhost:{port}"
+        try:
+            for _ in range(100):
+                try:
+                    httpx.get(url + "/api/schema/", timeout=1)
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            else:
+                raise CommandError("uvicorn did not start")
+            yield url
+        finally:
+            process.terminate()
+            process.wait()
+
+    async def load(self, url, headers, total, concurrency):
+        timings, errors = [], 0
+        queue = iter(range(total))
+        limits = httpx.Limits(max_connections=concurrency)
+
+        async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30) as client:
+            for _ in range(min(concurrency, 20)):
+                await client.get(url)
+
+            async def worker():
+                nonlocal errors
+                for _ in queue:
+                    started = time.perf_counter()
+                    try:
+                        resp = await client.get(url)
+                        errors += resp.status_code != 200
+                    except httpx.HTTPError:
+                        errors += 1
+                    timings.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        timings.sort()
+        return {
+            "rps": total / elapsed,
+            "p50": timings[len(timings) // 2],
+            "p95": timings[int(len(timings) * 0.95)],
+            "errors": errors,
+        }
@@ -0,0 +1,42 @@
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import Flight
+from core.seatmaps import TICKET_BATCH, generate_tickets
+
+
+def day_start(value):
+    return timezone.make_aware(datetime.combine(datetime.strptime(value, "%Y-%m-%d").date(), dt_time.min))
+
+
+class Command(BaseCommand):
+    help = "Create tickets for flights from their airplane seat maps (idempotent)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flight", type=int, action="append", dest="flights",
+                            help="Flight id (repeatable).")
+        parser.add_argument("--from", dest="date_from", help="First departure date, YYYY-MM-DD.")
+        parser.add_argument("--to", dest="date_to", help="Last departure date (inclusive), YYYY-MM-DD.")
+        parser.add_argument("--batch-size", type=int, default=TICKET_BATCH)
+
+    def handle(self, *args, **options):
+        if not options["flights"] and not options["date_from"]:
+            raise CommandError("Pass --flight or --from/--to.")
+
+        flights = Flight.objects.all()
+        if options["flights"]:
+            flights = flights.filter(id__in=options["flights"])
+        if options["date_from"]:
+            flights = flights.filter(departure_time__gte=day_start(options["date_from"]))
+        if options["date_to"]:
+            flights = flights.filter(departure_time__lt=day_start(options["date_to"]) + timedelta(days=1))
+
+        started = time.perf_counter()
+        processed, created = generate_tickets(flights, batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"🎫 {created} tickets created for {processed} flights in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.flight_import import FORMATS, IMPORT_CHUNK, detect_format, import_flights
+
+
+class Command(BaseCommand):
+    help = "Upsert flights by number from a CSV or JSON-lines schedule file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Schedule file; columns number, origin, destination, "
+                                         "departure_time, arrival_time, airplane, status.")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to csv for *.csv files, jsonl otherwise.")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK)
+        parser.add_argument("--dry-run", action="store_true", help="Validate and count without writing.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        started = time.perf_counter()
+        try:
+            with open(path, "rb") as stream:
+                report = import_flights(stream, options["format"] or detect_format(path),
+                                        chunk_size=options["chunk_size"], dry_run=options["dry_run"])
+        except OSError as exc:
+            raise CommandError(exc)
+        elapsed = time.perf_counter() - started
+
+        for error in report["errors"]:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        if report["failed"] > len(report["errors"]):
+            self.stderr.write(f"... {report['failed'] - len(report['errors'])} more failed rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"✈️ {report['rows']} rows in {elapsed:.1f}s: {report['created']} created, "
+            f"{report['updated']} updated, {report['failed']} failed"
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.fare_calendar import day_bounds, flight_route_days, refresh_fare_calendar
+from core.models import Flight, RouteFareDay
+
+
+class Command(BaseCommand):
+    help = "Rebuild the fare calendar route-days of upcoming flights from their fare buckets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--purge", action="store_true",
+                            help="Delete route-days before today first.")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options["purge"]:
+            purged, _ = RouteFareDay.objects.filter(day__lt=today).delete()
+            self.stdout.write(f"Purged {purged} past route-days")
+
+        flight_ids = list(
+            Flight.objects.filter(departure_time__gte=day_bounds(today)[0])
+            .order_by("id").values_list("id", flat=True)
+        )
+        batch_size = options["batch_size"]
+        for start in range(0, len(flight_ids), batch_size):
+            refresh_fare_calendar(flight_route_days(flight_ids[start:start + batch_size]))
+
+        days = RouteFareDay.objects.filter(day__gte=today, min_fare__isnull=False).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"📅 Refreshed the fare calendar of {len(flight_ids)} flights, {days} route-days have seats"
+        ))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from core.inventory import INVENTORY_FIELDS, compute_cabins, compute_inventory, refresh_flight_inventory
+from core.models import FareBucket, Flight, FlightInventory
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-flight seat inventory and fare buckets from tickets and report flights that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flight", type=int, action="append", dest="flights",
+                            help="Flight id to reconcile (repeatable). Defaults to all flights.")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Only report drifted rows, do not fix them.")
+
+    def handle(self, *args, **options):
+        flights = Flight.objects.order_by("id").values_list("id", flat=True)
+        if options["flights"]:
+            flights = flights.filter(id__in=options["flights"])
+        flight_ids = list(flights)
+        batch_size = options["batch_size"]
+
+        checked = drifted = 0
+        for start in range(0, len(flight_ids), batch_size):
+            batch = flight_ids[start:start + batch_size]
+            stored = {
+                row["flight_id"]: row
+                for row in FlightInventory.objects.filter(flight_id__in=batch)
+                .values("flight_id", *INVENTORY_FIELDS)
+            }
+            cabins = compute_cabins(batch)
+            computed = compute_inventory(batch, cabins)
+            # Fare buckets drift with the counts they were priced from.
+            stored_buckets = set(
+                FareBucket.objects.filter(flight_id__in=batch)
+                .values_list("flight_id", "cabin", "seat_count", "available_count")
+            )
+            buckets = {(row["flight_id"], row["cabin"], row["seat_count"], row["available_count"]) for row in cabins}
+            drifted_buckets = {bucket[0] for bucket in stored_buckets ^ buckets}
+            stale = []
+            for flight_id in batch:
+                row = stored.get(flight_id)
+                current = {field: row[field] for field in INVENTORY_FIELDS} if row else None
+                if current != computed[flight_id] or flight_id in drifted_buckets:
+                    stale.append(flight_id)
+            checked += len(batch)
+            drifted += len(stale)
+
+            if stale and not options["dry_run"]:
+                refresh_flight_inventory(stale)
+
+        verb = "found" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Checked {checked} flights, {verb} {drifted} with drifted inventory or fares"
+        ))
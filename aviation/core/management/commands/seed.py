@@ -2,8 +2,10 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta, time, datetime, timezone as dt_timezone
 from django.contrib.auth import get_user_model
-from core.models import Country, Airport, Airline, Airplane, Flight, Ticket
-from orders.models import Order
+from core.models import Country, Airport, AirportAlias, Airline, Airplane, Flight, SeatMapSection, Ticket
+from core.seatmaps import generate_tickets
+from orders.booking import book_tickets
+from orders.lifecycle import PAY, transition
 
 User = get_user_model()
 
@@ -29,6 +31,8 @@ class Command(BaseCommand):
         krakow_airport, _ = Airport.objects.get_or_create(
             iata_code="KRK", defaults={"name": "Krakow", "country": poland}
         )
+        for airport, alias in ((lviv_airport, "Lwów"), (lviv_airport, "Lemberg"), (krakow_airport, "Cracow")):
+            AirportAlias.objects.get_or_create(airport=airport, name=alias)
 
         # Airline
         airline, _ = Airline.objects.get_or_create(
@@ -40,6 +44,11 @@ class Command(BaseCommand):
             registration="UR-TEST",
             defaults={"model": "Boeing 737", "seats_count": 180, "airline": airline},
         )
+        SeatMapSection.objects.get_or_create(
+            airplane=airplane,
+            first_row=1,
+            defaults={"last_row": 2, "seat_letters": "AB", "base_fare": 120.00},
+        )
 
         # User (superuser for admin + orders)
         user, created = User.objects.get_or_create(
@@ -81,26 +90,13 @@ class Command(BaseCommand):
             else:
                 self.stdout.write(self.style.WARNING(f"⚠️ Flight {flight.number} already exists"))
 
-            # Tickets (some available, some booked)
+            # Tickets from the seat map (some available, some booked)
+            generate_tickets(Flight.objects.filter(pk=flight.pk))
             seats = ["1A", "1B", "2A", "2B"]
             for i, seat in enumerate(seats):
-                ticket, _ = Ticket.objects.get_or_create(
-                    flight=flight,
-                    seat_number=seat,
-                    defaults={"price": 120.00, "status": "available"},
-                )
-                if i % 2 == 1:  # кожне друге місце заброньоване
-                    ticket.status = "booked"
-                    ticket.save()
-                    order, _ = Order.objects.get_or_create(
-                        user=user,
-                        defaults={
-                            "status": "confirmed",
-                            "amount": ticket.price,
-                            "currency": "USD"
-                        }
-                    )
-                    order.tickets.add(ticket)
-                    order.save()
+                ticket = Ticket.objects.get(flight=flight, seat_number=seat)
+                if i % 2 == 1 and ticket.status == Ticket.Status.AVAILABLE:  # кожне друге місце заброньоване
+                    order = book_tickets(user, [ticket.id], payment_method="card", currency="USD")
+                    transition(PAY, [order.pk], payment_ids=[])
 
             self.stdout.write(self.style.SUCCESS(f"🎫 Tickets + Orders for {flight.number} created"))
\ No newline at end of file
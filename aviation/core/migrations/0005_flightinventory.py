@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+
+def backfill_inventory(apps, schema_editor):
+    Ticket = apps.get_model('core', 'Ticket')
+    FlightInventory = apps.get_model('core', 'FlightInventory')
+    available = Q(status='available')
+    rows = (
+        Ticket.objects.order_by()
+        .values('flight_id')
+        .annotate(
+            available_count=Count('id', filter=available),
+            booked_count=Count('id', filter=Q(status='booked')),
+            min_price=Min('price', filter=available),
+            max_price=Max('price', filter=available),
+        )
+    )
+    FlightInventory.objects.bulk_create(
+        [FlightInventory(**row) for row in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_remove_ticket_booked_at_remove_ticket_user_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlightInventory',
+            fields=[
+                ('flight', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='inventory', serialize=False, to='core.flight')),
+                ('available_count', models.PositiveIntegerField(default=0)),
+                ('booked_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'flight inventories',
+            },
+        ),
+        migrations.RunPython(backfill_inventory, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_flightinventory'),
+        ('orders', '0005_alter_order_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flightinventory',
+            name='held_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='status',
+            field=models.CharField(choices=[('available', 'Available'), ('held', 'Held'), ('booked', 'Booked')], default='available', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status', 'held')), fields=['hold_expires_at'], name='ticket_hold_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:54
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# pg_trgm ships with contrib and is trusted on Postgres 13+, but some hosted
+# databases do not offer it; searches then fall back to the UPPER(name) index.
+CREATE_TRIGRAM_INDEX = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS airport_name_trgm_idx
+            ON core_airport USING gin (UPPER(name) gin_trgm_ops);
+    END IF;
+END $$;
+"""
+
+DROP_TRIGRAM_INDEX = "DROP INDEX IF EXISTS airport_name_trgm_idx;"
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_ticket_hold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='airport',
+            index=models.Index(django.db.models.functions.text.Upper('iata_code'), name='airport_iata_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='airport',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='airport_name_upper_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CREATE_TRIGRAM_INDEX, DROP_TRIGRAM_INDEX),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='airport',
+                    index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='airport_name_trgm_idx'),
+                ),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='flight',
+            index=models.Index(fields=['origin', 'destination', 'departure_time'], name='flight_route_departure_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='flight',
+            index=models.Index(fields=['status', 'departure_time'], name='flight_status_departure_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:57
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_search_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='flight',
+            index=models.Index(fields=['departure_time', 'id'], name='flight_departure_id_idx'),
+        ),
+    ]
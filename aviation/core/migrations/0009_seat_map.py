@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_flight_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='cabin',
+            field=models.CharField(choices=[('economy', 'Economy'), ('premium', 'Premium Economy'), ('business', 'Business'), ('first', 'First')], default='economy', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='SeatMapSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cabin', models.CharField(choices=[('economy', 'Economy'), ('premium', 'Premium Economy'), ('business', 'Business'), ('first', 'First')], default='economy', max_length=10)),
+                ('first_row', models.PositiveSmallIntegerField()),
+                ('last_row', models.PositiveSmallIntegerField()),
+                ('seat_letters', models.CharField(help_text='Seat letters of every row, e.g. ABCDEF', max_length=12)),
+                ('base_fare', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('airplane', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_map', to='core.airplane')),
+            ],
+            options={
+                'ordering': ['airplane', 'first_row'],
+                'constraints': [models.CheckConstraint(condition=models.Q(('last_row__gte', models.F('first_row'))), name='seat_map_row_range')],
+            },
+        ),
+    ]
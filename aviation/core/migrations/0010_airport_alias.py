@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_seat_map'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AirportAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('airport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='core.airport')),
+            ],
+            options={
+                'verbose_name_plural': 'airport aliases',
+                'constraints': [models.UniqueConstraint(fields=('airport', 'name'), name='airport_alias_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_airport_alias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='fare',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='FareBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cabin', models.CharField(choices=[('economy', 'Economy'), ('premium', 'Premium Economy'), ('business', 'Business'), ('first', 'First')], max_length=10)),
+                ('seat_count', models.PositiveIntegerField(default=0)),
+                ('available_count', models.PositiveIntegerField(default=0)),
+                ('multiplier', models.DecimalField(decimal_places=3, max_digits=6)),
+                ('min_fare', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_fare', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('flight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fare_buckets', to='core.flight')),
+            ],
+            options={
+                'ordering': ['flight', 'cabin'],
+                'indexes': [models.Index(condition=models.Q(('valid_until__isnull', False)), fields=['valid_until'], name='fare_bucket_valid_until_idx')],
+                'constraints': [models.UniqueConstraint(fields=('flight', 'cabin'), name='fare_bucket_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_ticket_fare_farebucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteFareDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('min_fare', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('flight_count', models.PositiveIntegerField(default=0)),
+                ('available_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('cheapest_flight', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.flight')),
+                ('destination', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.airport')),
+                ('origin', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.airport')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('origin', 'destination', 'day'), name='route_fare_day_unique')],
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
 class Country(models.Model):
     name = models.CharField(max_length=100)
@@ -9,8 +11,30 @@ class Airport(models.Model):
     name = models.CharField(max_length=100)
     iata_code = models.CharField(max_length=3, unique=True)
     country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name='airports')
+
+    class Meta:
+        indexes = [
+            models.Index(Upper('iata_code'), name='airport_iata_upper_idx'),
+            models.Index(Upper('name'), name='airport_name_upper_idx'),
+            # Serves name__icontains, which Postgres compiles to UPPER(name) LIKE UPPER('%...%')
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='airport_name_trgm_idx'),
+        ]
+
     def __str__(self): return f"{self.name} ({self.iata_code})"
 
+class AirportAlias(models.Model):
+    """Another name an airport is searched by: a city, a former name or a metro code like NYC."""
+    airport = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='aliases')
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name_plural = 'airport aliases'
+        constraints = [
+            models.UniqueConstraint(fields=['airport', 'name'], name='airport_alias_unique'),
+        ]
+
+    def __str__(self): return f"{self.name} -> {self.airport.iata_code}"
+
 class Airline(models.Model):
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=5, unique=True)
@@ -24,6 +48,33 @@ class Airplane(models.Model):
     airline = models.ForeignKey(Airline, on_delete=models.CASCADE, related_name='airplanes')
     def __str__(self): return f"{self.model} ({self.registration})"
 
+class CabinClass(models.TextChoices):
+    ECONOMY = 'economy', 'Economy'
+    PREMIUM = 'premium', 'Premium Economy'
+    BUSINESS = 'business', 'Business'
+    FIRST = 'first', 'First'
+
+class SeatMapSection(models.Model):
+    airplane = models.ForeignKey(Airplane, on_delete=models.CASCADE, related_name='seat_map')
+    cabin = models.CharField(max_length=10, choices=CabinClass.choices, default=CabinClass.ECONOMY)
+    first_row = models.PositiveSmallIntegerField()
+    last_row = models.PositiveSmallIntegerField()
+    seat_letters = models.CharField(max_length=12, help_text="Seat letters of every row, e.g. ABCDEF")
+    base_fare = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        ordering = ['airplane', 'first_row']
+        constraints = [
+            models.CheckConstraint(condition=models.Q(last_row__gte=models.F('first_row')), name='seat_map_row_range'),
+        ]
+
+    def seats(self):
+        for row in range(self.first_row, self.last_row + 1):
+            for letter in self.seat_letters:
+                yield f"{row}{letter}"
+
+    def __str__(self): return f"{self.airplane.registration} {self.cabin} rows {self.first_row}-{self.last_row}"
+
 class Flight(models.Model):
     class Status(models.TextChoices):
         SCHEDULED = 'scheduled', 'Scheduled'
@@ -38,13 +89,29 @@ class Flight(models.Model):
     arrival_time = models.DateTimeField()
     airplane = models.ForeignKey(Airplane, on_delete=models.PROTECT, related_name='flights')
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.SCHEDULED)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['origin', 'destination', 'departure_time'], name='flight_route_departure_idx'),
+            models.Index(fields=['status', 'departure_time'], name='flight_status_departure_idx'),
+            models.Index(fields=['departure_time', 'id'], name='flight_departure_id_idx'),
+        ]
+
     def __str__(self): return f"Flight {self.number}"
 
 class Ticket(models.Model):
+    class Status(models.TextChoices):
+        AVAILABLE = 'available', 'Available'
+        HELD = 'held', 'Held'
+        BOOKED = 'booked', 'Booked'
     flight = models.ForeignKey("core.Flight", on_delete=models.CASCADE)
     seat_number = models.CharField(max_length=10)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    status = models.CharField(max_length=20, default="available")
+    # What the seat was held or sold at; core.pricing prices available seats from ``price``.
+    fare = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    cabin = models.CharField(max_length=10, choices=CabinClass.choices, default=CabinClass.ECONOMY)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.AVAILABLE)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
     order = models.ForeignKey(
         "orders.Order",
         on_delete=models.SET_NULL,
@@ -55,6 +122,76 @@ class Ticket(models.Model):
 
     class Meta:
         unique_together = ('flight', 'seat_number')
+        indexes = [
+            models.Index(
+                fields=['hold_expires_at'],
+                condition=models.Q(status='held'),
+                name='ticket_hold_expiry_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Ticket {self.seat_number} for {self.flight.number}"
+
+class FlightInventory(models.Model):
+    flight = models.OneToOneField(Flight, on_delete=models.CASCADE, primary_key=True, related_name='inventory')
+    available_count = models.PositiveIntegerField(default=0)
+    held_count = models.PositiveIntegerField(default=0)
+    booked_count = models.PositiveIntegerField(default=0)
+    # Range of the current fares of available seats, see core.pricing.
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'flight inventories'
+
+    def __str__(self):
+        return f"Inventory for flight {self.flight_id}: {self.available_count} available"
+
+class FareBucket(models.Model):
+    """Current fare multiplier of a cabin on a flight, maintained by core.pricing."""
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name='fare_buckets')
+    cabin = models.CharField(max_length=10, choices=CabinClass.choices)
+    seat_count = models.PositiveIntegerField(default=0)
+    available_count = models.PositiveIntegerField(default=0)
+    multiplier = models.DecimalField(max_digits=6, decimal_places=3)
+    min_fare = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_fare = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # When days to departure reach the next pricing tier; null once the flight has left.
+    valid_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['flight', 'cabin']
+        constraints = [
+            models.UniqueConstraint(fields=['flight', 'cabin'], name='fare_bucket_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['valid_until'], condition=models.Q(valid_until__isnull=False),
+                         name='fare_bucket_valid_until_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cabin} fares for flight {self.flight_id}: x{self.multiplier}"
+
+class RouteFareDay(models.Model):
+    """Cheapest available fare of a route on a departure day, maintained by core.fare_calendar."""
+    # Reads always go through the (origin, destination, day) unique index; airports are
+    # protected by their flights and hardly ever deleted, so the FKs get no index of their own.
+    origin = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='+', db_index=False)
+    destination = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='+', db_index=False)
+    day = models.DateField()
+    min_fare = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    cheapest_flight = models.ForeignKey(Flight, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    flight_count = models.PositiveIntegerField(default=0)
+    available_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['origin', 'destination', 'day'], name='route_fare_day_unique'),
+        ]
 
     def __str__(self):
-        return f"Ticket {self.seat_number} for {self.flight.number}"
\ No newline at end of file
+        return f"{self.origin_id}->{self.destination_id} on {self.day}: {self.min_fare}"
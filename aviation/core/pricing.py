@@ -0,0 +1,147 @@
+"""
+Dynamic fares.
+
+A seat's fare is its base price (Ticket.price, from the seat map) times the
+multiplier of its cabin on the flight. The multiplier rises with the cabin's
+load factor and as departure gets closer, by as much of that markup as the
+cabin passes on: economy reprices sharply, first class barely.
+
+Multipliers are precomputed into one FareBucket per flight and cabin by
+``price_cabins`` and ``refresh_fare_buckets``, which core.inventory calls with
+the per-cabin counts it aggregates anyway, so every hold, release or ticket
+change reprices just the flights it touched, in the same transaction. The
+per-flight fare range in FlightInventory comes from the same rows. ``quote`` serves the buckets
+of a flight from the cache and ``ticket_fare`` applies them inside SQL, so the
+fare a seat is held at and the order total never go through Python.
+"""
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from .models import CabinClass, FareBucket
+
+QUOTE_KEY = "fares:{}"
+QUOTE_FIELDS = ['cabin', 'multiplier', 'seat_count', 'available_count', 'min_fare', 'max_fare']
+BUCKET_FIELDS = ['seat_count', 'available_count', 'multiplier', 'min_fare', 'max_fare', 'valid_until', 'updated_at']
+CENT = Decimal("0.01")
+MULTIPLIER_STEP = Decimal("0.001")
+
+# (minimum share of the cabin held or booked, multiplier), first match wins
+LOAD_FACTOR_TIERS = (
+    (Decimal("0.90"), Decimal("1.60")),
+    (Decimal("0.75"), Decimal("1.35")),
+    (Decimal("0.50"), Decimal("1.15")),
+    (Decimal("0"), Decimal("1.00")),
+)
+# (more than this many days to departure, multiplier), first match wins
+DEPARTURE_TIERS = (
+    (60, Decimal("0.90")),
+    (21, Decimal("1.00")),
+    (7, Decimal("1.15")),
+    (2, Decimal("1.35")),
+    (0, Decimal("1.60")),
+)
+# Share of the load and departure markup a cabin passes on
+CABIN_ELASTICITY = {
+    CabinClass.ECONOMY: Decimal("1.00"),
+    CabinClass.PREMIUM: Decimal("0.75"),
+    CabinClass.BUSINESS: Decimal("0.50"),
+    CabinClass.FIRST: Decimal("0.25"),
+}
+
+
+def load_factor_multiplier(sold, seats):
+    load = Decimal(sold) / seats if seats else Decimal(0)
+    return next(multiplier for threshold, multiplier in LOAD_FACTOR_TIERS if load >= threshold)
+
+
+def departure_multiplier(departure_time, now):
+    """The multiplier for the time left before departure, and when the next tier starts (after now)."""
+    left = departure_time - now
+    for days, multiplier in DEPARTURE_TIERS:
+        if left > timedelta(days=days):
+            return multiplier, departure_time - timedelta(days=days)
+    return DEPARTURE_TIERS[-1][1], None
+
+
+def fare_multiplier(cabin, sold, seats, departure_time, now):
+    """``(multiplier, valid_until)`` of a cabin with ``sold`` of its ``seats`` held or booked."""
+    by_departure, valid_until = departure_multiplier(departure_time, now)
+    markup = load_factor_multiplier(sold, seats) * by_departure - 1
+    multiplier = 1 + markup * CABIN_ELASTICITY.get(cabin, Decimal(1))
+    return multiplier.quantize(MULTIPLIER_STEP, ROUND_HALF_UP), valid_until
+
+
+def fare(price, multiplier):
+    # Postgres rounds numeric halves away from zero as well, so this agrees with ticket_fare().
+    return None if price is None else (price * multiplier).quantize(CENT, ROUND_HALF_UP)
+
+
+def ticket_fare():
+    """Current fare of the ticket row as an SQL expression; the base price until its flight is priced."""
+    multiplier = (
+        FareBucket.objects.filter(flight_id=OuterRef('flight_id'), cabin=OuterRef('cabin'))
+        .values('multiplier')[:1]
+    )
+    return Round(
+        F('price') * Coalesce(Subquery(multiplier), Value(Decimal(1))), 2,
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def price_cabins(cabins, now=None):
+    """
+    Adds ``multiplier``, ``valid_until`` and the available ``min_fare`` and
+    ``max_fare`` to per-cabin rows (see core.inventory.compute_cabins), in place.
+    """
+    now = now or timezone.now()
+    for row in cabins:
+        row['multiplier'], row['valid_until'] = fare_multiplier(
+            row['cabin'], row['seat_count'] - row['available_count'], row['seat_count'], row['departure_time'], now,
+        )
+        row['min_fare'] = fare(row['min_price'], row['multiplier'])
+        row['max_fare'] = fare(row['max_price'], row['multiplier'])
+    return cabins
+
+
+def refresh_fare_buckets(flight_ids, cabins, now=None):
+    """
+    Stores the given flights' priced per-cabin rows (see ``price_cabins``) as
+    their fare buckets inside the caller's transaction: one upsert, one delete
+    of buckets whose cabin has no tickets left. Cached quotes of the flights
+    are dropped once the change is committed.
+    """
+    now = now or timezone.now()
+    buckets = [
+        FareBucket(
+            flight_id=row['flight_id'], cabin=row['cabin'], seat_count=row['seat_count'],
+            available_count=row['available_count'], multiplier=row['multiplier'],
+            min_fare=row['min_fare'], max_fare=row['max_fare'], valid_until=row['valid_until'], updated_at=now,
+        )
+        for row in cabins
+    ]
+    FareBucket.objects.bulk_create(
+        buckets, update_conflicts=True, unique_fields=['flight', 'cabin'], update_fields=BUCKET_FIELDS,
+    )
+    FareBucket.objects.filter(flight_id__in=flight_ids).exclude(pk__in=[bucket.pk for bucket in buckets]).delete()
+    transaction.on_commit(partial(cache.delete_many, [QUOTE_KEY.format(flight_id) for flight_id in flight_ids]))
+
+
+def quote(flight_id):
+    """
+    Fare buckets of a flight as dicts, from the cache. A miss loads them with
+    one indexed query; any repricing of the flight drops the cached copy.
+    """
+    key = QUOTE_KEY.format(flight_id)
+    fares = cache.get(key)
+    if fares is None:
+        fares = list(FareBucket.objects.filter(flight_id=flight_id).order_by('cabin').values(*QUOTE_FIELDS))
+        cache.set(key, fares, settings.FARE_QUOTE_TIMEOUT)
+    return fares
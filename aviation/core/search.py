@@ -0,0 +1,181 @@
+import bisect
+import datetime
+import threading
+from collections import OrderedDict, defaultdict
+from typing import NamedTuple
+
+from django.utils import timezone
+
+from .cache import get_version
+from .models import Airport, Flight, FlightInventory
+
+MIN_CONNECTION = datetime.timedelta(minutes=45)
+MAX_CONNECTION = datetime.timedelta(hours=8)
+MAX_STOPS = 2
+MAX_RESULTS = 20
+GRAPH_TTL = 300
+SEARCHABLE_STATUSES = [Flight.Status.SCHEDULED, Flight.Status.DELAYED]
+
+
+class Leg(NamedTuple):
+    id: int
+    number: str
+    origin_id: int
+    destination_id: int
+    departure_time: datetime.datetime
+    arrival_time: datetime.datetime
+
+
+class FlightGraph:
+    """
+    Time-expanded view of a departure window: legs grouped per airport and per
+    airport pair, sorted by departure time, so finding a connection is a bisect
+    instead of a query.
+    """
+
+    def __init__(self, legs):
+        by_origin = defaultdict(list)
+        by_pair = defaultdict(list)
+        self.feeders = defaultdict(set)
+        for leg in legs:
+            by_origin[leg.origin_id].append(leg)
+            by_pair[(leg.origin_id, leg.destination_id)].append(leg)
+            self.feeders[leg.destination_id].add(leg.origin_id)
+        self.departures = {key: self._timeline(value) for key, value in by_origin.items()}
+        self.routes = {key: self._timeline(value) for key, value in by_pair.items()}
+
+    @staticmethod
+    def _timeline(legs):
+        legs.sort(key=lambda leg: leg.departure_time)
+        return [leg.departure_time for leg in legs], legs
+
+    @staticmethod
+    def _between(timeline, earliest, latest):
+        if timeline is None:
+            return []
+        times, legs = timeline
+        return legs[bisect.bisect_left(times, earliest):bisect.bisect_left(times, latest)]
+
+    def itineraries(self, origin_id, destination_id, start, end, max_stops=MAX_STOPS,
+                    min_connection=MIN_CONNECTION, max_connection=MAX_CONNECTION, limit=MAX_RESULTS):
+        """
+        Direct and connecting paths for first legs departing in [start, end).
+
+        The last leg of a path is always looked up on the (airport, destination)
+        timeline, and the middle leg of a two-stop path only towards airports that
+        feed the destination, so the work stays proportional to real connections.
+        """
+        def connecting(leg, to_id):
+            return self._between(
+                self.routes.get((leg.destination_id, to_id)),
+                leg.arrival_time + min_connection,
+                leg.arrival_time + max_connection,
+            )
+
+        paths = [[leg] for leg in self._between(self.routes.get((origin_id, destination_id)), start, end)]
+        if max_stops >= 1:
+            feeders = self.feeders.get(destination_id, set()) - {origin_id}
+            for first in self._between(self.departures.get(origin_id), start, end):
+                hub = first.destination_id
+                if hub in (origin_id, destination_id):
+                    continue
+                for last in connecting(first, destination_id):
+                    paths.append([first, last])
+                if max_stops < 2:
+                    continue
+                for second_hub in feeders - {hub}:
+                    for middle in connecting(first, second_hub):
+                        for last in connecting(middle, destination_id):
+                            paths.append([first, middle, last])
+
+        paths.sort(key=lambda path: (path[-1].arrival_time, len(path), -path[0].departure_time.timestamp()))
+        return paths[:limit]
+
+
+_graphs = OrderedDict()
+_graphs_lock = threading.Lock()
+_GRAPHS_KEPT = 16
+
+
+def load_legs(start, end):
+    rows = (
+        Flight.objects.filter(
+            status__in=SEARCHABLE_STATUSES,
+            departure_time__gte=start,
+            departure_time__lt=end,
+        )
+        .values_list("id", "number", "origin_id", "destination_id", "departure_time", "arrival_time")
+    )
+    return [Leg(*row) for row in rows.iterator(chunk_size=5000)]
+
+
+def get_graph(day):
+    """
+    Returns the graph for flights that can be part of an itinerary starting on ``day``.
+
+    Graphs are built once per (day, flights version) and kept in-process; stale
+    graphs are simply never hit again. Legs carry the schedule only, so bookings
+    and holds leave them alone: search_routes reads seats and fares live.
+    """
+    key = (day, get_version("flights"))
+    with _graphs_lock:
+        graph = _graphs.get(key)
+        if graph is not None and graph[0] > timezone.now():
+            _graphs.move_to_end(key)
+            return graph[1]
+
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    end = start + datetime.timedelta(days=1) + MAX_STOPS * (MAX_CONNECTION + datetime.timedelta(hours=20))
+    graph = FlightGraph(load_legs(start, end))
+    with _graphs_lock:
+        _graphs[key] = (timezone.now() + datetime.timedelta(seconds=GRAPH_TTL), graph)
+        _graphs.move_to_end(key)
+        while len(_graphs) > _GRAPHS_KEPT:
+            _graphs.popitem(last=False)
+    return graph
+
+
+def search_routes(origin_id, destination_id, day, max_stops=MAX_STOPS, limit=MAX_RESULTS):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    end = start + datetime.timedelta(days=1)
+    graph = get_graph(day)
+    candidates = graph.itineraries(origin_id, destination_id, start, end, max_stops=max_stops, limit=None)
+
+    # Current seats and fares of the best paths' legs, dropping paths with a sold-out leg. Only
+    # when that leaves fewer than ``limit`` is the next page of candidates looked up.
+    inventory, paths = {}, []
+    for offset in range(0, len(candidates), limit):
+        page = candidates[offset:offset + limit]
+        inventory.update(
+            (flight_id, (seats, price)) for flight_id, seats, price in FlightInventory.objects.filter(
+                flight_id__in={leg.id for path in page for leg in path} - inventory.keys()
+            ).values_list("flight_id", "available_count", "min_price")
+        )
+        paths += [path for path in page if all(inventory.get(leg.id, (0, None))[0] > 0 for leg in path)]
+        if len(paths) >= limit:
+            break
+    paths = paths[:limit]
+
+    airport_ids = {airport_id for path in paths for leg in path for airport_id in (leg.origin_id, leg.destination_id)}
+    codes = dict(Airport.objects.filter(id__in=airport_ids).values_list("id", "iata_code"))
+
+    itineraries = []
+    for path in paths:
+        prices = [inventory[leg.id][1] for leg in path]
+        itineraries.append({
+            "stops": len(path) - 1,
+            "departure_time": path[0].departure_time,
+            "arrival_time": path[-1].arrival_time,
+            "duration_minutes": int((path[-1].arrival_time - path[0].departure_time).total_seconds() // 60),
+            "min_price": sum(prices) if all(price is not None for price in prices) else None,
+            "legs": [{
+                "flight_id": leg.id,
+                "number": leg.number,
+                "origin": codes.get(leg.origin_id),
+                "destination": codes.get(leg.destination_id),
+                "departure_time": leg.departure_time,
+                "arrival_time": leg.arrival_time,
+                "available_seats": inventory[leg.id][0],
+            } for leg in path],
+        })
+    return itineraries
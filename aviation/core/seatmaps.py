@@ -0,0 +1,52 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from .inventory import refresh_flight_inventory
+from .models import SeatMapSection, Ticket
+
+FLIGHT_CHUNK = 200
+TICKET_BATCH = 2000
+
+
+def seat_maps(airplane_ids):
+    sections = defaultdict(list)
+    for section in SeatMapSection.objects.filter(airplane_id__in=airplane_ids):
+        sections[section.airplane_id].append(section)
+    return sections
+
+
+def generate_tickets(flights, batch_size=TICKET_BATCH):
+    """
+    Materializes one ticket per seat of the airplane seat map for every flight
+    in the ``flights`` queryset.
+
+    Flights are processed in chunks, each in its own transaction: tickets are
+    inserted with bulk_create and ON CONFLICT DO NOTHING on (flight, seat_number),
+    so re-running over a schedule only fills in missing seats. Returns
+    ``(flights_processed, tickets_created)``.
+    """
+    rows = list(flights.order_by('id').values_list('id', 'airplane_id'))
+    sections = seat_maps({airplane_id for _, airplane_id in rows})
+
+    processed = created = 0
+    for start in range(0, len(rows), FLIGHT_CHUNK):
+        chunk = rows[start:start + FLIGHT_CHUNK]
+        flight_ids = [flight_id for flight_id, _ in chunk]
+        tickets = [
+            Ticket(flight_id=flight_id, seat_number=seat, price=section.base_fare, cabin=section.cabin)
+            for flight_id, airplane_id in chunk
+            for section in sections.get(airplane_id, ())
+            for seat in section.seats()
+        ]
+        with transaction.atomic():
+            before = ticket_count(flight_ids)
+            Ticket.objects.bulk_create(tickets, batch_size=batch_size, ignore_conflicts=True)
+            created += ticket_count(flight_ids) - before
+            refresh_flight_inventory(flight_ids)
+        processed += len(chunk)
+    return processed, created
+
+
+def ticket_count(flight_ids):
+    return Ticket.objects.filter(flight_id__in=flight_ids).count()
@@ -1,6 +1,7 @@
 from rest_framework import serializers
-from .models import Country, Airport, Airline, Airplane, Flight, Ticket
+from .models import CabinClass, Country, Airport, Airline, Airplane, Flight, FlightInventory, SeatMapSection, Ticket
 from users.models import User
+from .flight_import import FORMATS
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -40,17 +41,139 @@ class AirportSerializer(serializers.ModelSerializer):
     )
     class Meta: model = Airport; fields = ['id','name','iata_code','country','country_id']
 
+class AirportAutocompleteQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
 class AirlineSerializer(serializers.ModelSerializer):
     class Meta: model = Airline; fields = '__all__'
 
+class SeatMapSectionSerializer(serializers.ModelSerializer):
+    class Meta: model = SeatMapSection; fields = '__all__'
+
+    def validate(self, attrs):
+        first_row = attrs.get('first_row', getattr(self.instance, 'first_row', None))
+        last_row = attrs.get('last_row', getattr(self.instance, 'last_row', None))
+        if first_row is not None and last_row is not None and last_row < first_row:
+            raise serializers.ValidationError("last_row must not be before first_row.")
+        return attrs
+
 class AirplaneSerializer(serializers.ModelSerializer):
+    seat_map = SeatMapSectionSerializer(many=True, read_only=True)
+
     class Meta: model = Airplane; fields = '__all__'
 
+class FlightInventorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FlightInventory
+        fields = ['available_count', 'held_count', 'booked_count', 'min_price', 'max_price', 'updated_at']
+
 class FlightSerializer(serializers.ModelSerializer):
+    inventory = FlightInventorySerializer(read_only=True)
+
     class Meta: model = Flight; fields = '__all__'
 
+class AvailableSeatSerializer(serializers.ModelSerializer):
+    fare = serializers.DecimalField(source='current_fare', max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Ticket
+        fields = ['id', 'seat_number', 'cabin', 'price', 'fare']
+
+class FlightAvailabilitySerializer(serializers.Serializer):
+    flight = serializers.IntegerField(source='id')
+    inventory = FlightInventorySerializer(allow_null=True)
+    seats = AvailableSeatSerializer(many=True)
+
+class CabinFareSerializer(serializers.Serializer):
+    cabin = serializers.ChoiceField(choices=CabinClass.choices)
+    multiplier = serializers.DecimalField(max_digits=6, decimal_places=3)
+    seat_count = serializers.IntegerField()
+    available_count = serializers.IntegerField()
+    min_fare = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    max_fare = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+
+class FlightFaresSerializer(serializers.Serializer):
+    flight = serializers.IntegerField()
+    cabins = CabinFareSerializer(many=True)
+
+class FlightImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=FORMATS, required=False,
+                                     help_text="Defaults to csv for *.csv uploads, jsonl otherwise.")
+    dry_run = serializers.BooleanField(default=False)
+
 class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
-        fields = ['id', 'seat_number', 'price', 'status', 'flight', 'order']
-        read_only_fields = ['order']
\ No newline at end of file
+        fields = ['id', 'seat_number', 'cabin', 'price', 'fare', 'status', 'hold_expires_at', 'flight', 'order']
+        # Status and holds only change through booking and orders.lifecycle.
+        read_only_fields = ['order', 'status', 'hold_expires_at', 'fare']
+
+class RouteSearchQuerySerializer(serializers.Serializer):
+    origin = serializers.CharField(max_length=3, help_text="Origin IATA code")
+    destination = serializers.CharField(max_length=3, help_text="Destination IATA code")
+    date = serializers.DateField()
+    max_stops = serializers.IntegerField(min_value=0, max_value=2, default=2)
+
+    def _airport_id(self, code):
+        airport_id = Airport.objects.filter(iata_code__iexact=code).values_list('id', flat=True).first()
+        if airport_id is None:
+            raise serializers.ValidationError(f"Unknown airport {code}.")
+        return airport_id
+
+    def validate_origin(self, value):
+        return self._airport_id(value)
+
+    def validate_destination(self, value):
+        return self._airport_id(value)
+
+class FareCalendarQuerySerializer(serializers.Serializer):
+    origin = serializers.RegexField(r'^[A-Za-z]{3}$', help_text="Origin IATA code")
+    destination = serializers.RegexField(r'^[A-Za-z]{3}$', help_text="Destination IATA code")
+    start = serializers.DateField(required=False, help_text="First day, today by default.")
+    days = serializers.IntegerField(min_value=1, max_value=90, default=60)
+
+class FareCalendarDaySerializer(serializers.Serializer):
+    day = serializers.DateField()
+    min_fare = serializers.DecimalField(max_digits=10, decimal_places=2)
+    cheapest_flight = serializers.IntegerField(source='cheapest_flight_id', allow_null=True)
+    flight_count = serializers.IntegerField()
+    available_count = serializers.IntegerField()
+
+class RouteLegSerializer(serializers.Serializer):
+    flight_id = serializers.IntegerField()
+    number = serializers.CharField()
+    origin = serializers.CharField()
+    destination = serializers.CharField()
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    available_seats = serializers.IntegerField()
+
+class ItinerarySerializer(serializers.Serializer):
+    stops = serializers.IntegerField()
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    duration_minutes = serializers.IntegerField()
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    legs = RouteLegSerializer(many=True)
+
+class GenerateTicketsSerializer(serializers.Serializer):
+    flights = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    departure_from = serializers.DateTimeField(required=False)
+    departure_to = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('flights') and not (attrs.get('departure_from') and attrs.get('departure_to')):
+            raise serializers.ValidationError("Pass flight ids or a departure_from/departure_to range.")
+        return attrs
+
+    def flights_queryset(self):
+        flights = Flight.objects.all()
+        if self.validated_data.get('flights'):
+            flights = flights.filter(id__in=self.validated_data['flights'])
+        if self.validated_data.get('departure_from'):
+            flights = flights.filter(departure_time__gte=self.validated_data['departure_from'])
+        if self.validated_data.get('departure_to'):
+            flights = flights.filter(departure_time__lt=self.validated_data['departure_to'])
+        return flights
\ No newline at end of file
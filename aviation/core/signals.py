@@ -0,0 +1,93 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from orders.models import Order
+from . import airport_resolver
+from .cache import bump_version
+from .fare_calendar import refresh_fare_calendar, route_day
+from .inventory import refresh_flight_inventory
+from .models import Airline, Airplane, Airport, AirportAlias, Country, Flight, SeatMapSection, Ticket
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, **kwargs):
+    refresh_flight_inventory([instance.flight_id])
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, origin=None, **kwargs):
+    # Cascading flight deletes remove the inventory row as well; nothing to refresh.
+    if isinstance(origin, Ticket) or getattr(origin, 'model', None) is Ticket:
+        refresh_flight_inventory([instance.flight_id])
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    if instance.status == 'cancelled':
+        flight_ids = instance.tickets.values_list('flight_id', flat=True).distinct()
+        refresh_flight_inventory(list(flight_ids))
+
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+def flight_changed(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, "flights"))
+
+
+@receiver(pre_save, sender=Flight)
+def flight_saving(sender, instance, raw=False, **kwargs):
+    # Remember the route-day the flight may be leaving; post_save refreshes it.
+    if instance.pk is None or raw:
+        return
+    previous = Flight.objects.filter(pk=instance.pk).values_list('origin_id', 'destination_id', 'departure_time').first()
+    instance._previous_route_day = route_day(*previous) if previous else None
+
+
+@receiver(post_save, sender=Flight)
+def flight_saved(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    # A new departure time or status reprices the flight and moves it in the fare calendar.
+    previous = getattr(instance, '_previous_route_day', None)
+    refresh_flight_inventory([instance.pk], route_days=[previous] if previous else ())
+
+
+@receiver(post_delete, sender=Flight)
+def flight_deleted(sender, instance, **kwargs):
+    refresh_fare_calendar([route_day(instance.origin_id, instance.destination_id, instance.departure_time)])
+
+
+# Versions are bumped after commit; bumping earlier would let a concurrent
+# request cache the pre-commit rows under the new version.
+# Airports embed their country and airplanes their seat map, so those changes
+# invalidate the embedding list too.
+REFERENCE_RESOURCES = {
+    Country: ["countries", "airports"],
+    Airport: ["airports"],
+    AirportAlias: ["airports"],
+    Airline: ["airlines"],
+    Airplane: ["airplanes"],
+    SeatMapSection: ["airplanes"],
+}
+
+
+def reference_data_changed(sender, **kwargs):
+    for resource in REFERENCE_RESOURCES[sender]:
+        transaction.on_commit(partial(bump_version, resource))
+
+
+for model in REFERENCE_RESOURCES:
+    post_save.connect(reference_data_changed, sender=model)
+    post_delete.connect(reference_data_changed, sender=model)
+
+
+@receiver([post_save, post_delete], sender=Country)
+@receiver([post_save, post_delete], sender=Airport)
+@receiver([post_save, post_delete], sender=AirportAlias)
+def airports_changed(sender, **kwargs):
+    # Only after the commit: a rebuild inside the transaction would keep serving
+    # its rows after a rollback. Other processes follow the "airports" version bump.
+    transaction.on_commit(airport_resolver.invalidate)
@@ -0,0 +1,15 @@
+import logging
+
+from celery import shared_task
+
+from . import inventory
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_stale_fares():
+    refreshed = inventory.refresh_stale_fares()
+    if refreshed:
+        logger.info("Repriced %s flights that reached the next fare tier", refreshed)
+    return refreshed
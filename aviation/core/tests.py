@@ -0,0 +1,816 @@
+import json
+import random
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.contrib.auth import get_user_model
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import airport_resolver, async_views
+from .airport_resolver import AirportResolver, fold
+from .cache import bump_version
+from .fare_calendar import fare_calendar
+from orders.booking import book_tickets
+from .inventory import refresh_flight_inventory, refresh_stale_fares
+from .models import (
+    Country, Airport, AirportAlias, Airline, Airplane, FareBucket, Flight, FlightInventory, SeatMapSection, Ticket,
+)
+from .pagination import IdCursorPagination
+from .pricing import fare, fare_multiplier, quote, ticket_fare
+from .search import MAX_CONNECTION, MAX_RESULTS, MIN_CONNECTION, FlightGraph, Leg, get_graph
+from .seatmaps import generate_tickets
+
+
+def create_flight(number="TA100", origin=None, destination=None, departure=None):
+    country, _ = Country.objects.get_or_create(code="UA", defaults={"name": "Ukraine"})
+    origin = origin or Airport.objects.get_or_create(
+        iata_code="LWO", defaults={"name": "Lviv", "country": country})[0]
+    destination = destination or Airport.objects.get_or_create(
+        iata_code="KRK", defaults={"name": "Krakow", "country": country})[0]
+    airline, _ = Airline.objects.get_or_create(
+        code="TA", defaults={"name": "TestAir", "airport": origin})
+    airplane, _ = Airplane.objects.get_or_create(
+        registration="UR-TEST",
+        defaults={"model": "Boeing 737", "seats_count": 180, "airline": airline})
+    departure = departure or timezone.now() + timedelta(days=1)
+    return Flight.objects.create(
+        number=number, origin=origin, destination=destination, airplane=airplane,
+        departure_time=departure, arrival_time=departure + timedelta(hours=1),
+    )
+
+
+def fresh_resolver():
+    """
+    Rebuilds the process-wide airport resolver from the current test's rows;
+    TestCase never runs the on-commit invalidation that would do it.
+    """
+    airport_resolver.invalidate()
+    return airport_resolver.airport_resolver()
+
+
+class ConstantQueriesMixin:
+    """
+    Runs ``fetch`` before and after ``grow`` adds more rows; both runs must issue
+    the same number of queries, which is what an N+1 regression breaks.
+    """
+
+    def assertConstantQueries(self, fetch, grow):
+        with CaptureQueriesContext(connection) as small:
+            fetch()
+        with self.captureOnCommitCallbacks(execute=True):
+            grow()
+        with CaptureQueriesContext(connection) as large:
+            fetch()
+        self.assertEqual(
+            len(small), len(large),
+            "query count grew with row count:\n" + "\n".join(q["sql"] for q in large.captured_queries),
+        )
+
+class FlightInventoryTests(TestCase):
+    def setUp(self):
+        self.flight = create_flight()
+        for seat, price in [("1A", "100.00"), ("1B", "150.00"), ("2A", "90.00")]:
+            Ticket.objects.create(flight=self.flight, seat_number=seat, price=Decimal(price))
+
+    def test_inventory_follows_ticket_changes(self):
+        inventory = FlightInventory.objects.get(flight=self.flight)
+        self.assertEqual(inventory.available_count, 3)
+        # Current fares: economy a day before departure sells at 1.6 times the base price.
+        self.assertEqual(inventory.min_price, Decimal("144.00"))
+        self.assertEqual(inventory.max_price, Decimal("240.00"))
+
+        ticket = Ticket.objects.get(flight=self.flight, seat_number="2A")
+        ticket.status = "booked"
+        ticket.save()
+
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.available_count, 2)
+        self.assertEqual(inventory.booked_count, 1)
+        self.assertEqual(inventory.min_price, Decimal("160.00"))
+
+    def test_rebuild_command_fixes_drift(self):
+        Ticket.objects.filter(flight=self.flight).update(status="booked")
+        call_command("rebuild_inventory", stdout=StringIO())
+
+        inventory = FlightInventory.objects.get(flight=self.flight)
+        self.assertEqual(inventory.available_count, 0)
+        self.assertEqual(inventory.booked_count, 3)
+        self.assertIsNone(inventory.min_price)
+
+    def test_flight_delete_cascades_inventory(self):
+        self.flight.delete()
+        self.assertFalse(FlightInventory.objects.exists())
+
+
+class FarePricingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = create_flight(departure=timezone.now() + timedelta(days=30))
+        self.economy = [
+            Ticket.objects.create(flight=self.flight, seat_number=f"{row}A", price=Decimal("100.00"))
+            for row in range(10, 20)
+        ]
+        Ticket.objects.create(flight=self.flight, seat_number="1A", price=Decimal("300.00"), cabin="business")
+
+    def fares(self):
+        return {row["cabin"]: row for row in quote(self.flight.id)}
+
+    def test_multiplier_tiers(self):
+        now = timezone.now()
+        self.assertEqual(fare_multiplier("economy", 0, 100, now + timedelta(days=90), now)[0], Decimal("0.900"))
+        multiplier, valid_until = fare_multiplier("economy", 95, 100, now + timedelta(hours=12), now)
+        self.assertEqual((multiplier, valid_until), (Decimal("2.560"), now + timedelta(hours=12)))
+        # Business passes on half of the same 1.56 markup.
+        self.assertEqual(fare_multiplier("business", 95, 100, now + timedelta(hours=12), now)[0], Decimal("1.780"))
+        self.assertEqual(fare_multiplier("economy", 0, 0, now - timedelta(hours=1), now)[1], None)
+
+    def test_buckets_follow_bookings_and_quotes_come_from_cache(self):
+        fares = self.fares()
+        self.assertEqual((fares["economy"]["multiplier"], fares["economy"]["min_fare"]),
+                         (Decimal("1.000"), Decimal("100.00")))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.fares(), fares)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = book_tickets(self.user, [ticket.id for ticket in self.economy[:5]], payment_method="card")
+        self.assertEqual(order.amount, Decimal("500.00"))
+
+        fares = self.fares()
+        self.assertEqual((fares["economy"]["multiplier"], fares["economy"]["available_count"]), (Decimal("1.150"), 5))
+        self.assertEqual(fares["economy"]["min_fare"], Decimal("115.00"))
+        self.assertEqual(fares["business"]["multiplier"], Decimal("1.000"))
+        # The next seat is held at the new fare and the order total is summed from the held fares.
+        self.assertEqual(book_tickets(self.user, [self.economy[5].id], payment_method="card").amount, Decimal("115.00"))
+
+    def test_sql_fare_rounds_like_python(self):
+        Ticket.objects.filter(pk=self.economy[0].pk).update(price=Decimal("10.05"))
+        Ticket.objects.filter(pk__in=[t.pk for t in self.economy[1:]]).update(status="booked")
+        refresh_flight_inventory([self.flight.id])
+
+        bucket = FareBucket.objects.get(flight=self.flight, cabin="economy")
+        self.assertEqual(bucket.multiplier, Decimal("1.600"))
+        sql_fare = Ticket.objects.filter(pk=self.economy[0].pk).annotate(current=ticket_fare()).get().current
+        self.assertEqual(sql_fare, fare(Decimal("10.05"), bucket.multiplier))
+        self.assertEqual(sql_fare, bucket.min_fare)
+
+    def test_stale_fares_are_repriced_at_the_next_tier(self):
+        now = timezone.now()
+        Flight.objects.filter(pk=self.flight.pk).update(departure_time=now + timedelta(days=8))
+        refresh_flight_inventory([self.flight.id], now)
+        self.assertEqual(refresh_stale_fares(now), 0)
+
+        later = now + timedelta(days=1, minutes=1)
+        self.assertEqual(refresh_stale_fares(later), 1)
+        self.assertEqual(refresh_stale_fares(later), 0)
+        bucket = FareBucket.objects.get(flight=self.flight, cabin="economy")
+        self.assertEqual((bucket.multiplier, bucket.valid_until), (Decimal("1.350"), now + timedelta(days=6)))
+
+    def test_fares_endpoint(self):
+        resp = self.client.get(reverse("flight-fares", args=[self.flight.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([(row["cabin"], row["min_fare"]) for row in resp.data["cabins"]],
+                         [("business", "300.00"), ("economy", "100.00")])
+        empty = create_flight("TA200")
+        self.assertEqual(self.client.get(reverse("flight-fares", args=[empty.id])).data["cabins"], [])
+        self.assertEqual(self.client.get(reverse("flight-fares", args=[0])).status_code, 404)
+
+    def test_rebuild_command_reprices_flights_without_buckets(self):
+        FareBucket.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_inventory", stdout=out)
+        self.assertIn("fixed 1 with drifted", out.getvalue())
+        self.assertEqual(FareBucket.objects.filter(flight=self.flight).count(), 2)
+
+
+class FareCalendarTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+        self.flights = {}
+
+    def add_flight(self, number, day, prices, **fields):
+        departure = timezone.make_aware(datetime.combine(self.today + timedelta(days=day), datetime.min.time()))
+        flight = create_flight(number, departure=departure + timedelta(hours=12), **fields)
+        Ticket.objects.bulk_create(
+            Ticket(flight=flight, seat_number=f"{n + 1}A", price=Decimal(price)) for n, price in enumerate(prices)
+        )
+        refresh_flight_inventory([flight.id])
+        fresh_resolver()
+        self.flights[number] = flight
+        return flight
+
+    def calendar(self, **params):
+        resp = self.client.get(reverse("fare-calendar"), {"origin": "lwo", "destination": "KRK", **params})
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return {(date.fromisoformat(row["day"]) - self.today).days: row for row in resp.data}
+
+    def test_cheapest_fare_per_day_follows_bookings(self):
+        self.add_flight("TA1", 30, ["120.00", "150.00", "150.00"])
+        self.add_flight("TA2", 30, ["90.00", "200.00", "200.00"])
+        self.add_flight("TA3", 31, ["300.00"])
+
+        days = self.calendar()
+        self.assertEqual({day: (row["min_fare"], row["flight_count"]) for day, row in days.items()},
+                         {30: ("90.00", 2), 31: ("300.00", 1)})
+        self.assertEqual(days[30]["cheapest_flight"], self.flights["TA2"].id)
+
+        cheapest = Ticket.objects.get(flight=self.flights["TA2"], price=Decimal("90.00"))
+        book_tickets(self.user, [cheapest.id], payment_method="card")
+        book_tickets(self.user, list(Ticket.objects.filter(flight=self.flights["TA3"]).values_list("id", flat=True)),
+                     payment_method="card")
+
+        days = self.calendar()
+        self.assertEqual({day: (row["min_fare"], row["cheapest_flight"]) for day, row in days.items()},
+                         {30: ("120.00", self.flights["TA1"].id)})
+
+    def test_flight_changes_move_it_in_the_calendar(self):
+        flight = self.add_flight("TA1", 30, ["100.00"])
+        self.add_flight("TA2", 32, ["250.00"])
+
+        flight.departure_time += timedelta(days=2)
+        flight.save()
+        self.assertEqual({day: row["min_fare"] for day, row in self.calendar().items()}, {32: "100.00"})
+
+        flight.status = Flight.Status.CANCELLED
+        flight.save()
+        self.assertEqual({day: row["min_fare"] for day, row in self.calendar().items()}, {32: "250.00"})
+
+        self.flights["TA2"].delete()
+        self.assertEqual(self.calendar(), {})
+
+    def test_calendar_window_and_validation(self):
+        for day in (0, 59, 60):
+            self.add_flight(f"TA{day}", day, ["100.00"])
+        self.assertEqual(sorted(self.calendar()), [0, 59])
+        start = (self.today + timedelta(days=59)).isoformat()
+        self.assertEqual(sorted(self.calendar(start=start, days=2)), [59, 60])
+
+        resp = self.client.get(reverse("fare-calendar"), {"origin": "XXX", "destination": "KRK"})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("origin", resp.data)
+
+    def test_calendar_is_one_indexed_query(self):
+        country, _ = Country.objects.get_or_create(code="UA", defaults={"name": "Ukraine"})
+        other = Airport.objects.create(iata_code="WAW", name="Warsaw", country=country)
+        for day in range(60):
+            self.add_flight(f"TA{day}", day, ["100.00"])
+            self.add_flight(f"TW{day}", day, ["100.00"], destination=other)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.calendar()), 60)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE core_routefareday")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        lwo, krk = self.flights["TA0"].origin_id, self.flights["TA0"].destination_id
+        plan = fare_calendar(lwo, krk, self.today, 60).explain()
+        self.assertIn("route_fare_day_unique", plan)
+
+
+def explain(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN " + sql, params)
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+
+class SearchIndexTests(TestCase):
+    """
+    A few thousand flights are analyzed first so plans do not depend on statistics
+    left behind by other tests; sequential scans are still disabled to make the
+    planner show which index it would pick for each hot-path query.
+    """
+
+    def setUp(self):
+        self.flight = create_flight()
+        rnd = random.Random(3)
+        # Few airports, so each one has hundreds of flights and the departure range
+        # is what narrows a route down, as it is with a real schedule.
+        airports = [self.flight.origin, self.flight.destination] + [
+            Airport.objects.create(iata_code=f"X{n:02d}", name=f"Airport {n}", country=self.flight.origin.country)
+            for n in range(6)
+        ]
+        statuses = [Flight.Status.SCHEDULED] * 9 + [Flight.Status.DEPARTED]
+        flights = []
+        for n in range(3000):
+            origin, destination = rnd.sample(airports, 2)
+            departs = timezone.now() + timedelta(minutes=rnd.randrange(-30 * 24 * 60, 30 * 24 * 60))
+            flights.append(Flight(
+                number=f"S{n}", origin=origin, destination=destination, airplane=self.flight.airplane,
+                departure_time=departs, arrival_time=departs + timedelta(hours=2), status=rnd.choice(statuses),
+            ))
+        Flight.objects.bulk_create(flights)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE core_flight, core_airport")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def test_route_filter_uses_composite_index(self):
+        qs = Flight.objects.filter(
+            origin=self.flight.origin, destination=self.flight.destination,
+            departure_time__gte=timezone.now(),
+        )
+        self.assertIn("flight_route_departure_idx", qs.explain())
+
+    def test_status_window_uses_composite_index(self):
+        qs = Flight.objects.filter(
+            status=Flight.Status.SCHEDULED,
+            departure_time__gte=timezone.now(),
+            departure_time__lt=timezone.now() + timedelta(days=2),
+        ).order_by("departure_time")
+        self.assertIn("flight_status_departure_idx", qs.explain())
+
+    def test_iata_lookup_uses_functional_index(self):
+        self.assertIn("airport_iata_upper_idx", Airport.objects.filter(iata_code__iexact="krk").explain())
+
+    def test_assistant_search_queries_use_indexes(self):
+        from assistant.tools import search_flights
+
+        day = self.flight.departure_time.date().isoformat()
+        fresh_resolver()
+        with CaptureQueriesContext(connection) as ctx:
+            search_flights("KRK", "LWO", date_from=day)
+        sql = ctx.captured_queries[0]["sql"]
+
+        self.assertNotIn("::date", sql)
+        plan = explain(sql)
+        # Which flight index wins depends on the airports matched; the departure
+        # range just has to be an index condition rather than a per-row filter.
+        self.assertRegex(plan, r"Index Cond: \(.*departure_time >= ")
+        self.assertNotIn("Seq Scan on core_flight", plan)
+
+
+class RouteSearchTests(TestCase):
+    def setUp(self):
+        # Fresh data versions, so no test reuses a graph cached by another one.
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="u", email="u@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        country = Country.objects.create(code="XX", name="X")
+        self.lwo, self.waw, self.jfk = (
+            Airport.objects.create(iata_code=code, name=code, country=country) for code in ("LWO", "WAW", "JFK")
+        )
+        self.day = (timezone.now() + timedelta(days=3)).date()
+        self.at = lambda hour, minute=0: timezone.make_aware(datetime(self.day.year, self.day.month, self.day.day, hour, minute))
+
+    def add_flight(self, number, origin, destination, departs, arrives):
+        flight = create_flight(number, origin, destination, departs)
+        Flight.objects.filter(pk=flight.pk).update(arrival_time=arrives)
+        Ticket.objects.create(flight=flight, seat_number="1A", price=Decimal("100.00"))
+        return flight
+
+    def search(self, **params):
+        params = {"origin": "lwo", "destination": "JFK", "date": self.day.isoformat(), **params}
+        return self.client.get(reverse("route-search"), params)
+
+    def test_direct_and_connecting_itineraries(self):
+        self.add_flight("D1", self.lwo, self.jfk, self.at(9), self.at(20))
+        self.add_flight("C1", self.lwo, self.waw, self.at(10), self.at(11))
+        self.add_flight("C2", self.waw, self.jfk, self.at(11, 30), self.at(19))
+        self.add_flight("C3", self.waw, self.jfk, self.at(12), self.at(21))
+
+        resp = self.search()
+
+        self.assertEqual(resp.status_code, 200, resp.data)
+        routes = [[leg["number"] for leg in itinerary["legs"]] for itinerary in resp.data]
+        # C2 leaves 30 minutes after C1 lands, below the minimum connection time.
+        self.assertEqual(routes, [["D1"], ["C1", "C3"]])
+        self.assertEqual(resp.data[1]["stops"], 1)
+        # Two legs at their current fare, 1.35 times the base price three days out.
+        self.assertEqual(Decimal(resp.data[1]["min_price"]), Decimal("270.00"))
+
+        resp = self.search(max_stops=0)
+        self.assertEqual([it["legs"][0]["number"] for it in resp.data], ["D1"])
+
+    def test_bookings_keep_cached_graph_but_show_live_seats(self):
+        flight = self.add_flight("D1", self.lwo, self.jfk, self.at(9), self.at(20))
+        self.assertEqual(self.search().data[0]["legs"][0]["available_seats"], 1)
+        graph = get_graph(self.day)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book_tickets(self.user, [Ticket.objects.get(flight=flight).id], payment_method="card")
+        self.assertEqual(self.search().data, [])
+        self.assertIs(get_graph(self.day), graph)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_core", "--case", "search", "--flights", "500", "--searches", "5", stdout=out)
+        self.assertIn("ms p95", out.getvalue())
+        self.assertFalse(Flight.objects.exists())
+
+    def test_unknown_airport_is_rejected(self):
+        self.assertEqual(self.search(origin="ZZZ").status_code, 400)
+
+
+class BookingBenchmarkTests(TransactionTestCase):
+    def test_benchmark_cleans_up(self):
+        out = StringIO()
+        call_command("benchmark_core", "--case", "booking", "--bookings", "20", "--threads", "2", stdout=out)
+        self.assertIn("attempts/s", out.getvalue())
+        self.assertIn("bookings/s", out.getvalue())
+        self.assertFalse(Flight.objects.exists())
+        self.assertFalse(Ticket.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class FlightGraphTests(SimpleTestCase):
+    flights = 2_000
+    airports = 100
+    hubs = 6
+
+    def test_itineraries_on_busy_day(self):
+        rnd = random.Random(7)
+        start = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+        legs = []
+        for n in range(self.flights):
+            # Hub-and-spoke network: most flights touch one of the hubs.
+            origin = rnd.randrange(self.hubs) if n % 2 else rnd.randrange(self.airports)
+            destination = rnd.randrange(self.airports) if n % 2 else rnd.randrange(self.hubs)
+            if origin == destination:
+                continue
+            departs = start + timedelta(minutes=rnd.randrange(24 * 60))
+            legs.append(Leg(n, f"F{n}", origin, destination, departs,
+                            departs + timedelta(minutes=rnd.randrange(60, 600))))
+        graph = FlightGraph(legs)
+
+        found = 0
+        for _ in range(20):
+            origin, destination = rnd.sample(range(self.hubs, self.airports), 2)
+            paths = graph.itineraries(origin, destination, start, start + timedelta(days=1))
+            self.assertLessEqual(len(paths), MAX_RESULTS)
+            self.assertEqual(paths, sorted(paths, key=lambda path: (path[-1].arrival_time, len(path))))
+            for path in paths:
+                self.assertEqual((path[0].origin_id, path[-1].destination_id), (origin, destination))
+                self.assertTrue(start <= path[0].departure_time < start + timedelta(days=1))
+                for leg, following in zip(path, path[1:]):
+                    self.assertEqual(leg.destination_id, following.origin_id)
+                    self.assertTrue(MIN_CONNECTION <= following.departure_time - leg.arrival_time <= MAX_CONNECTION)
+            found += len(paths)
+        self.assertGreater(found, 0)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="u", password="x"))
+        base = timezone.now() + timedelta(days=1)
+        self.flights = [create_flight(f"TA{n}", departure=base + timedelta(hours=n % 3)) for n in range(7)]
+
+    def test_flights_page_by_departure_without_counting(self):
+        expected = sorted(self.flights, key=lambda f: (f.departure_time, f.id))
+        seen, url = [], reverse("flight-list") + "?page_size=3"
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                resp = self.client.get(url)
+                self.assertEqual(resp.status_code, 200)
+                self.assertNotIn("count", resp.data)
+                seen += [flight["id"] for flight in resp.data["results"]]
+                url = resp.data["next"]
+
+        self.assertEqual(seen, [flight.id for flight in expected])
+        self.assertFalse(any("COUNT(" in query["sql"] for query in ctx.captured_queries))
+
+    def test_page_size_is_capped(self):
+        request = Request(APIRequestFactory().get("/", {"page_size": 10_000}))
+        self.assertEqual(IdCursorPagination().get_page_size(request), IdCursorPagination.max_page_size)
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="u", password="x"))
+        create_flight()
+        self.url = reverse("airports-generic")
+
+    def test_list_is_served_from_cache_and_revalidated_by_etag(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.data, first.data)
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Airport.objects.create(iata_code="WAW", name="Warsaw", country=Country.objects.first())
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+        self.assertEqual(len(changed.data["results"]), 3)
+
+    def test_country_change_invalidates_airports(self):
+        etag = self.client.get(self.url)["ETag"]
+        country = Country.objects.first()
+        country.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            country.save()
+        self.assertNotEqual(self.client.get(self.url)["ETag"], etag)
+
+
+
+class ListQueryCountTests(ConstantQueriesMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="u", password="x"))
+        self.flight = create_flight("TA0")
+
+    def grow(self):
+        country = Country.objects.create(code=f"C{Country.objects.count()}", name="Extra")
+        for n in range(1, 4):
+            origin = Airport.objects.create(iata_code=f"X{n}{country.pk % 10}", name=f"Extra {n}", country=country)
+            airline = Airline.objects.create(code=f"A{n}{country.pk}", name="Extra", airport=origin)
+            airplane = Airplane.objects.create(registration=f"R{n}{country.pk}", model="A320", seats_count=3, airline=airline)
+            flight = create_flight(f"TA{n}{country.pk}", origin=origin, destination=self.flight.destination)
+            Flight.objects.filter(pk=flight.pk).update(airplane=airplane)
+            for seat in ("1A", "1B"):
+                Ticket.objects.create(flight=flight, seat_number=seat, price=Decimal("10.00"))
+
+    def test_list_endpoints(self):
+        for name in ["flight-list", "tickets-list", "countries-generic", "airports-generic",
+                     "airlines-list", "airplane-list"]:
+            with self.subTest(endpoint=name):
+                url = reverse(name)
+                self.assertConstantQueries(lambda: self.client.get(url, {"page_size": 100}), self.grow)
+
+    def test_route_search(self):
+        params = {"origin": "LWO", "destination": "KRK", "date": self.flight.departure_time.date().isoformat()}
+        self.assertConstantQueries(lambda: self.client.get(reverse("route-search"), params), self.grow)
+
+
+
+class TicketGenerationTests(TestCase):
+    def setUp(self):
+        base = timezone.now() + timedelta(days=1)
+        self.flights = [create_flight(f"TA{n}", departure=base + timedelta(hours=n)) for n in range(20)]
+        airplane = self.flights[0].airplane
+        SeatMapSection.objects.create(airplane=airplane, cabin="business", first_row=1, last_row=3,
+                                      seat_letters="ACDF", base_fare=Decimal("400.00"))
+        SeatMapSection.objects.create(airplane=airplane, first_row=4, last_row=30,
+                                      seat_letters="ABCDEF", base_fare=Decimal("80.00"))
+        self.seats = 3 * 4 + 27 * 6
+
+    def test_generation_is_bulk_and_idempotent(self):
+        Ticket.objects.create(flight=self.flights[0], seat_number="1A", price=Decimal("1.00"))
+        flights = Flight.objects.filter(id__in=[f.id for f in self.flights])
+
+        with CaptureQueriesContext(connection) as ctx:
+            processed, created = generate_tickets(flights)
+
+        self.assertEqual((processed, created), (20, 20 * self.seats - 1))
+        # Per chunk of flights, including their fare buckets and fare calendar days.
+        self.assertLess(len(ctx.captured_queries), 25)
+        self.assertEqual(generate_tickets(flights), (20, 0))
+        inventory = FlightInventory.objects.get(flight=self.flights[1])
+        self.assertEqual(inventory.available_count, self.seats)
+        self.assertEqual((inventory.min_price, inventory.max_price), (Decimal("128.00"), Decimal("520.00")))
+        self.assertEqual(Ticket.objects.get(flight=self.flights[1], seat_number="2C").cabin, "business")
+
+    def test_endpoint_requires_admin(self):
+        client = APIClient()
+        user = get_user_model().objects.create_user(username="ops", password="x")
+        client.force_authenticate(user)
+        url = reverse("tickets-generate")
+        self.assertEqual(client.post(url, {"flights": [self.flights[0].id]}, format="json").status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        resp = client.post(url, {"flights": [self.flights[0].id]}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data, {"flights": 1, "created": self.seats})
+
+
+class TicketWriteTests(TestCase):
+    def setUp(self):
+        self.ticket = Ticket.objects.create(flight=create_flight(), seat_number="1A", price=Decimal("10.00"))
+        self.user = get_user_model().objects.create_user(username="flyer", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("tickets-detail", args=[self.ticket.pk])
+
+    def test_only_admins_write_tickets(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.patch(self.url, {"price": "1.00"}, format="json").status_code, 403)
+        self.assertEqual(self.client.delete(self.url).status_code, 403)
+        self.assertEqual(self.client.post(reverse("tickets-list"), {}, format="json").status_code, 403)
+
+    def test_status_is_read_only(self):
+        self.user.is_staff = True
+        self.user.save()
+        resp = self.client.patch(self.url, {"status": "booked", "hold_expires_at": timezone.now()}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        self.ticket.refresh_from_db()
+        self.assertEqual((self.ticket.status, self.ticket.hold_expires_at), (Ticket.Status.AVAILABLE, None))
+
+
+class FlightImportTests(TestCase):
+    def setUp(self):
+        self.existing = create_flight("TA1")
+        Airport.objects.create(iata_code="WAW", name="Warsaw", country=self.existing.origin.country)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="ops", email="ops@example.com", password="x", is_staff=True))
+
+    def upload(self, name, content, **data):
+        return self.client.post(reverse("flight-import"), {"file": SimpleUploadedFile(name, content), **data})
+
+    def test_csv_upload_upserts_and_reports_row_errors(self):
+        content = (
+            "number,origin,destination,departure_time,arrival_time,airplane,status\n"
+            "TA1,lwo,WAW,2030-01-01T08:00:00Z,2030-01-01T09:30:00Z,UR-TEST,delayed\n"
+            "TA2,KRK,WAW,2030-01-01T10:00:00Z,2030-01-01T11:00:00Z,UR-TEST,\n"
+            "TA3,XXX,WAW,2030-01-01T10:00:00Z,2030-01-01T11:00:00Z,UR-TEST,\n"
+            "TA4,KRK,WAW,2030-01-01T10:00:00Z,2030-01-01T09:00:00Z,UR-NONE,scheduled\n"
+        ).encode()
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.upload("schedule.csv", content)
+
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual({k: resp.data[k] for k in ("rows", "created", "updated", "failed")},
+                         {"rows": 4, "created": 1, "updated": 1, "failed": 2})
+        self.assertEqual([(e["line"], sorted(e["errors"])) for e in resp.data["errors"]],
+                         [(4, ["origin"]), (5, ["airplane", "arrival_time"])])
+        # Per chunk, including repricing the updated flight and its old and new fare calendar days.
+        self.assertLess(len(ctx.captured_queries), 20)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.destination.iata_code, self.existing.status), ("WAW", "delayed"))
+        self.assertEqual(Flight.objects.get(number="TA2").status, "scheduled")
+
+    def test_dry_run_and_admin_only(self):
+        content = b'{"number": "TA9", "origin": "KRK", "destination": "WAW", "airplane": "UR-TEST", ' \
+                  b'"departure_time": "2030-01-01T10:00", "arrival_time": "2030-01-01T11:00"}\nnot json\n'
+        resp = self.upload("schedule.jsonl", content, dry_run=True)
+        self.assertEqual((resp.data["created"], resp.data["failed"]), (1, 1))
+        self.assertFalse(Flight.objects.filter(number="TA9").exists())
+
+        self.client.force_authenticate(get_user_model().objects.create_user(username="user", email="user@example.com", password="x"))
+        self.assertEqual(self.upload("schedule.jsonl", content).status_code, 403)
+
+
+class FlightImportVolumeTests(TestCase):
+    rows = 5_000
+
+    def test_import_spanning_chunks(self):
+        origin = create_flight().origin
+        airports = [origin] + [
+            Airport.objects.create(iata_code=f"Q{n:02d}", name=f"Airport {n}", country=origin.country)
+            for n in range(30)
+        ]
+        start = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+        lines = []
+        for n in range(self.rows):
+            departs = start + timedelta(minutes=n)
+            first, second = airports[n % 31], airports[(n + 1) % 31]
+            lines.append(json.dumps({
+                "number": f"B{n}", "origin": first.iata_code, "destination": second.iata_code,
+                "airplane": "UR-TEST", "departure_time": departs.isoformat(),
+                "arrival_time": (departs + timedelta(hours=2)).isoformat(),
+            }))
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as schedule:
+            schedule.write("\n".join(lines))
+            schedule.flush()
+            call_command("import_flights", schedule.name, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(Flight.objects.filter(number__startswith="B").count(), self.rows)
+
+    def test_benchmark_command_rolls_back(self):
+        out = StringIO()
+        call_command("benchmark_core", "--case", "import", "--rows", "50", stdout=out)
+        self.assertIn("flights/min", out.getvalue())
+        self.assertFalse(Flight.objects.exists())
+        self.assertFalse(Airport.objects.exists())
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        base = timezone.now() + timedelta(days=1)
+        self.flights = [create_flight(f"TA{n}", departure=base + timedelta(hours=n)) for n in range(3)]
+        Ticket.objects.create(flight=self.flights[0], seat_number="1A", price=Decimal("90.00"))
+        Ticket.objects.create(flight=self.flights[0], seat_number="1B", price=Decimal("95.00"), status="booked")
+        user = get_user_model().objects.create_user(username="reader", email="reader@example.com", password="x")
+        self.auth = {"headers": {"Authorization": f"Bearer {AccessToken.for_user(user)}"}}
+        self.factory = AsyncRequestFactory()
+
+    async def assertSameResponse(self, async_view, url, **kwargs):
+        sync_resp = await sync_to_async(self.client.get)(url, **self.auth)
+        async_resp = await async_view(self.factory.get(url, **self.auth), **kwargs)
+        self.assertEqual(async_resp.status_code, sync_resp.status_code)
+        self.assertEqual(json.loads(async_resp.content), sync_resp.json())
+        return sync_resp.json()
+
+    async def test_payloads_match_drf_views(self):
+        page = await self.assertSameResponse(async_views.flight_list, reverse("flight-list") + "?page_size=2")
+        await self.assertSameResponse(async_views.flight_list, page["next"])
+        origin = self.flights[0].origin_id
+        await self.assertSameResponse(async_views.flight_list, reverse("flight-list") + f"?origin={origin}&status=scheduled")
+        pk = self.flights[0].pk
+        await self.assertSameResponse(async_views.flight_detail, reverse("flight-detail", args=[pk]), pk=pk)
+        data = await self.assertSameResponse(
+            async_views.flight_availability, reverse("flight-availability", args=[pk]), pk=pk)
+        self.assertEqual([seat["seat_number"] for seat in data["seats"]], ["1A"])
+        await self.assertSameResponse(async_views.airport_lookup, reverse("airport-lookup", args=["lwo"]), code="lwo")
+
+    async def test_errors(self):
+        resp = await async_views.flight_detail(self.factory.get("/"), pk=1)
+        self.assertEqual(resp.status_code, 401)
+        resp = await async_views.flight_detail(self.factory.get("/", **self.auth), pk=0)
+        self.assertEqual(resp.status_code, 404)
+        resp = await async_views.flight_list(self.factory.get("/?status=landed", **self.auth))
+        self.assertEqual((resp.status_code, list(json.loads(resp.content))), (400, ["status"]))
+
+
+class AirportResolverTests(SimpleTestCase):
+    def setUp(self):
+        poland, usa = {"id": 1, "name": "Poland", "code": "PL"}, {"id": 2, "name": "United States", "code": "US"}
+        airports = [
+            (1, "KRK", "Kraków", poland), (2, "WAW", "Warsaw Chopin", poland), (3, "WMI", "Warsaw Modlin", poland),
+            (4, "JFK", "John F. Kennedy", usa), (5, "LGA", "LaGuardia", usa), (6, "GDN", "Gdańsk", poland),
+        ]
+        self.resolver = AirportResolver(
+            [{"id": pk, "iata_code": code, "name": name, "country": country} for pk, code, name, country in airports],
+            [(4, "New York"), (5, "New York"), (4, "NYC"), (5, "NYC"), (6, "Danzig")],
+        )
+
+    def test_fold(self):
+        self.assertEqual(fold("  KRAKÓW, Łódź!  "), "krakow lodz")
+
+    def test_resolve(self):
+        cases = {
+            "KRK": [1], "krakow": [1], "Kraków": [1], "Krakw": [1], "Gdansk": [6], "danzig": [6],
+            "NYC": [4, 5], "new york": [4, 5], "Poland": [1, 2, 3, 6], "Warsaw": [2, 3], "Paris": [],
+        }
+        for text, ids in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(sorted(self.resolver.resolve(text)), ids)
+
+    def test_autocomplete_prefers_codes_and_word_starts(self):
+        self.assertEqual([airport["iata_code"] for airport in self.resolver.autocomplete("wa")], ["WAW", "WMI"])
+        self.assertEqual([airport["iata_code"] for airport in self.resolver.autocomplete("mod")], ["WMI"])
+        self.assertEqual(self.resolver.autocomplete("gda")[0]["iata_code"], "GDN")
+        self.assertEqual(len(self.resolver.autocomplete("w", limit=2)), 2)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_core", "--case", "resolver", "--airports", "200", "--lookups", "10", stdout=out)
+        self.assertIn("ms per lookup", out.getvalue())
+
+
+class AirportAutocompleteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="u", password="x"))
+        self.flight = create_flight()
+        self.url = reverse("airport-autocomplete")
+
+    def test_autocomplete(self):
+        AirportAlias.objects.create(airport=self.flight.destination, name="Cracow")
+        fresh_resolver()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"q": "crac"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]["iata_code"], "KRK")
+        self.assertEqual(response.data[0]["country"]["code"], "UA")
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+    def test_refreshed_on_airport_change(self):
+        fresh_resolver()
+        self.assertEqual(self.client.get(self.url, {"q": "Warsaw"}).data, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Airport.objects.create(iata_code="WAW", name="Warszawa Chopina", country=self.flight.origin.country)
+        self.assertEqual(self.client.get(self.url, {"q": "warszawa"}).data[0]["iata_code"], "WAW")
+
+    def test_rolled_back_change_is_not_served(self):
+        fresh_resolver()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Airport.objects.create(iata_code="WAW", name="Warszawa Chopina", country=self.flight.origin.country)
+            self.client.get(self.url, {"q": "warszawa"})
+            raise RuntimeError
+        self.assertEqual(self.client.get(self.url, {"q": "warszawa"}).data, [])
+
+    def test_version_change_from_other_process(self):
+        resolver = airport_resolver.airport_resolver()
+        airport_resolver._state["checked"] = 0.0
+        self.assertIs(airport_resolver.airport_resolver(), resolver)
+
+        bump_version("airports")
+        airport_resolver._state["checked"] = 0.0
+        self.assertIsNot(airport_resolver.airport_resolver(), resolver)
+
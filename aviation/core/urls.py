@@ -1,20 +1,38 @@
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 import debug_toolbar
 
+from . import async_views
 from .views import (
-    FlightViewSet, AirplaneViewSet,
+    FlightViewSet, AirplaneViewSet, RouteSearchView, FareCalendarView, CacheStatsView, SeatMapSectionViewSet,
     CountryListCreateView, CountryDetailView,
-    AirportListCreateView, AirportDetailView,
+    AirportListCreateView, AirportDetailView, AirportLookupView, AirportAutocompleteView,
     AirlineListView, AirlineDetailView,
-    TicketListView, TicketDetailView,
+    TicketListView, TicketDetailView, GenerateTicketsView,
 )
 
 router = DefaultRouter()
 router.register(r'flights', FlightViewSet)
 router.register(r'airplanes', AirplaneViewSet)
+router.register(r'seat-maps', SeatMapSectionViewSet)
+
+# Async twins of read-heavy routes, enabled per URL name with settings.ASYNC_VIEWS.
+# They take precedence over the router and fall back to the DRF view for writes.
+async_urlpatterns = [
+    path('flights/', async_views.with_sync_fallback(
+        async_views.flight_list, FlightViewSet.as_view({'get': 'list', 'post': 'create'})), name='flight-list'),
+    path('flights/<int:pk>/', async_views.with_sync_fallback(
+        async_views.flight_detail, FlightViewSet.as_view(
+            {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'})),
+        name='flight-detail'),
+    path('flights/<int:pk>/availability/', async_views.flight_availability, name='flight-availability'),
+    re_path(r'^airports/(?P<code>[A-Za-z]{3})/$', async_views.airport_lookup, name='airport-lookup'),
+]
 
 urlpatterns = [
+    pattern for pattern in async_urlpatterns if pattern.name in settings.ASYNC_VIEWS
+] + [
     path('', include(router.urls)),
 
     path('countries-generic/', CountryListCreateView.as_view(), name='countries-generic'),
@@ -23,11 +41,20 @@ urlpatterns = [
     path('airports-generic/', AirportListCreateView.as_view(), name='airports-generic'),
     path('airports-generic/<int:pk>/', AirportDetailView.as_view(), name='airport-generic-detail'),
 
+    path('airports/autocomplete/', AirportAutocompleteView.as_view(), name='airport-autocomplete'),
+    re_path(r'^airports/(?P<code>[A-Za-z]{3})/$', AirportLookupView.as_view(), name='airport-lookup'),
+
     path('airlines/', AirlineListView.as_view(), name='airlines-list'),
     path('airlines/<int:pk>/', AirlineDetailView.as_view(), name='airlines-detail'),
 
+    path('search/', RouteSearchView.as_view(), name='route-search'),
+    path('fares/calendar/', FareCalendarView.as_view(), name='fare-calendar'),
+
     path('tickets/', TicketListView.as_view(), name='tickets-list'),
+    path('tickets/generate/', GenerateTicketsView.as_view(), name='tickets-generate'),
     path('tickets/<int:pk>/', TicketDetailView.as_view(), name='tickets-detail'),
 
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+
     path('__debug__/', include(debug_toolbar.urls)),
 ]
\ No newline at end of file
@@ -1,31 +1,54 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated, IsAdminUser
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
 from drf_spectacular.utils import extend_schema_view, extend_schema
 from rest_framework import generics, mixins
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
 import logging
 
-from .models import Country, Airport, Airline, Airplane, Flight, Ticket
+from .airport_resolver import airport_resolver
+from .cache import CachedListMixin, stats as cache_stats
+from .fare_calendar import fare_calendar
+from .flight_import import detect_format, import_flights
+from .models import Country, Airport, Airline, Airplane, Flight, SeatMapSection, Ticket
+from .pagination import FlightCursorPagination
+from .pricing import quote, ticket_fare
+from .search import search_routes
+from .seatmaps import generate_tickets
 from .serializers import (
-    CountrySerializer, AirportSerializer,
-    AirlineSerializer, AirplaneSerializer, FlightSerializer, TicketSerializer
+    CountrySerializer, AirportSerializer, AirportAutocompleteQuerySerializer,
+    AirlineSerializer, AirplaneSerializer, FlightSerializer, TicketSerializer,
+    RouteSearchQuerySerializer, ItinerarySerializer,
+    SeatMapSectionSerializer, GenerateTicketsSerializer, FlightImportSerializer,
+    FlightAvailabilitySerializer, FlightFaresSerializer, FareCalendarQuerySerializer, FareCalendarDaySerializer,
 )
 
 logger = logging.getLogger(__name__)
 
 # Country through Generics Views
+# Reference data lists are cached and authenticated from the token alone,
+# so a 304 or a cache hit never touches the database.
+REFERENCE_AUTHENTICATION = [JWTStatelessUserAuthentication]
+
 @extend_schema(tags=['Countries'])
 class CountryListCreateView(
+    CachedListMixin,
     generics.GenericAPIView,
     mixins.ListModelMixin,
     mixins.CreateModelMixin
 ):
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
+    authentication_classes = REFERENCE_AUTHENTICATION
+    cache_resource = 'countries'
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -58,6 +81,7 @@ class CountryDetailView(
 # Airport through Generic Views
 @extend_schema(tags=['Airports'])
 class AirportListCreateView(
+    CachedListMixin,
     generics.GenericAPIView,
     mixins.ListModelMixin,
     mixins.CreateModelMixin
@@ -65,6 +89,8 @@ class AirportListCreateView(
     queryset = Airport.objects.select_related('country').all()
     serializer_class = AirportSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = REFERENCE_AUTHENTICATION
+    cache_resource = 'airports'
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
@@ -72,6 +98,34 @@ class AirportListCreateView(
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
 
+@extend_schema(tags=['Airports'])
+class AirportLookupView(generics.RetrieveAPIView):
+    queryset = Airport.objects.select_related('country').all()
+    serializer_class = AirportSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'iata_code__iexact'
+    lookup_url_kwarg = 'code'
+
+    @extend_schema(operation_id="airports_lookup")
+    def get(self, request, *args, **kwargs):
+        return self.retrieve(request, *args, **kwargs)
+
+@extend_schema(tags=['Airports'])
+class AirportAutocompleteView(APIView):
+    """Airports matching a partly typed, misspelled or unaccented name, city alias or code."""
+    authentication_classes = REFERENCE_AUTHENTICATION
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        operation_id="airports_autocomplete",
+        parameters=[AirportAutocompleteQuerySerializer],
+        responses=AirportSerializer(many=True),
+    )
+    def get(self, request):
+        query = AirportAutocompleteQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(airport_resolver().autocomplete(query.validated_data['q'], query.validated_data['limit']))
+
 @extend_schema(tags=['Airports'])
 class AirportDetailView(
     generics.GenericAPIView,
@@ -97,23 +151,20 @@ class AirportDetailView(
 
 # Airlines through APIView
 @extend_schema(tags=['Airlines'])
-class AirlineListView(APIView):
+class AirlineListView(CachedListMixin, generics.ListCreateAPIView):
+    queryset = Airline.objects.all()
     serializer_class = AirlineSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = REFERENCE_AUTHENTICATION
+    cache_resource = 'airlines'
 
     @extend_schema(operation_id="airlines_list")
-    def get(self, request):
-        airlines = Airline.objects.all()
-        serializer = AirlineSerializer(airlines, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
 
     @extend_schema(operation_id="airlines_create")
-    def post(self, request):
-        serializer = AirlineSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def post(self, request, *args, **kwargs):
+        return self.create(request, *args, **kwargs)
 
 @extend_schema(tags=['Airlines'])
 class AirlineDetailView(APIView):
@@ -160,27 +211,114 @@ class AirlineDetailView(APIView):
     destroy=extend_schema(tags=['Flights']),
 )
 class FlightViewSet(viewsets.ModelViewSet):
-    queryset = Flight.objects.select_related('origin', 'destination', 'airplane').all()
+    queryset = Flight.objects.select_related('origin', 'destination', 'airplane', 'inventory').all()
     serializer_class = FlightSerializer
+    pagination_class = FlightCursorPagination
+    lookup_value_regex = r'\d+'
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['origin', 'destination', 'status', 'airplane']
+    filterset_fields = {
+        'origin': ['exact'],
+        'destination': ['exact'],
+        'status': ['exact'],
+        'airplane': ['exact'],
+        'departure_time': ['gte', 'lt'],
+    }
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(tags=['Flights'], operation_id="flights_availability", responses=FlightAvailabilitySerializer)
+    @action(detail=True, methods=['get'], url_path='availability', url_name='availability')
+    def availability(self, request, pk=None):
+        flight = self.get_object()
+        flight.seats = (
+            Ticket.objects.filter(flight=flight, status=Ticket.Status.AVAILABLE).order_by('id')
+            .only('id', 'seat_number', 'cabin', 'price').annotate(current_fare=ticket_fare())
+        )
+        return Response(FlightAvailabilitySerializer(flight).data)
+
+    @extend_schema(tags=['Flights'], operation_id="flights_fares", responses=FlightFaresSerializer)
+    @action(detail=True, methods=['get'], url_path='fares', url_name='fares')
+    def fares(self, request, pk=None):
+        # Served from the fare cache; the flight row is only read to tell an unpriced flight from a missing one.
+        cabins = quote(int(pk))
+        if not cabins:
+            get_object_or_404(Flight, pk=pk)
+        return Response(FlightFaresSerializer({'flight': pk, 'cabins': cabins}).data)
+
+    @extend_schema(tags=['Flights'], operation_id="flights_import", request=FlightImportSerializer, responses=dict)
+    @action(detail=False, methods=['post'], url_path='import', url_name='import', permission_classes=[IsAdminUser],
+            parser_classes=[MultiPartParser], serializer_class=FlightImportSerializer)
+    def import_schedule(self, request):
+        serializer = FlightImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        fmt = serializer.validated_data.get('format') or detect_format(upload.name)
+        report = import_flights(upload, fmt, dry_run=serializer.validated_data['dry_run'])
+        logger.info("Imported flights from %s: %s created, %s updated, %s failed",
+                    upload.name, report['created'], report['updated'], report['failed'])
+        return Response(report, status=status.HTTP_200_OK)
+
+@extend_schema(tags=['Flights'])
+class RouteSearchView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @extend_schema(
+        operation_id="route_search",
+        parameters=[RouteSearchQuerySerializer],
+        responses=ItinerarySerializer(many=True),
+    )
+    def get(self, request):
+        query = RouteSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        itineraries = search_routes(
+            params['origin'], params['destination'], params['date'], max_stops=params['max_stops']
+        )
+        return Response(ItinerarySerializer(itineraries, many=True).data)
+
+@extend_schema(tags=['Flights'])
+class FareCalendarView(APIView):
+    """Cheapest available fare per departure day on a route, from the materialized fare calendar."""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        operation_id="fare_calendar",
+        parameters=[FareCalendarQuerySerializer],
+        responses=FareCalendarDaySerializer(many=True),
+    )
+    def get(self, request):
+        query = FareCalendarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        resolver = airport_resolver()
+        route = {field: resolver.by_code(params[field]) for field in ('origin', 'destination')}
+        unknown = {field: [f"Unknown airport {params[field]}."] for field, airport_id in route.items() if airport_id is None}
+        if unknown:
+            raise ValidationError(unknown)
+        days = fare_calendar(route['origin'], route['destination'], params.get('start') or timezone.localdate(),
+                             params['days'])
+        return Response(FareCalendarDaySerializer(days, many=True).data)
+
+class AdminWritesMixin:
+    """Any authenticated user may read; only admins may write."""
+
+    def get_permissions(self):
+        if self.request.method in SAFE_METHODS:
+            return [IsAuthenticated()]
+        return [IsAdminUser()]
+
 #Tickets through APIView
 @extend_schema(tags=['Tickets'])
-class TicketListView(APIView):
+class TicketListView(AdminWritesMixin, generics.ListCreateAPIView):
+    queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
-    permission_classes = [IsAuthenticated]
 
     @extend_schema(operation_id="tickets_list")
-    def get(self, request):
-        tickets = Ticket.objects.select_related('flight', 'order').all()
-        serializer = self.serializer_class(tickets, many=True)
-        return Response(serializer.data)
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
 
     @extend_schema(operation_id="tickets_create")
-    def post(self, request):
-        serializer = self.serializer_class(data=request.data)
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
             logger.info("Ticket created successfully")
@@ -190,9 +328,21 @@ class TicketListView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @extend_schema(tags=['Tickets'])
-class TicketDetailView(APIView):
+class GenerateTicketsView(APIView):
+    serializer_class = GenerateTicketsSerializer
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(operation_id="tickets_generate", request=GenerateTicketsSerializer, responses=dict)
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        flights, created = generate_tickets(serializer.flights_queryset())
+        logger.info("Generated %s tickets for %s flights", created, flights)
+        return Response({"flights": flights, "created": created}, status=status.HTTP_201_CREATED)
+
+@extend_schema(tags=['Tickets'])
+class TicketDetailView(AdminWritesMixin, APIView):
     serializer_class = TicketSerializer
-    permission_classes = [IsAuthenticated]
 
     @extend_schema(operation_id="tickets_retrieve")
     def get(self, request, pk):
@@ -233,6 +383,29 @@ class TicketDetailView(APIView):
     partial_update=extend_schema(tags=['Airplanes']),
     destroy=extend_schema(tags=['Airplanes']),
 )
-class AirplaneViewSet(viewsets.ModelViewSet):
-    queryset = Airplane.objects.select_related('airline').all()
+class AirplaneViewSet(CachedListMixin, viewsets.ModelViewSet):
+    queryset = Airplane.objects.select_related('airline').prefetch_related('seat_map').all()
     serializer_class = AirplaneSerializer
+    authentication_classes = REFERENCE_AUTHENTICATION
+    cache_resource = 'airplanes'
+
+@extend_schema_view(
+    list=extend_schema(tags=['Airplanes']),
+    retrieve=extend_schema(tags=['Airplanes']),
+    create=extend_schema(tags=['Airplanes']),
+    update=extend_schema(tags=['Airplanes']),
+    partial_update=extend_schema(tags=['Airplanes']),
+    destroy=extend_schema(tags=['Airplanes']),
+)
+class SeatMapSectionViewSet(viewsets.ModelViewSet):
+    queryset = SeatMapSection.objects.select_related('airplane').all()
+    serializer_class = SeatMapSectionSerializer
+    filterset_fields = ['airplane', 'cabin']
+    permission_classes = [IsAuthenticated]
+
+@extend_schema(tags=['Monitoring'], responses=dict)
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats(['countries', 'airports', 'airlines', 'airplanes']))
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from core.inventory import refresh_flight_inventory
+from core.models import Ticket
+from core.pricing import ticket_fare
+from payments.models import Payment
+from .lifecycle import EXPIRE, transition, transition_payments
+from .models import Order
+
+
+class TicketsUnavailable(Exception):
+    def __init__(self, ticket_ids):
+        self.ticket_ids = sorted(ticket_ids)
+        super().__init__(f"Tickets not available: {self.ticket_ids}")
+
+
+def hold_deadline():
+    return timezone.now() + timedelta(minutes=settings.TICKET_HOLD_MINUTES)
+
+
+def book_tickets(user, ticket_ids, **order_fields):
+    """
+    Holds all requested tickets for a new order or none of them.
+
+    The tickets are locked with SKIP LOCKED, so a seat another buyer is booking
+    right now counts as unavailable instead of blocking this request, and all of
+    them are flipped with one UPDATE that also fixes their current fare. They
+    stay held until the order is paid or the hold expires.
+    """
+    ticket_ids = sorted(set(ticket_ids))
+    with transaction.atomic():
+        locked = list(
+            Ticket.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=ticket_ids, status=Ticket.Status.AVAILABLE)
+            .values_list('id', 'flight_id')
+        )
+        if len(locked) != len(ticket_ids):
+            raise TicketsUnavailable(set(ticket_ids) - {row[0] for row in locked})
+
+        order = Order.objects.create(user=user, amount=0, **order_fields)
+        held = Ticket.objects.filter(pk__in=ticket_ids)
+        held.update(status=Ticket.Status.HELD, order=order, hold_expires_at=hold_deadline(), fare=ticket_fare())
+        # The seats' fares were written from the fare buckets above; the total is summed from them.
+        order.amount = held.aggregate(total=Sum('fare'))['total']
+        order.save(update_fields=['amount', 'updated_at'])
+        refresh_flight_inventory(flight_id for _, flight_id in locked)
+    return order
+
+
+def extend_order_holds(order, expires_at):
+    return Ticket.objects.filter(order=order, status=Ticket.Status.HELD).update(hold_expires_at=expires_at)
+
+
+def release_expired_holds(batch_size=None, now=None):
+    """
+    Returns expired held tickets to sale in batches and cancels their unpaid orders.
+
+    Only the partial index on held tickets is read, so the sweep cost depends on
+    the number of holds, not on the size of the ticket table. Pending payments
+    past their expiry whose tickets went some other way are expired last, from
+    the (status, expires_at) index.
+    """
+    batch_size = batch_size or settings.TICKET_HOLD_SWEEP_BATCH
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Ticket.objects.select_for_update(skip_locked=True)
+                .filter(status=Ticket.Status.HELD, hold_expires_at__lte=now)
+                .order_by('hold_expires_at')
+                .values_list('id', 'flight_id', 'order_id')[:batch_size]
+            )
+            if not rows:
+                break
+            order_ids = {order_id for _, _, order_id in rows if order_id}
+            # The selected tickets and the other holds of their orders are released
+            # directly, so the sweep moves on even if an order is no longer pending;
+            # the orders and payments then go through the lifecycle.
+            tickets = Ticket.objects.filter(
+                Q(pk__in=[row[0] for row in rows]) | Q(order_id__in=order_ids, status=Ticket.Status.HELD)
+            )
+            flight_ids = set(tickets.values_list('flight_id', flat=True))
+            released += tickets.update(status=Ticket.Status.AVAILABLE, order=None, hold_expires_at=None, fare=None)
+            refresh_flight_inventory(flight_ids)
+            transition(EXPIRE, order_ids)
+        if len(rows) < batch_size:
+            break
+    transition_payments(
+        EXPIRE, Payment.objects.filter(status='pending', expires_at__lte=now).values_list('pk', flat=True)
+    )
+    return released
@@ -0,0 +1,157 @@
+"""
+Status changes of orders together with their payments and tickets.
+
+Every change goes through ``transition``, which moves any number of orders in
+one transaction with one bulk UPDATE per table. Each UPDATE is guarded by the
+statuses it expects, so an order a concurrent webhook, sweep or user already
+moved is skipped instead of overwritten, and its payment and tickets are left
+alone with it. Moved orders get an OrderEvent row each, moved payments a
+PaymentEvent row, and ``order_transitioned`` is sent once the transaction
+commits. Paying names the attempt that was charged: only it is marked paid,
+and the order's other pending checkouts are expired with it.
+
+Payment attempts that end without moving their order, a failed charge or a
+lapsed checkout, go through ``transition_payments`` in the same way.
+"""
+from functools import partial
+from typing import NamedTuple
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from core.inventory import refresh_flight_inventory
+from core.models import Ticket
+from payments.models import Payment, PaymentEvent
+from .models import Order, OrderEvent
+
+PAY, CANCEL, EXPIRE, REFUND, FAIL = "pay", "cancel", "expire", "refund", "fail"
+
+# Sent after commit with ``transition`` and the ``order_ids`` it moved.
+order_transitioned = Signal()
+# Sent after commit with ``transition`` and the ``payment_ids`` transition_payments moved.
+payment_transitioned = Signal()
+
+
+class Transition(NamedTuple):
+    order_from: tuple
+    order_to: str
+    payment_from: tuple
+    payment_to: str
+    ticket_from: tuple
+    ticket_to: str
+
+
+TRANSITIONS = {
+    PAY: Transition(("pending",), "completed", ("pending",), "paid",
+                    (Ticket.Status.HELD,), Ticket.Status.BOOKED),
+    CANCEL: Transition(("pending",), "cancelled", ("pending",), "expired",
+                       (Ticket.Status.HELD,), Ticket.Status.AVAILABLE),
+    EXPIRE: Transition(("pending",), "cancelled", ("pending",), "expired",
+                       (Ticket.Status.HELD,), Ticket.Status.AVAILABLE),
+    REFUND: Transition(("completed",), "refunded", ("paid",), "refunded",
+                       (Ticket.Status.HELD, Ticket.Status.BOOKED), Ticket.Status.AVAILABLE),
+}
+# (payment_from, payment_to) of transitions that leave the order as it is
+PAYMENT_TRANSITIONS = {
+    EXPIRE: (("pending",), "expired"),
+    # A late failure of an earlier attempt must not undo a successful payment.
+    FAIL: (("pending", "expired"), "failed"),
+}
+
+
+def record_payment_events(name, moved, to_status):
+    PaymentEvent.objects.bulk_create(
+        PaymentEvent(payment_id=pk, transition=name, from_status=status, to_status=to_status)
+        for pk, status in moved.items()
+    )
+
+
+def transition(name, order_ids, payment_ids=None):
+    """
+    Applies a transition to the orders still in one of its source statuses and
+    returns the ids of those it moved. Their payments and then the orders are
+    locked in id order, so concurrent transitions over overlapping orders wait
+    instead of deadlocking, and the guard sees the latest committed status.
+
+    ``payment_ids`` limits the payment change to those payments; the moved
+    orders' other pending payments are expired instead. PAY requires them.
+    """
+    spec = TRANSITIONS[name]
+    if name == PAY and payment_ids is None:
+        raise ValueError("PAY needs the ids of the payments that were charged")
+    order_ids = list(order_ids)
+    if not order_ids:
+        return []
+    if payment_ids is not None:
+        payment_ids = set(payment_ids)
+    now = timezone.now()
+    with transaction.atomic():
+        # Payments before orders: webhooks already hold their payment's lock when they get here.
+        payments = list(
+            Payment.objects.select_for_update().filter(order_id__in=order_ids)
+            .order_by('pk').values_list('pk', 'order_id', 'status')
+        )
+        moved = dict(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status__in=spec.order_from)
+            .order_by('pk').values_list('pk', 'status')
+        )
+        if not moved:
+            return []
+        Order.objects.filter(pk__in=moved, status__in=spec.order_from).update(status=spec.order_to, updated_at=now)
+        moved_payments, superseded = {}, {}
+        for pk, order_id, status in payments:
+            if order_id not in moved:
+                continue
+            if status in spec.payment_from and (payment_ids is None or pk in payment_ids):
+                moved_payments[pk] = status
+            elif status == "pending":
+                superseded[pk] = status
+        if moved_payments:
+            Payment.objects.filter(pk__in=moved_payments).update(status=spec.payment_to, updated_at=now)
+            record_payment_events(name, moved_payments, spec.payment_to)
+        if superseded:
+            Payment.objects.filter(pk__in=superseded).update(status="expired", updated_at=now)
+            record_payment_events(EXPIRE, superseded, "expired")
+
+        tickets = Ticket.objects.filter(order_id__in=moved, status__in=spec.ticket_from)
+        flight_ids = list(tickets.values_list('flight_id', flat=True).distinct())
+        if spec.ticket_to == Ticket.Status.AVAILABLE:
+            tickets.update(status=spec.ticket_to, order=None, hold_expires_at=None, fare=None)
+        else:
+            tickets.update(status=spec.ticket_to, hold_expires_at=None)
+        refresh_flight_inventory(flight_ids)
+
+        OrderEvent.objects.bulk_create(
+            OrderEvent(order_id=pk, transition=name, from_status=status, to_status=spec.order_to)
+            for pk, status in moved.items()
+        )
+        transaction.on_commit(partial(order_transitioned.send, sender=Order, transition=name, order_ids=list(moved)))
+    return list(moved)
+
+
+def transition_payments(name, payment_ids):
+    """
+    Moves the given payments still in one of the transition's source statuses,
+    without touching their orders, and returns the ids of those it moved. The
+    payments are locked in id order like ``transition`` locks them.
+    """
+    payment_from, payment_to = PAYMENT_TRANSITIONS[name]
+    payment_ids = list(payment_ids)
+    if not payment_ids:
+        return []
+    with transaction.atomic():
+        moved = dict(
+            Payment.objects.select_for_update()
+            .filter(pk__in=payment_ids, status__in=payment_from)
+            .order_by('pk').values_list('pk', 'status')
+        )
+        if not moved:
+            return []
+        Payment.objects.filter(pk__in=moved).update(status=payment_to, updated_at=timezone.now())
+        record_payment_events(name, moved, payment_to)
+        transaction.on_commit(
+            partial(payment_transitioned.send, sender=Payment, transition=name, payment_ids=list(moved))
+        )
+    return list(moved)
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('orders', '0005_alter_order_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['user', '-id'], name='order_user_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ),
+        # The plain user_id index is a prefix of the composite ones. AlterField would
+        # also re-validate the foreign key over the whole table, so only the index goes.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX CONCURRENTLY IF EXISTS "orders_order_user_id_e9b59eb1";',
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "orders_order_user_id_e9b59eb1" ON "orders_order" ("user_id");',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='order',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
@@ -6,6 +6,7 @@ class Order(models.Model):
         ('pending', 'Pending'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
+        ('refunded', 'Refunded'),
     ]
 
     PAYMENT_CHOICES = [
@@ -19,7 +20,8 @@ class Order(models.Model):
         ('EUR', 'Euro'),
     ]
 
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Indexed by order_user_id_idx, which also serves the paginated list.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='USD')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES)
@@ -31,4 +33,22 @@ class Order(models.Model):
         return f"Order {self.pk or 'unsaved'} by {self.user}"
 
     class Meta:
-        ordering = ['id']
\ No newline at end of file
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', '-id'], name='order_user_id_idx'),
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ]
+
+class OrderEvent(models.Model):
+    """A status change made by orders.lifecycle, one row per order moved."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    transition = models.CharField(max_length=20)
+    from_status = models.CharField(max_length=20)
+    to_status = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status} -> {self.to_status} ({self.transition})"
@@ -2,16 +2,16 @@ from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field
 
 from users.serializers import UserSerializer
+from .booking import TicketsUnavailable, book_tickets
 from .models import Order
-from core.models import Ticket
 from core.serializers import TicketSerializer
 
 class OrderSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
-    tickets = serializers.PrimaryKeyRelatedField(
-        queryset=Ticket.objects.filter(status='available'),
-        many=True,
+    tickets = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
         write_only=True
     )
 
@@ -36,13 +36,12 @@ class OrderSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         validated_data.pop('user', None)
 
-        amount = sum(ticket.price for ticket in tickets)
+        try:
+            return book_tickets(user, tickets, **validated_data)
+        except TicketsUnavailable as e:
+            raise serializers.ValidationError({'tickets': [str(e)]})
 
-        order = Order.objects.create(user=user, amount=amount, **validated_data)
-
-        for ticket in tickets:
-            ticket.status = 'booked'
-            ticket.order = order
-            ticket.save()
-
-        return order
\ No newline at end of file
+    def update(self, instance, validated_data):
+        # Seats are only assigned at booking time.
+        validated_data.pop('tickets', None)
+        return super().update(instance, validated_data)
\ No newline at end of file
@@ -0,0 +1,15 @@
+import logging
+
+from celery import shared_task
+
+from . import booking
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def release_expired_holds():
+    released = booking.release_expired_holds()
+    if released:
+        logger.info("Released %s expired ticket holds", released)
+    return released
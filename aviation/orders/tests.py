@@ -1,3 +1,311 @@
-from django.test import TestCase
+import random
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import FlightInventory, Ticket
+from core.tests import ConstantQueriesMixin, create_flight
+from payments.models import Payment, PaymentEvent
+from .booking import TicketsUnavailable, book_tickets, release_expired_holds
+from .lifecycle import CANCEL, EXPIRE, FAIL, PAY, REFUND, order_transitioned, transition, transition_payments
+from .models import Order, OrderEvent
+
+User = get_user_model()
+
+
+class OrderBookingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = create_flight()
+        self.tickets = [
+            Ticket.objects.create(flight=self.flight, seat_number=seat, price=Decimal("100.00"))
+            for seat in ["1A", "1B", "1C"]
+        ]
+
+    def test_create_order_books_all_tickets(self):
+        ids = [self.tickets[0].id, self.tickets[1].id]
+        resp = self.client.post(reverse("order-list"), {"tickets": ids, "payment_method": "card"}, format="json")
+
+        self.assertEqual(resp.status_code, 201, resp.data)
+        # Departing tomorrow with the cabin empty: 1.60 x 100.00 per seat.
+        self.assertEqual(Decimal(resp.data["amount"]), Decimal("320.00"))
+        self.assertEqual(set(Ticket.objects.filter(id__in=ids).values_list("fare", flat=True)), {Decimal("160.00")})
+        self.assertEqual(Ticket.objects.filter(id__in=ids, status="held", order_id=resp.data["id"]).count(), 2)
+        inventory = FlightInventory.objects.get(flight=self.flight)
+        self.assertEqual((inventory.available_count, inventory.held_count), (1, 2))
+
+    def test_partially_unavailable_request_books_nothing(self):
+        book_tickets(self.user, [self.tickets[0].id], payment_method="card")
+
+        resp = self.client.post(
+            reverse("order-list"),
+            {"tickets": [self.tickets[0].id, self.tickets[2].id], "payment_method": "card"},
+            format="json",
+        )
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Ticket.objects.get(id=self.tickets[2].id).status, "available")
+
+
+class TicketHoldTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        self.flight = create_flight()
+        self.tickets = [
+            Ticket.objects.create(flight=self.flight, seat_number=seat, price=Decimal("100.00"))
+            for seat in ["1A", "1B", "1C"]
+        ]
+
+    def test_expired_holds_are_released_in_batches(self):
+        expired = book_tickets(self.user, [self.tickets[0].id, self.tickets[1].id], payment_method="card")
+        active = book_tickets(self.user, [self.tickets[2].id], payment_method="card")
+        Payment.objects.create(user=self.user, order=expired, stripe_session_id="cs_1", amount=200)
+        Ticket.objects.filter(order=expired).update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(release_expired_holds(batch_size=1), 2)
+
+        self.assertEqual(Ticket.objects.filter(status="available", order=None).count(), 2)
+        self.assertEqual(Ticket.objects.get(id=self.tickets[2].id).order, active)
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, "cancelled")
+        self.assertEqual(Payment.objects.get(order=expired).status, "expired")
+        inventory = FlightInventory.objects.get(flight=self.flight)
+        self.assertEqual((inventory.available_count, inventory.held_count), (2, 1))
+
+    def test_confirm_books_held_tickets(self):
+        order = book_tickets(self.user, [self.tickets[0].id], payment_method="card")
+        transition(PAY, [order.pk], payment_ids=[])
+
+        ticket = Ticket.objects.get(id=self.tickets[0].id)
+        self.assertEqual((ticket.status, ticket.hold_expires_at), ("booked", None))
+        self.assertEqual(release_expired_holds(now=timezone.now() + timedelta(days=1)), 0)
+
+
+class ConcurrentBookingStressTests(TransactionTestCase):
+    seats = 30
+    buyers = 60
+    threads = 12
+
+    def test_parallel_bookings_never_double_sell(self):
+        flight = create_flight()
+        ticket_ids = [
+            Ticket.objects.create(flight=flight, seat_number=f"{n}A", price=Decimal("50.00")).id
+            for n in range(self.seats)
+        ]
+        users = User.objects.bulk_create(
+            User(username=f"u{n}", email=f"u{n}@example.com") for n in range(self.buyers)
+        )
+        requests = [(user, random.sample(ticket_ids, 2)) for user in users]
+        lock = threading.Lock()
+        booked, rejected = [], []
+
+        def worker(chunk):
+            try:
+                for user, wanted in chunk:
+                    try:
+                        order = book_tickets(user, wanted, payment_method="card")
+                    except TicketsUnavailable:
+                        with lock:
+                            rejected.append(wanted)
+                    else:
+                        with lock:
+                            booked.append((order.id, wanted))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(requests[n::self.threads],)) for n in range(self.threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        sold = [ticket_id for _, wanted in booked for ticket_id in wanted]
+        self.assertEqual(len(sold), len(set(sold)), "a seat was sold twice")
+        self.assertEqual(len(booked) + len(rejected), self.buyers)
+        for order_id, wanted in booked:
+            self.assertEqual(set(Ticket.objects.filter(order_id=order_id).values_list("id", flat=True)), set(wanted))
+        self.assertEqual(Ticket.objects.filter(status="held").count(), len(sold))
+        inventory = FlightInventory.objects.get(flight=flight)
+        self.assertEqual(inventory.held_count, len(sold))
+        self.assertEqual(inventory.available_count, self.seats - len(sold))
+
+
+class OrderQueryCountTests(ConstantQueriesMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = create_flight()
+        self.seats = iter(range(100))
+        self.grow()
+
+    def grow(self):
+        for _ in range(2):
+            tickets = [
+                Ticket.objects.create(flight=self.flight, seat_number=f"{next(self.seats)}A", price=Decimal("10.00"))
+                for _ in range(2)
+            ]
+            book_tickets(self.user, [ticket.id for ticket in tickets], payment_method="card")
+
+    def test_order_list(self):
+        self.assertConstantQueries(lambda: self.client.get(reverse("order-list"), {"page_size": 100}), self.grow)
+
+
+class OrderLifecycleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = create_flight()
+        self.seats = iter(range(1000))
+
+    def order(self, seats=2):
+        tickets = [
+            Ticket.objects.create(flight=self.flight, seat_number=f"{next(self.seats)}A", price=Decimal("10.00"))
+            for _ in range(seats)
+        ]
+        order = book_tickets(self.user, [ticket.id for ticket in tickets], payment_method="card")
+        Payment.objects.create(user=self.user, order=order, amount=order.amount, stripe_session_id=f"cs_{order.pk}")
+        return order
+
+    def payments(self, order):
+        return list(Payment.objects.filter(order=order).values_list("pk", flat=True))
+
+    def state(self, order):
+        order.refresh_from_db()
+        return order.status, Payment.objects.get(order=order).status, set(
+            Ticket.objects.filter(order=order).values_list("status", flat=True)
+        )
+
+    def test_pay_then_refund_frees_seats(self):
+        order = self.order()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(transition(PAY, [order.pk], self.payments(order)), [order.pk])
+        self.assertEqual(self.state(order), ("completed", "paid", {"booked"}))
+        # Paying again finds nothing in the expected state.
+        self.assertEqual(transition(PAY, [order.pk], self.payments(order)), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(REFUND, [order.pk])
+        self.assertEqual(self.state(order), ("refunded", "refunded", set()))
+        inventory = FlightInventory.objects.get(flight=self.flight)
+        self.assertEqual((inventory.available_count, inventory.booked_count), (2, 0))
+        self.assertEqual(
+            list(OrderEvent.objects.values_list("transition", "from_status", "to_status")),
+            [("pay", "pending", "completed"), ("refund", "completed", "refunded")],
+        )
+        self.assertEqual(
+            list(PaymentEvent.objects.values_list("transition", "from_status", "to_status")),
+            [("pay", "pending", "paid"), ("refund", "paid", "refunded")],
+        )
+
+    def test_payment_transitions_leave_the_order(self):
+        order = self.order()
+        payment = Payment.objects.get(order=order)
+        Payment.objects.filter(pk=payment.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        # The lapsed checkout is expired by the sweep; the seats are still held.
+        release_expired_holds()
+        self.assertEqual(self.state(order), ("pending", "expired", {"held"}))
+        self.assertEqual(transition_payments(EXPIRE, [payment.pk]), [])
+        self.assertEqual(transition_payments(FAIL, [payment.pk]), [payment.pk])
+        self.assertEqual(
+            list(PaymentEvent.objects.values_list("transition", "from_status", "to_status")),
+            [("expire", "pending", "expired"), ("fail", "expired", "failed")],
+        )
+
+    def test_bulk_transition_is_constant_queries_and_signalled(self):
+        received = []
+        order_transitioned.connect(lambda **kwargs: received.append(kwargs["order_ids"]), weak=False,
+                                   dispatch_uid="lifecycle-test")
+        self.addCleanup(order_transitioned.disconnect, dispatch_uid="lifecycle-test")
+        few, many = [self.order().pk for _ in range(2)], [self.order().pk for _ in range(20)]
+        paid = self.order()
+        transition(PAY, [paid.pk], self.payments(paid))
+
+        with CaptureQueriesContext(connection) as small:
+            transition(CANCEL, few)
+        with CaptureQueriesContext(connection) as large, self.captureOnCommitCallbacks(execute=True):
+            moved = transition(CANCEL, many + [paid.pk])
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(moved, many)
+        self.assertEqual(received, [many])
+        self.assertEqual(self.state(paid), ("completed", "paid", {"booked"}))
+        self.assertFalse(Ticket.objects.filter(status="held").exists())
+
+    def test_cancel_endpoint(self):
+        order = self.order()
+        resp = self.client.post(reverse("order-cancel", args=[order.pk]))
+
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(resp.data["status"], "cancelled")
+        self.assertEqual(self.state(order), ("cancelled", "expired", set()))
+        self.assertEqual(FlightInventory.objects.get(flight=self.flight).available_count, 2)
+        self.assertEqual(self.client.post(reverse("order-cancel", args=[order.pk])).status_code, 409)
+
+    def test_delete_releases_held_seats_but_not_paid_orders(self):
+        pending, paid = self.order(), self.order()
+        transition(PAY, [paid.pk], self.payments(paid))
+
+        self.assertEqual(self.client.delete(reverse("order-detail", args=[pending.pk])).status_code, 204)
+        self.assertEqual(self.client.delete(reverse("order-detail", args=[paid.pk])).status_code, 409)
+        self.assertEqual(Ticket.objects.filter(status="available").count(), 2)
+        self.assertEqual(Ticket.objects.filter(status="booked", order=paid).count(), 2)
+
+
+class ConcurrentLifecycleTests(TransactionTestCase):
+    orders = 40
+    threads = 8
+
+    def test_racing_pay_and_cancel_never_mix_states(self):
+        user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        flight = create_flight()
+        order_ids = []
+        for n in range(self.orders):
+            tickets = [Ticket.objects.create(flight=flight, seat_number=f"{n}{seat}", price=Decimal("10.00"))
+                       for seat in "AB"]
+            order = book_tickets(user, [ticket.id for ticket in tickets], payment_method="card")
+            Payment.objects.create(user=user, order=order, amount=order.amount, stripe_session_id=f"cs_{n}")
+            order_ids.append(order.pk)
+
+        def worker(name, ids):
+            try:
+                for order_id in ids:
+                    transition(name, [order_id])
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=worker, args=(PAY if n % 2 else CANCEL, random.sample(order_ids, len(order_ids))))
+            for n in range(self.threads)
+        ]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        expected = {"completed": ("paid", "booked"), "cancelled": ("expired", None)}
+        for order in Order.objects.filter(pk__in=order_ids):
+            payment, tickets = expected[order.status]
+            self.assertEqual(Payment.objects.get(order=order).status, payment)
+            self.assertEqual(OrderEvent.objects.filter(order=order).count(), 1)
+            if tickets:
+                self.assertEqual(Ticket.objects.filter(order=order, status=tickets).count(), 2)
+            else:
+                self.assertFalse(Ticket.objects.filter(order=order).exists())
+        self.assertFalse(Ticket.objects.filter(status="held").exists())
+        inventory = FlightInventory.objects.get(flight=flight)
+        self.assertEqual(inventory.booked_count, 2 * Order.objects.filter(status="completed").count())
+        self.assertEqual(inventory.held_count, 0)
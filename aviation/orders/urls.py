@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import OrderListView, OrderDetailView
+from .views import OrderCancelView, OrderListView, OrderDetailView
 
 urlpatterns = [
     path('orders/', OrderListView.as_view(), name='order-list'),
     path('orders/<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
+    path('orders/<int:pk>/cancel/', OrderCancelView.as_view(), name='order-cancel'),
 
 ]
\ No newline at end of file
@@ -1,9 +1,20 @@
-from rest_framework import generics
+from django.db.models import Prefetch
+from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema
+from core.models import Ticket
+from .lifecycle import CANCEL, transition
 from .models import Order
 from .serializers import OrderSerializer
 
+def user_orders(user):
+    return (
+        Order.objects.filter(user=user)
+        .select_related('user')
+        .prefetch_related(Prefetch('tickets', queryset=Ticket.objects.order_by('id')))
+    )
+
 @extend_schema(
     tags=["Orders"],
     responses=OrderSerializer,
@@ -15,7 +26,7 @@ class OrderListView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return user_orders(self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -31,4 +42,33 @@ class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
\ No newline at end of file
+        return user_orders(self.request.user)
+
+    def destroy(self, request, *args, **kwargs):
+        order = self.get_object()
+        # Pending orders are cancelled first so their held seats go back on sale.
+        transition(CANCEL, [order.pk])
+        order.refresh_from_db(fields=['status'])
+        if order.status == 'completed':
+            return Response({"error": "Paid orders are refunded, not deleted"}, status=status.HTTP_409_CONFLICT)
+        order.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+@extend_schema(
+    tags=["Orders"],
+    request=None,
+    responses=OrderSerializer
+)
+class OrderCancelView(generics.GenericAPIView):
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return user_orders(self.request.user)
+
+    def post(self, request, pk):
+        order = self.get_object()
+        if not transition(CANCEL, [order.pk]):
+            return Response({"error": f"Only pending orders can be cancelled, this one is {order.status}"},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(self.get_queryset().get(pk=order.pk)).data)
@@ -1,6 +1,12 @@
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, StripeEvent
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "order", "amount", "currency", "status", "created_at")
\ No newline at end of file
+    list_display = ("id", "user", "order", "amount", "currency", "status", "created_at")
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "type", "status", "attempts", "received_at", "processed_at")
+    list_filter = ("status", "type")
+    search_fields = ("event_id",)
@@ -0,0 +1,125 @@
+"""
+Local stand-ins for Stripe: webhook events signed like Stripe signs them, for
+tests and the benchmark_webhook command, and a fake API server for the gateway.
+"""
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import stripe
+
+
+def make_event(event_type, obj, event_id=None):
+    return {
+        "id": event_id or f"evt_{uuid.uuid4().hex}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "data": {"object": obj},
+    }
+
+
+def sign(payload, secret, timestamp=None):
+    """Stripe-Signature header value for a raw payload."""
+    timestamp = int(timestamp or time.time())
+    signature = stripe.WebhookSignature._compute_signature(f"{timestamp}.{payload.decode()}", secret)
+    return f"t={timestamp},v1={signature}"
+
+
+def signed_event(event, secret):
+    """``(body, headers)`` for posting ``event`` to the webhook."""
+    body = json.dumps(event).encode()
+    return body, {"Stripe-Signature": sign(body, secret)}
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /v1/checkout/sessions like Stripe, replaying the stored session
+    for a repeated Idempotency-Key, and lists the stored sessions in pages on
+    GET. Each queued failure is used by one request:
+    a status code is answered as a Stripe error and "hang" creates the session
+    but answers only after ``hang`` seconds, like a response lost to a timeout.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    state = None
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+        key = self.headers.get("Idempotency-Key")
+        with self.state["lock"]:
+            self.state["requests"].append((self.path, key))
+            failure = self.state["failures"].pop(0) if self.state["failures"] else None
+            if isinstance(failure, int):
+                return self.reply(failure, {"error": {"type": "api_error", "message": f"Fake {failure}"}})
+            session = self.state["sessions"].get(key) if key else None
+            if session is None:
+                session_id = f"cs_test_{uuid.uuid4().hex}"
+                session = {
+                    "id": session_id,
+                    "object": "checkout.session",
+                    "url": f"https://checkout.stripe.test/c/pay/{session_id}",
+                    "client_reference_id": form.get("client_reference_id", [None])[0],
+                    "metadata": {"order_id": form.get("metadata[order_id]", [None])[0]},
+                    "amount_total": int(form.get("line_items[0][price_data][unit_amount]", ["0"])[0]),
+                    "expires_at": int(form["expires_at"][0]) if "expires_at" in form else None,
+                    "status": "open",
+                }
+                self.state["sessions"][key or session_id] = session
+        if failure == "hang":
+            time.sleep(self.state["hang"])
+        self.reply(200, session)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        with self.state["lock"]:
+            self.state["requests"].append((url.path, None))
+            failure = self.state["failures"].pop(0) if self.state["failures"] else None
+            if isinstance(failure, int):
+                return self.reply(failure, {"error": {"type": "api_error", "message": f"Fake {failure}"}})
+            sessions = list(self.state["sessions"].values())
+        # Stripe lists newest first; sessions are stored oldest first.
+        sessions.reverse()
+        if "starting_after" in query:
+            ids = [session["id"] for session in sessions]
+            sessions = sessions[ids.index(query["starting_after"][0]) + 1:]
+        limit = int(query.get("limit", ["10"])[0])
+        self.reply(200, {
+            "object": "list", "url": url.path, "data": sessions[:limit], "has_more": len(sessions) > limit,
+        })
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that timed out close the socket before a hung answer is written.
+        pass
+
+
+@contextmanager
+def fake_stripe_server(failures=(), hang=1.0):
+    """Yields ``(base_url, state)``; ``state`` holds the requests, the sessions and the failures still queued."""
+    state = {"lock": threading.Lock(), "requests": [], "sessions": {}, "failures": list(failures), "hang": hang}
+    server = FakeStripeServer(("127.0.0.1", 0), type("Handler", (FakeStripeHandler,), {"state": state}))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", state
+    finally:
+        server.shutdown()
+        server.server_close()
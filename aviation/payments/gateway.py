@@ -0,0 +1,186 @@
+"""
+Calls to the Stripe API, isolated from the requests that need them.
+
+The process shares one client with a pooled HTTP session and explicit connect
+and read timeouts. Transient failures (network errors, timeouts, 429 and 5xx)
+are retried a bounded number of times with full jitter under the same
+idempotency key, so a retried call can never create a second object. A circuit
+breaker shared through the cache makes calls fail fast while Stripe keeps
+failing and then lets a single probe through.
+"""
+import functools
+import logging
+import math
+import random
+import time
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+BREAKER_KEY = "payments:breaker:{}:{}"
+
+
+class PaymentProviderUnavailable(Exception):
+    def __init__(self, message, retry_after):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+def is_transient(error):
+    """Whether a failed call may succeed when repeated with the same idempotency key."""
+    headers = {name.lower(): value for name, value in (error.headers or {}).items()}
+    if headers.get("stripe-should-retry") in ("true", "false"):
+        return headers["stripe-should-retry"] == "true"
+    if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+        return True
+    return (error.http_status or 0) >= 500
+
+
+def backoff(attempt):
+    return random.uniform(0, settings.STRIPE_RETRY_BACKOFF * 2 ** attempt)
+
+
+class CircuitBreaker:
+    """
+    Consecutive failure counter shared by all workers. Once ``threshold`` calls
+    failed in a row the circuit opens for ``cooldown`` seconds; after that one
+    call probes the provider and either closes the circuit or opens it again.
+    """
+
+    def __init__(self, name, threshold, cooldown):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.open_key = BREAKER_KEY.format(name, "open_until")
+        self.failures_key = BREAKER_KEY.format(name, "failures")
+        self.probe_key = BREAKER_KEY.format(name, "probe")
+
+    def before_call(self):
+        open_until = cache.get(self.open_key)
+        if open_until is None:
+            return
+        remaining = open_until - time.time()
+        if remaining > 0:
+            raise PaymentProviderUnavailable(f"{self.name} circuit is open", math.ceil(remaining))
+        if not cache.add(self.probe_key, 1, self.cooldown):
+            raise PaymentProviderUnavailable(f"{self.name} circuit is probing", self.cooldown)
+
+    def record_success(self):
+        cache.delete_many([self.open_key, self.failures_key, self.probe_key])
+
+    def record_failure(self):
+        half_open = cache.get(self.open_key) is not None
+        if cache.add(self.failures_key, 1, self.cooldown):
+            failures = 1
+        else:
+            try:
+                failures = cache.incr(self.failures_key)
+            except ValueError:
+                failures = 1
+                cache.set(self.failures_key, failures, self.cooldown)
+        if half_open or failures >= self.threshold:
+            logger.warning("Opening %s circuit for %ss after %s failures", self.name, self.cooldown, failures)
+            cache.set(self.open_key, time.time() + self.cooldown, None)
+            cache.delete_many([self.failures_key, self.probe_key])
+
+
+class StripeGateway:
+    def __init__(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_POOL_SIZE, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        http_client = stripe.RequestsClient(
+            timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT), session=session,
+        )
+        base_addresses = {"api": settings.STRIPE_API_BASE} if settings.STRIPE_API_BASE else None
+        # Retries happen in call(), where they are bounded and count towards the breaker.
+        self.client = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY, http_client=http_client, base_addresses=base_addresses,
+            max_network_retries=0,
+        )
+        self.breaker = CircuitBreaker("stripe", settings.STRIPE_BREAKER_THRESHOLD, settings.STRIPE_BREAKER_COOLDOWN)
+
+    def call(self, operation, idempotency_key=None):
+        """
+        Runs ``operation(options)`` with retries. Errors Stripe will not fix by
+        itself (invalid requests, declined cards) propagate at once; transient
+        ones become PaymentProviderUnavailable when the retries are used up.
+        Writes must pass an ``idempotency_key``; reads are safe to repeat as is.
+        """
+        options = {"idempotency_key": idempotency_key} if idempotency_key else {}
+        # Once per call: the retries of a half-open probe are part of the probe.
+        self.breaker.before_call()
+        for attempt in range(settings.STRIPE_MAX_RETRIES + 1):
+            try:
+                result = operation(options)
+            except stripe.StripeError as error:
+                if not is_transient(error):
+                    # Stripe answered, so it is healthy even if the request was not.
+                    self.breaker.record_success()
+                    raise
+                if attempt == settings.STRIPE_MAX_RETRIES:
+                    self.breaker.record_failure()
+                    raise PaymentProviderUnavailable(
+                        f"Stripe failed {attempt + 1} times: {error}", settings.STRIPE_BREAKER_COOLDOWN,
+                    ) from error
+                logger.warning("Stripe call failed (attempt %s): %s", attempt + 1, error)
+                time.sleep(backoff(attempt))
+            else:
+                self.breaker.record_success()
+                return result
+
+    def create_checkout_session(self, order, user, attempt, expires_at):
+        """
+        Checkout session for an order, payable until ``expires_at``. The
+        idempotency key comes from the order and its payment attempt, so a
+        double submit or a retry after a timeout gets the session Stripe
+        already created instead of a second one.
+        """
+        params = {
+            "payment_method_types": ["card"],
+            "line_items": [{
+                "price_data": {
+                    "currency": order.currency.lower(),
+                    "product_data": {"name": f"Order #{order.id}"},
+                    "unit_amount": int(order.amount * 100),
+                },
+                "quantity": 1,
+            }],
+            "mode": "payment",
+            "success_url": settings.STRIPE_SUCCESS_URL,
+            "cancel_url": settings.STRIPE_CANCEL_URL,
+            "client_reference_id": str(user.id),
+            "metadata": {"order_id": str(order.id)},
+            # Stripe keeps a session payable for 24 hours unless told otherwise.
+            "expires_at": int(expires_at.timestamp()),
+        }
+        return self.call(
+            lambda options: self.client.v1.checkout.sessions.create(params=params, options=options),
+            f"checkout-order-{order.id}-{attempt}",
+        )
+
+    def checkout_sessions(self, created_from, created_to, page_size=100):
+        """Yields, as dicts, the checkout sessions created in ``[created_from, created_to)``, one page per call."""
+        params = {
+            "created": {"gte": int(created_from.timestamp()), "lt": int(created_to.timestamp())},
+            "limit": page_size,
+        }
+        while True:
+            page = self.call(lambda options: self.client.v1.checkout.sessions.list(params=params, options=options))
+            for session in page.data:
+                yield session.to_dict()
+            if not page.has_more or not page.data:
+                return
+            params["starting_after"] = page.data[-1].id
+
+
+@functools.lru_cache(maxsize=1)
+def get_gateway():
+    """Process-wide gateway, so every request reuses its connection pool."""
+    return StripeGateway()
@@ -0,0 +1,89 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from payments.models import Payment
+
+NEW_INDEXES = ["payment_intent_unique", "payment_user_id_idx", "payment_user_created_idx", "payment_status_expiry_idx"]
+
+POPULATE = """
+INSERT INTO payments_payment
+    (user_id, stripe_session_id, stripe_payment_intent, amount, currency, status, created_at, updated_at, expires_at)
+SELECT (%(users)s::bigint[])[1 + n %% %(user_count)s],
+       'cs_bench_' || n,
+       CASE WHEN n %% 10 < 8 THEN 'pi_bench_' || n END,
+       100, 'USD',
+       CASE WHEN n %% 1000 = 0 THEN 'pending' WHEN n %% 10 < 8 THEN 'paid' ELSE 'expired' END,
+       now() - n * interval '1 second', now(), now() - n * interval '1 second' + interval '45 minutes'
+FROM generate_series(1, %(rows)s) AS n
+"""
+
+
+def timed(query, count):
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        query()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+class Command(BaseCommand):
+    help = ("Time the webhook duplicate check, the payment list and the expired-pending sweep on a synthetic "
+            "payments table, with the payment indexes and with only the ones they replaced; all of it is rolled back")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000_000)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--lookups", type=int, default=1000, help="Timed queries per case with the indexes.")
+        parser.add_argument("--baseline-lookups", type=int, default=5,
+                            help="Timed queries per case without them, where each may scan the table.")
+
+    def handle(self, *args, **options):
+        rows, lookups = options["rows"], options["lookups"]
+        with transaction.atomic():
+            started = time.perf_counter()
+            users = get_user_model().objects.bulk_create(
+                get_user_model()(username=f"bench_{n}", email=f"bench_{n}@example.com")
+                for n in range(options["users"])
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(POPULATE, {"users": [user.pk for user in users], "user_count": len(users), "rows": rows})
+                # Check the deferred foreign keys now; pending trigger events would block the index changes.
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                cursor.execute("ANALYZE payments_payment")
+            self.stdout.write(f"Inserted {rows} payments in {time.perf_counter() - started:.0f}s")
+
+            def duplicate_check():
+                n = random.randrange(1, rows)
+                Payment.objects.filter(stripe_payment_intent=f"pi_bench_{n}").exclude(pk=n).exists()
+
+            def payment_list():
+                list(Payment.objects.filter(user=random.choice(users)).order_by("-id")[:20])
+
+            def expired_sweep():
+                list(Payment.objects.filter(status="pending", expires_at__lte=timezone.now())
+                     .values_list("id", flat=True)[:500])
+
+            cases = [("webhook duplicate check", duplicate_check), ("payment list page", payment_list),
+                     ("expired pending sweep", expired_sweep)]
+            results = {name: [timed(query, lookups)] for name, query in cases}
+
+            with connection.cursor() as cursor:
+                for index in NEW_INDEXES:
+                    cursor.execute(f'DROP INDEX "{index}"')
+                cursor.execute('CREATE INDEX "payments_payment_user_id_bench" ON payments_payment (user_id)')
+                cursor.execute("ANALYZE payments_payment")
+            for name, query in cases:
+                results[name].append(timed(query, options["baseline_lookups"]))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'query':<26} {'indexed p50/p95':>20} {'before p50/p95':>22}")
+        for name, ((p50, p95), (base50, base95)) in results.items():
+            self.stdout.write(f"{name:<26} {p50:9.2f} /{p95:7.2f} ms {base50:10.1f} /{base95:8.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"📊 Benchmarked payment lookups at {rows} rows (rolled back)"))
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.commands.benchmark_views import Command as ViewsBenchmark
+from payments.fake_stripe import make_event, signed_event
+from payments.models import StripeEvent
+
+
+class Command(BaseCommand):
+    help = ("Post locally signed Stripe events, each delivered twice like Stripe retries, "
+            "to the webhook under uvicorn and report ack latency and deduplication")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=100)
+        parser.add_argument("--url", help="Webhook URL of a running server; defaults to a local uvicorn.")
+
+    def handle(self, *args, **options):
+        secret = settings.STRIPE_WEBHOOK_SECRET
+        if not secret:
+            raise CommandError("STRIPE_WEBHOOK_SECRET must be set; the server verifies with the same secret.")
+        # Unknown sessions: processing is a no-op, the run measures receiving.
+        events = [
+            make_event("checkout.session.completed", {"id": f"cs_bench_{n}", "metadata": {}})
+            for n in range(options["events"])
+        ]
+        # Both deliveries of an event are adjacent, so they often race each other.
+        deliveries = [delivery for event in events for delivery in [signed_event(event, secret)] * 2]
+        before = StripeEvent.objects.count()
+
+        if options["url"]:
+            stats = asyncio.run(self.load(options["url"], deliveries, options["concurrency"]))
+        else:
+            with ViewsBenchmark().server("") as base_url:
+                stats = asyncio.run(self.load(base_url + "/payments/webhook/", deliveries, options["concurrency"]))
+
+        stored = StripeEvent.objects.count() - before
+        self.stdout.write(
+            f"{len(deliveries)} deliveries  {stats['rps']:8.0f} req/s  p50 {stats['p50']:6.1f} ms  "
+            f"p95 {stats['p95']:6.1f} ms  errors {stats['errors']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {stored} events stored for {len(events)} unique ids"
+        ))
+
+    async def load(self, url, deliveries, concurrency):
+        timings, errors = [], 0
+        queue = iter(deliveries)
+        limits = httpx.Limits(max_connections=concurrency)
+
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            async def worker():
+                nonlocal errors
+                for body, headers in queue:
+                    started = time.perf_counter()
+                    try:
+                        resp = await client.post(url, content=body, headers=headers)
+                        errors += resp.status_code != 200
+                    except httpx.HTTPError:
+                        errors += 1
+                    timings.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        timings.sort()
+        return {
+            "rps": len(deliveries) / elapsed,
+            "p50": timings[len(timings) // 2],
+            "p95": timings[int(len(timings) * 0.95)],
+            "errors": errors,
+        }
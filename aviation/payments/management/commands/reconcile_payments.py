@@ -0,0 +1,56 @@
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from payments.gateway import PaymentProviderUnavailable, get_gateway
+from payments.reconciliation import RECONCILE_CHUNK, read_export, reconcile_payments
+
+
+def day_start(value):
+    day = parse_date(value)
+    if day is None:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+    return timezone.make_aware(datetime.combine(day, dt_time.min))
+
+
+class Command(BaseCommand):
+    help = "Reconcile payments against Stripe checkout sessions from an export file or the Stripe API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?",
+                            help="JSON-lines export of checkout sessions. Without it sessions are paged from Stripe.")
+        parser.add_argument("--since", help="First day (YYYY-MM-DD) of sessions to fetch. "
+                                            "Defaults to STRIPE_RECONCILE_HOURS ago.")
+        parser.add_argument("--until", help="Day (YYYY-MM-DD) to stop before. Defaults to now.")
+        parser.add_argument("--chunk-size", type=int, default=RECONCILE_CHUNK)
+        parser.add_argument("--dry-run", action="store_true", help="Report corrections without applying them.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            if options["path"]:
+                with open(options["path"], "rb") as stream:
+                    report = reconcile_payments(read_export(stream), options["chunk_size"], options["dry_run"])
+            else:
+                until = day_start(options["until"]) if options["until"] else timezone.now()
+                since = (day_start(options["since"]) if options["since"]
+                         else until - timedelta(hours=settings.STRIPE_RECONCILE_HOURS))
+                sessions = get_gateway().checkout_sessions(since, until)
+                report = reconcile_payments(sessions, options["chunk_size"], options["dry_run"])
+        except (OSError, PaymentProviderUnavailable) as exc:
+            raise CommandError(exc)
+        elapsed = time.perf_counter() - started
+
+        for issue in report["issues"]:
+            self.stderr.write(f"payment {issue['payment']}, session {issue['session']}: {issue['issue']}")
+        if report["review"] > len(report["issues"]):
+            self.stderr.write(f"... {report['review'] - len(report['issues'])} more to review")
+        self.stdout.write(self.style.SUCCESS(
+            f"🧾 {report['sessions']} sessions in {elapsed:.1f}s: {report['matched']} matched, "
+            f"{report['paid']} marked paid, {report['expired']} expired, {report['review']} to review, "
+            f"{report['unknown']} unknown, {report['invalid']} invalid"
+        ))
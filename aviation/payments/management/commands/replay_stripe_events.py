@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from payments.models import StripeEvent
+from payments.tasks import enqueue_stripe_event
+from payments.webhooks import process_event
+
+
+class Command(BaseCommand):
+    help = "Process stored Stripe webhook events again, by default every pending or failed one"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--event", action="append", dest="events",
+                            help="Stripe event id to replay (repeatable).")
+        parser.add_argument("--status", action="append", dest="statuses",
+                            choices=[value for value, _ in StripeEvent.STATUS_CHOICES],
+                            help="Replay events in this status (repeatable). Defaults to pending and failed.")
+        parser.add_argument("--limit", type=int, default=1000)
+        parser.add_argument("--force", action="store_true",
+                            help="Apply processed events again; the handlers skip changes already made.")
+        parser.add_argument("--enqueue", action="store_true",
+                            help="Hand the events to Celery instead of processing them here.")
+
+    def handle(self, *args, **options):
+        events = StripeEvent.objects.order_by("received_at")
+        if options["events"]:
+            events = events.filter(event_id__in=options["events"])
+        else:
+            events = events.filter(status__in=options["statuses"] or ["pending", "failed"])
+        pks = list(events.values_list("pk", flat=True)[:options["limit"]])
+        if options["force"]:
+            StripeEvent.objects.filter(pk__in=pks, status="processed").update(status="pending")
+
+        if options["enqueue"]:
+            for pk in pks:
+                enqueue_stripe_event(pk)
+            self.stdout.write(self.style.SUCCESS(f"📨 Enqueued {len(pks)} Stripe events"))
+            return
+
+        failed = 0
+        for pk in pks:
+            try:
+                process_event(pk)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"event {pk}: {exc!r}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Replayed {len(pks)} Stripe events: {len(pks) - failed} processed, {failed} failed"
+        ))
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Django cannot add a constraint concurrently; a partial unique constraint is a
+# unique index, so it is built like one without blocking payment writes.
+CREATE_INTENT_INDEX = """
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS payment_intent_unique
+    ON payments_payment (stripe_payment_intent) WHERE stripe_payment_intent > '';
+"""
+
+DROP_INTENT_INDEX = "DROP INDEX CONCURRENTLY IF EXISTS payment_intent_unique;"
+
+INVALID_INTENT_INDEX = """
+SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+WHERE pg_class.relname = 'payment_intent_unique' AND NOT pg_index.indisvalid;
+"""
+
+
+def prepare_intent_index(apps, schema_editor):
+    """
+    A failed concurrent build leaves an INVALID index that IF NOT EXISTS would keep,
+    so duplicates are reported up front and such a leftover is dropped first.
+    """
+    Payment = apps.get_model('payments', 'Payment')
+    duplicates = list(
+        Payment.objects.filter(stripe_payment_intent__gt='')
+        .values('stripe_payment_intent').annotate(payments=models.Count('id')).filter(payments__gt=1)
+        .values_list('stripe_payment_intent', flat=True)[:10]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Several payments share a Stripe payment intent, so payment_intent_unique cannot be built. "
+            f"Keep one payment per intent and migrate again: {', '.join(duplicates)}"
+        )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(INVALID_INTENT_INDEX)
+        if cursor.fetchone():
+            cursor.execute(DROP_INTENT_INDEX)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('payments', '0003_stripe_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(prepare_intent_index, migrations.RunPython.noop),
+                migrations.RunSQL(CREATE_INTENT_INDEX, DROP_INTENT_INDEX),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='payment',
+                    constraint=models.UniqueConstraint(condition=models.Q(('stripe_payment_intent__gt', '')), fields=('stripe_payment_intent',), name='payment_intent_unique'),
+                ),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['user', '-id'], name='payment_user_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['user', 'created_at'], name='payment_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['status', 'expires_at'], name='payment_status_expiry_idx'),
+        ),
+        # The plain user_id index is a prefix of the composite ones. AlterField would
+        # also re-validate the foreign key over the whole table, so only the index goes.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX CONCURRENTLY IF EXISTS "payments_payment_user_id_f9db060a";',
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "payments_payment_user_id_f9db060a" ON "payments_payment" ("user_id");',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='payment',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
@@ -8,8 +8,10 @@ class Payment(models.Model):
         ("paid", "Paid"),
         ("expired", "Expired"),
         ("failed", "Failed"),
+        ("refunded", "Refunded"),
     ]
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Indexed by payment_user_id_idx, which also serves the newest-first list.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     order = models.ForeignKey("orders.Order", on_delete=models.CASCADE, null=True, blank=True)
     stripe_session_id = models.CharField(max_length=255, unique=True)
     stripe_payment_intent = models.CharField(max_length=255, blank=True, null=True)
@@ -20,8 +22,65 @@ class Payment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     expires_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            # An intent pays for one session; also the webhook's duplicate check.
+            models.UniqueConstraint(
+                fields=["stripe_payment_intent"],
+                condition=models.Q(stripe_payment_intent__gt=""),
+                name="payment_intent_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-id"], name="payment_user_id_idx"),
+            models.Index(fields=["user", "created_at"], name="payment_user_created_idx"),
+            models.Index(fields=["status", "expires_at"], name="payment_status_expiry_idx"),
+        ]
+
     def is_expired(self):
         return self.expires_at and timezone.now() > self.expires_at
 
     def __str__(self):
-        return f"Payment {self.id} - {self.status}"
\ No newline at end of file
+        return f"Payment {self.id} - {self.status}"
+
+class PaymentEvent(models.Model):
+    """A status change made by orders.lifecycle, one row per payment moved."""
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name="events")
+    transition = models.CharField(max_length=20)
+    from_status = models.CharField(max_length=20)
+    to_status = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"Payment {self.payment_id}: {self.from_status} -> {self.to_status} ({self.transition})"
+
+class StripeEvent(models.Model):
+    """A verified Stripe webhook event, stored before it is processed; the event id makes deliveries idempotent."""
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("processed", "Processed"),
+        ("failed", "Failed"),
+    ]
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["received_at"],
+                condition=~models.Q(status="processed"),
+                name="stripe_event_unprocessed_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id} - {self.status}"
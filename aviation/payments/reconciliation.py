@@ -0,0 +1,143 @@
+"""
+Reconciliation of Payment rows against Stripe checkout sessions.
+
+Sessions come from a Stripe export (a JSON-lines file with one session object
+per line) or are paged from the Stripe API. They are matched ``chunk_size`` at
+a time against their payments, found with one indexed query per chunk, and the
+corrections of a chunk are applied with a handful of bulk statements, so memory
+is bounded by the chunk size and the number of queries by the number of chunks.
+
+Only what a lost webhook would have done is corrected, through the same
+orders.lifecycle transitions: a pending payment whose session was paid becomes
+paid, and one whose session expired is expired with its holds released.
+Anything else that disagrees is reported for review.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.flight_import import read_rows
+from orders.lifecycle import EXPIRE, PAY, transition
+from .models import Payment
+
+RECONCILE_CHUNK = 2000
+MAX_REPORTED_ISSUES = 1000
+PAYMENT_FIELDS = ["id", "user_id", "order_id", "status", "amount", "currency", "expires_at",
+                  "stripe_session_id", "stripe_payment_intent"]
+PAID_FIELDS = ["stripe_payment_intent", "amount", "currency", "updated_at"]
+
+
+def read_export(stream):
+    """Yields the session objects of a JSON-lines export, ``None`` for a line that is not one."""
+    for _, row in read_rows(stream, "jsonl"):
+        yield row
+
+
+def session_outcome(session):
+    """"paid" or "expired" once Stripe has settled the session, None while it is open."""
+    if session.get("status") == "complete" and session.get("payment_status") in ("paid", "no_payment_required"):
+        return "paid"
+    if session.get("status") == "expired":
+        return "expired"
+    return None
+
+
+def session_amount(session):
+    return None if session.get("amount_total") is None else Decimal(session["amount_total"]) / 100
+
+
+class PaymentReconciler:
+    def __init__(self, chunk_size=RECONCILE_CHUNK, dry_run=False):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.report = {"sessions": 0, "invalid": 0, "matched": 0, "unknown": 0,
+                       "paid": 0, "expired": 0, "review": 0, "issues": []}
+
+    def run(self, sessions):
+        chunk = {}
+        for session in sessions:
+            self.report["sessions"] += 1
+            if not isinstance(session, dict) or not session.get("id"):
+                self.report["invalid"] += 1
+                continue
+            chunk[session["id"]] = session
+            if len(chunk) >= self.chunk_size:
+                self.reconcile(chunk)
+                chunk = {}
+        if chunk:
+            self.reconcile(chunk)
+        return self.report
+
+    def review(self, session, payment, issue):
+        self.report["review"] += 1
+        if len(self.report["issues"]) < MAX_REPORTED_ISSUES:
+            self.report["issues"].append({"session": session["id"], "payment": payment["id"], "issue": issue})
+
+    def match(self, chunk):
+        """Session id -> payment values, by session id or else by payment intent."""
+        payments = Payment.objects.select_for_update().values(*PAYMENT_FIELDS)
+        matched = {row["stripe_session_id"]: row for row in payments.filter(stripe_session_id__in=list(chunk))}
+        intents = {
+            session["payment_intent"]: session_id for session_id, session in chunk.items()
+            if session_id not in matched and session.get("payment_intent")
+        }
+        if intents:
+            for row in payments.filter(stripe_payment_intent__in=list(intents)):
+                matched[intents[row["stripe_payment_intent"]]] = row
+        return matched
+
+    def reconcile(self, chunk):
+        with transaction.atomic():
+            matched = self.match(chunk)
+            self.report["matched"] += len(matched)
+            self.report["unknown"] += len(chunk) - len(matched)
+            paid, expired = [], []
+            now = timezone.now()
+
+            for session_id, payment in matched.items():
+                session = chunk[session_id]
+                outcome, status = session_outcome(session), payment["status"]
+                amount = session_amount(session)
+                if outcome in ("paid", "expired") and status == "pending" and payment["order_id"] is None:
+                    self.review(session, payment, "Payment has no order.")
+                elif outcome == "paid" and status == "pending":
+                    order_id = (session.get("metadata") or {}).get("order_id")
+                    if (str(payment["user_id"]) != str(session.get("client_reference_id"))
+                            or str(payment["order_id"]) != str(order_id)):
+                        self.review(session, payment, "Session does not match the payment's user and order.")
+                    elif payment["expires_at"] and payment["expires_at"] < now:
+                        self.review(session, payment, "Paid after the hold expired.")
+                    else:
+                        paid.append(Payment(**{
+                            **payment,
+                            "stripe_payment_intent": session.get("payment_intent") or payment["stripe_payment_intent"],
+                            "amount": payment["amount"] if amount is None else amount,
+                            "currency": (session.get("currency") or payment["currency"]).upper(),
+                        }))
+                elif outcome == "paid" and status != "paid":
+                    self.review(session, payment, f"Paid at Stripe but {status} here.")
+                elif outcome == "paid" and amount is not None and amount != payment["amount"]:
+                    self.review(session, payment, f"Paid {amount} at Stripe but {payment['amount']} here.")
+                elif outcome == "expired" and status == "pending":
+                    expired.append(payment)
+                elif outcome != "paid" and status == "paid":
+                    self.review(session, payment, f"Paid here but {session.get('status')} at Stripe.")
+
+            if self.dry_run:
+                self.report["paid"] += len(paid)
+                self.report["expired"] += len(expired)
+                return
+            if paid:
+                # One INSERT ... ON CONFLICT (id) DO UPDATE; bulk_update would build a CASE per row and field.
+                Payment.objects.bulk_create(
+                    paid, update_conflicts=True, unique_fields=["id"], update_fields=PAID_FIELDS,
+                )
+                self.report["paid"] += len(transition(
+                    PAY, [payment.order_id for payment in paid], [payment.pk for payment in paid]
+                ))
+            self.report["expired"] += len(transition(EXPIRE, [payment["order_id"] for payment in expired]))
+
+
+def reconcile_payments(sessions, chunk_size=RECONCILE_CHUNK, dry_run=False):
+    return PaymentReconciler(chunk_size=chunk_size, dry_run=dry_run).run(sessions)
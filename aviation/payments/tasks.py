@@ -0,0 +1,56 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from . import webhooks
+from .gateway import get_gateway
+from .reconciliation import reconcile_payments
+from .models import StripeEvent
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=5)
+def process_stripe_event(self, event_pk):
+    try:
+        webhooks.process_event(event_pk)
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=2 ** self.request.retries * 10)
+
+
+def enqueue_stripe_event(event_pk):
+    """Queues processing; if the broker is unreachable, enqueue_stuck_stripe_events retries later."""
+    try:
+        process_stripe_event.delay(event_pk)
+    except Exception:
+        logger.exception("Could not enqueue Stripe event %s", event_pk)
+
+
+@shared_task
+def enqueue_stuck_stripe_events():
+    """Re-enqueues events still pending a while after they arrived, e.g. if the broker was down."""
+    cutoff = timezone.now() - timedelta(seconds=settings.STRIPE_EVENT_RETRY_SECONDS)
+    pks = list(
+        StripeEvent.objects.filter(status="pending", received_at__lte=cutoff)
+        .order_by("received_at").values_list("pk", flat=True)[:1000]
+    )
+    for pk in pks:
+        process_stripe_event.delay(pk)
+    if pks:
+        logger.info("Re-enqueued %s pending Stripe events", len(pks))
+    return len(pks)
+
+
+@shared_task
+def reconcile_recent_payments():
+    """Reconciles the checkout sessions Stripe created in the last STRIPE_RECONCILE_HOURS."""
+    until = timezone.now()
+    since = until - timedelta(hours=settings.STRIPE_RECONCILE_HOURS)
+    report = reconcile_payments(get_gateway().checkout_sessions(since, until))
+    for issue in report.pop("issues"):
+        logger.warning("Payment %(payment)s, session %(session)s: %(issue)s", issue)
+    logger.info("Reconciled Stripe sessions: %s", report)
+    return report
@@ -0,0 +1,494 @@
+import json
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Ticket
+from core.tests import ConstantQueriesMixin, create_flight
+from orders.booking import book_tickets
+from orders.lifecycle import CANCEL, transition
+from orders.models import Order
+from orders.views import user_orders
+from . import tasks
+from .fake_stripe import fake_stripe_server, make_event, signed_event
+from .gateway import PaymentProviderUnavailable, get_gateway
+from .models import Payment, PaymentEvent, StripeEvent
+from .reconciliation import reconcile_payments
+from .webhooks import process_event
+
+User = get_user_model()
+
+
+class PaymentQueryCountTests(ConstantQueriesMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="payer", email="payer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.grow()
+
+    def grow(self):
+        for _ in range(3):
+            order = Order.objects.create(user=self.user, amount=10, payment_method="card")
+            Payment.objects.create(
+                user=self.user, order=order, amount=10, stripe_session_id=f"cs_{order.id}"
+            )
+
+    def test_payment_list(self):
+        self.assertConstantQueries(lambda: self.client.get(reverse("payments-list"), {"page_size": 100}), self.grow)
+
+
+
+class PaymentIndexTests(TestCase):
+    """Plans for the payment and order hot paths, with statistics from a few thousand rows."""
+
+    def setUp(self):
+        users = User.objects.bulk_create(
+            User(username=f"user{n}", email=f"user{n}@example.com") for n in range(30)
+        )
+        self.user = users[0]
+        orders = Order.objects.bulk_create(
+            Order(user=users[n % 30], amount=10, payment_method="card") for n in range(3000)
+        )
+        now = timezone.now()
+        Payment.objects.bulk_create(
+            Payment(
+                user=order.user, order=order, amount=10, stripe_session_id=f"cs_{order.pk}",
+                stripe_payment_intent=f"pi_{order.pk}" if n % 3 else None,
+                status="paid" if n % 3 else "pending", expires_at=now + timedelta(minutes=n - 100),
+            )
+            for n, order in enumerate(orders)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE payments_payment, orders_order")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def test_duplicate_intent_check_uses_unique_index(self):
+        payment = Payment.objects.exclude(stripe_payment_intent=None).first()
+        qs = Payment.objects.filter(stripe_payment_intent=payment.stripe_payment_intent).exclude(pk=payment.pk)
+        self.assertIn("payment_intent_unique", qs.explain())
+
+    def test_user_lists_need_no_sort(self):
+        plan = Payment.objects.filter(user=self.user).order_by("-id")[:20].explain()
+        self.assertIn("payment_user_id_idx", plan)
+        self.assertNotIn("Sort", plan)
+        plan = user_orders(self.user).order_by("id")[:20].explain()
+        self.assertIn("order_user_id_idx", plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_expired_pending_sweep_uses_status_index(self):
+        qs = Payment.objects.filter(status="pending", expires_at__lte=timezone.now())
+        self.assertIn("payment_status_expiry_idx", qs.explain())
+
+    def test_intent_is_unique_when_set(self):
+        for n, intent in enumerate([None, None, "", ""]):
+            Payment.objects.create(user=self.user, amount=10, stripe_session_id=f"cs_x{n}", stripe_payment_intent=intent)
+        taken = Payment.objects.exclude(stripe_payment_intent=None).values_list("stripe_payment_intent", flat=True)[0]
+        with self.assertRaises(IntegrityError):
+            Payment.objects.create(user=self.user, amount=10, stripe_session_id="cs_dup", stripe_payment_intent=taken)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="payer", email="payer@example.com", password="x")
+        flight = create_flight()
+        self.ticket = Ticket.objects.create(flight=flight, seat_number="1A", price=Decimal("100.00"))
+        self.order = book_tickets(self.user, [self.ticket.id], payment_method="card")
+        self.payment = Payment.objects.create(
+            user=self.user, order=self.order, amount=100, stripe_session_id="cs_1",
+            expires_at=timezone.now() + timedelta(minutes=30),
+        )
+        patcher = mock.patch.object(tasks.process_stripe_event, "delay")
+        self.delay = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def completed(self, event_id="evt_1", **session):
+        return make_event("checkout.session.completed", {
+            "id": "cs_1", "client_reference_id": str(self.user.id), "metadata": {"order_id": str(self.order.id)},
+            "payment_intent": "pi_1", "amount_total": 10000, "currency": "usd", **session,
+        }, event_id=event_id)
+
+    def post(self, event, secret="whsec_test"):
+        body, headers = signed_event(event, secret)
+        return self.client.post(reverse("stripe-webhook"), body, content_type="application/json", headers=headers)
+
+    def test_event_is_stored_and_enqueued_once(self):
+        event = self.completed()
+        for _ in range(3):
+            self.assertEqual(self.post(event).status_code, 200)
+
+        stored = StripeEvent.objects.get()
+        self.assertEqual((stored.event_id, stored.type, stored.status), ("evt_1", event["type"], "pending"))
+        self.delay.assert_called_once_with(stored.pk)
+        # Nothing is applied until the task runs.
+        self.assertEqual(Payment.objects.get().status, "pending")
+
+    def test_bad_signature_is_rejected(self):
+        self.assertEqual(self.post(self.completed(), secret="whsec_other").status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_broker_failure_still_acks(self):
+        self.delay.side_effect = ConnectionError("broker down")
+        self.assertEqual(self.post(self.completed()).status_code, 200)
+        self.assertEqual(StripeEvent.objects.get().status, "pending")
+
+    def test_completed_session_applied_once(self):
+        self.post(self.completed())
+        event = StripeEvent.objects.get()
+        process_event(event.pk)
+        paid_at = Payment.objects.get().updated_at
+        process_event(event.pk)
+
+        payment = Payment.objects.get()
+        self.assertEqual(payment.updated_at, paid_at)
+        self.assertEqual((payment.status, payment.stripe_payment_intent, payment.currency), ("paid", "pi_1", "USD"))
+        self.assertEqual(Order.objects.get().status, "completed")
+        self.assertEqual(Ticket.objects.get().status, Ticket.Status.BOOKED)
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ("processed", 1))
+
+    def test_only_the_paying_attempt_is_marked_paid(self):
+        earlier = Payment.objects.create(
+            user=self.user, order=self.order, amount=100, stripe_session_id="cs_0",
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        self.post(self.completed())
+        process_event(StripeEvent.objects.get().pk)
+
+        self.assertEqual(
+            dict(Payment.objects.values_list("stripe_session_id", "status")), {"cs_0": "expired", "cs_1": "paid"}
+        )
+        self.assertEqual(
+            set(PaymentEvent.objects.values_list("payment_id", "transition")),
+            {(earlier.pk, "expire"), (self.payment.pk, "pay")},
+        )
+        self.assertEqual(Order.objects.get().status, "completed")
+
+    def test_mismatched_session_changes_nothing(self):
+        self.post(self.completed(client_reference_id="999999"))
+        process_event(StripeEvent.objects.get().pk)
+        self.assertEqual(Payment.objects.get().status, "pending")
+        self.assertEqual(StripeEvent.objects.get().status, "processed")
+
+    def test_full_refund_releases_the_seat(self):
+        self.post(self.completed())
+        self.post(make_event("charge.refunded", {"payment_intent": "pi_1", "refunded": False}, event_id="evt_2"))
+        self.post(make_event("charge.refunded", {"payment_intent": "pi_1", "refunded": True}, event_id="evt_3"))
+        for event in StripeEvent.objects.order_by("pk"):
+            process_event(event.pk)
+            if event.event_id == "evt_2":
+                self.assertEqual(Order.objects.get().status, "completed")
+
+        self.assertEqual((Payment.objects.get().status, Order.objects.get().status), ("refunded", "refunded"))
+        self.ticket.refresh_from_db()
+        self.assertEqual((self.ticket.status, self.ticket.order_id), (Ticket.Status.AVAILABLE, None))
+
+    def test_failure_rolls_back_and_is_replayed(self):
+        self.post(self.completed())
+        event = StripeEvent.objects.get()
+        with mock.patch("payments.webhooks.transition", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                process_event(event.pk)
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ("failed", 1))
+        self.assertIn("db down", event.error)
+        self.assertEqual(Payment.objects.get().status, "pending")
+
+        out = StringIO()
+        call_command("replay_stripe_events", stdout=out, stderr=StringIO())
+        self.assertIn("1 processed, 0 failed", out.getvalue())
+        self.assertEqual(Payment.objects.get().status, "paid")
+        self.assertEqual(StripeEvent.objects.get().status, "processed")
+
+    def test_expired_session_releases_holds(self):
+        self.post(make_event("checkout.session.expired", {"id": "cs_1"}))
+        process_event(StripeEvent.objects.get().pk)
+        self.assertEqual(Payment.objects.get().status, "expired")
+        self.assertEqual(Ticket.objects.get().status, Ticket.Status.AVAILABLE)
+
+    def test_late_failure_does_not_undo_payment(self):
+        self.post(self.completed())
+        self.post(make_event("payment_intent.payment_failed", {"id": "pi_1"}, event_id="evt_2"))
+        for event in StripeEvent.objects.order_by("id"):
+            process_event(event.pk)
+        self.assertEqual(Payment.objects.get().status, "paid")
+        self.assertEqual(list(PaymentEvent.objects.values_list("transition", flat=True)), ["pay"])
+
+    def test_failed_attempt_is_recorded(self):
+        Payment.objects.update(stripe_payment_intent="pi_1")
+        self.post(make_event("payment_intent.payment_failed", {"id": "pi_1"}))
+        process_event(StripeEvent.objects.get().pk)
+        self.assertEqual((Payment.objects.get().status, Order.objects.get().status), ("failed", "pending"))
+        self.assertEqual(PaymentEvent.objects.get().transition, "fail")
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class StripeWebhookLoadTests(TestCase):
+    events = 500
+
+    def test_redeliveries_are_stored_and_enqueued_once(self):
+        deliveries = [
+            delivery
+            for n in range(self.events)
+            for delivery in [signed_event(make_event("checkout.session.completed", {"id": f"cs_{n}"}), "whsec_test")] * 2
+        ]
+        url = reverse("stripe-webhook")
+        with mock.patch.object(tasks.process_stripe_event, "delay") as delay:
+            statuses = {
+                self.client.post(url, body, content_type="application/json", headers=headers).status_code
+                for body, headers in deliveries
+            }
+
+        self.assertEqual(statuses, {200})
+        self.assertEqual(StripeEvent.objects.count(), self.events)
+        self.assertEqual(delay.call_count, self.events)
+
+
+
+@override_settings(STRIPE_SECRET_KEY="sk_test_fake", STRIPE_MAX_RETRIES=2, STRIPE_RETRY_BACKOFF=0,
+                   STRIPE_READ_TIMEOUT=0.3, STRIPE_BREAKER_THRESHOLD=2, STRIPE_BREAKER_COOLDOWN=30)
+class CheckoutGatewayTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username="payer", email="payer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        ticket = Ticket.objects.create(flight=create_flight(), seat_number="1A", price=Decimal("100.00"))
+        self.order = book_tickets(self.user, [ticket.id], payment_method="card")
+        self.expires_at = timezone.now() + timedelta(hours=1)
+
+    def serve(self, *failures):
+        server = fake_stripe_server(failures, hang=1.0)
+        url, state = server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        settings = override_settings(STRIPE_API_BASE=url)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        get_gateway.cache_clear()
+        self.addCleanup(get_gateway.cache_clear)
+        return state
+
+    def checkout(self):
+        return self.client.post(reverse("checkout-session-list"), {"order_id": self.order.id}, format="json")
+
+    def test_session_created_with_order_idempotency_key(self):
+        state = self.serve()
+        resp = self.checkout()
+
+        self.assertEqual(resp.status_code, 201)
+        payment = Payment.objects.get()
+        self.assertEqual((payment.stripe_session_id, payment.order_id), (resp.data["id"], self.order.id))
+        self.assertEqual(state["requests"], [("/v1/checkout/sessions", f"checkout-order-{self.order.id}-0")])
+        self.assertEqual(state["sessions"][f"checkout-order-{self.order.id}-0"]["amount_total"], int(self.order.amount * 100))
+
+    def test_only_pending_orders_are_checked_out(self):
+        state = self.serve()
+        transition(CANCEL, [self.order.id])
+
+        self.assertEqual(self.checkout().status_code, 409)
+        self.assertEqual(state["requests"], [])
+        self.assertFalse(Payment.objects.exists())
+
+    def test_double_submit_reuses_session(self):
+        state = self.serve()
+        first = self.checkout()
+        payment = Payment.objects.get()
+        session = state["sessions"][f"checkout-order-{self.order.id}-0"]
+        # The session, the payment and the seat hold all end together.
+        self.assertEqual(session["expires_at"], int(payment.expires_at.timestamp()))
+        self.assertEqual(set(Ticket.objects.values_list("hold_expires_at", flat=True)), {payment.expires_at})
+
+        with mock.patch("payments.views.timezone.now", return_value=timezone.now() + timedelta(minutes=10)):
+            second = self.checkout()
+
+        self.assertEqual(first.data["id"], second.data["id"])
+        self.assertEqual(len(state["sessions"]), 1)
+        self.assertEqual(Payment.objects.get().expires_at, payment.expires_at)
+        self.assertEqual(set(Ticket.objects.values_list("hold_expires_at", flat=True)), {payment.expires_at})
+
+    def test_transient_failures_are_retried(self):
+        state = self.serve(500, 429)
+        self.assertEqual(self.checkout().status_code, 201)
+        self.assertEqual(len(state["requests"]), 3)
+        self.assertEqual(len({key for _, key in state["requests"]}), 1)
+
+    def test_timeout_retry_gets_session_created_by_lost_attempt(self):
+        state = self.serve("hang")
+        resp = self.checkout()
+
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(len(state["requests"]), 2)
+        self.assertEqual(len(state["sessions"]), 1)
+        self.assertEqual(Payment.objects.get().stripe_session_id, resp.data["id"])
+
+    def test_exhausted_retries_leave_no_payment(self):
+        self.serve(500, 502, 503)
+        resp = self.checkout()
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "30")
+        self.assertFalse(Payment.objects.exists())
+
+    def test_invalid_request_is_not_retried(self):
+        state = self.serve(400)
+        with self.assertRaises(stripe.InvalidRequestError):
+            get_gateway().create_checkout_session(self.order, self.user, 0, self.expires_at)
+        self.assertEqual(len(state["requests"]), 1)
+
+    def test_breaker_fails_fast_then_probes(self):
+        state = self.serve(*[500] * 6)
+        gateway = get_gateway()
+        for _ in range(2):
+            with self.assertRaises(PaymentProviderUnavailable):
+                gateway.create_checkout_session(self.order, self.user, 0, self.expires_at)
+        self.assertEqual(len(state["requests"]), 6)
+
+        # Open: no request reaches Stripe.
+        self.assertEqual(self.checkout().status_code, 503)
+        self.assertEqual(len(state["requests"]), 6)
+
+        with mock.patch("payments.gateway.time.time", return_value=time.time() + 31):
+            self.assertEqual(self.checkout().status_code, 201)
+        self.assertEqual(len(state["requests"]), 7)
+        self.assertIsNone(cache.get("payments:breaker:stripe:open_until"))
+
+    def test_probe_retries_transient_errors(self):
+        state = self.serve(*[500] * 7)
+        gateway = get_gateway()
+        for _ in range(2):
+            with self.assertRaises(PaymentProviderUnavailable):
+                gateway.create_checkout_session(self.order, self.user, 0, self.expires_at)
+
+        with mock.patch("payments.gateway.time.time", return_value=time.time() + 31):
+            self.assertEqual(self.checkout().status_code, 201)
+        self.assertEqual(len(state["requests"]), 8)
+        self.assertIsNone(cache.get("payments:breaker:stripe:open_until"))
+
+
+def checkout_session(payment, status="complete", **fields):
+    return {
+        "id": payment.stripe_session_id, "object": "checkout.session", "status": status,
+        "payment_status": "paid" if status == "complete" else "unpaid",
+        "client_reference_id": str(payment.user_id), "metadata": {"order_id": str(payment.order_id)},
+        "payment_intent": f"pi_{payment.pk}", "amount_total": int(payment.amount * 100), "currency": "usd",
+        **fields,
+    }
+
+
+class PaymentReconciliationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="payer", email="payer@example.com", password="x")
+        flight = create_flight()
+        self.payments = {}
+        for n, name in enumerate(["lost_paid", "lost_expired", "paid", "late", "open"]):
+            ticket = Ticket.objects.create(flight=flight, seat_number=f"{n + 1}A", price=Decimal("100.00"))
+            order = book_tickets(self.user, [ticket.id], payment_method="card")
+            self.payments[name] = Payment.objects.create(
+                user=self.user, order=order, amount=100, stripe_session_id=f"cs_{name}",
+                expires_at=timezone.now() + timedelta(minutes=-5 if name == "late" else 30),
+            )
+        Payment.objects.filter(pk=self.payments["paid"].pk).update(status="paid")
+
+    def export(self):
+        sessions = [
+            checkout_session(self.payments["lost_paid"]),
+            checkout_session(self.payments["lost_expired"], status="expired"),
+            checkout_session(self.payments["paid"], status="expired"),
+            checkout_session(self.payments["late"]),
+            checkout_session(self.payments["open"], status="open"),
+            {"id": "cs_unknown", "status": "complete", "payment_status": "paid"},
+        ]
+        return [json.dumps(session) for session in sessions] + ["not json"]
+
+    def reconcile(self, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as export:
+            export.write("\n".join(self.export()))
+            export.flush()
+            out, err = StringIO(), StringIO()
+            call_command("reconcile_payments", export.name, "--chunk-size", "2", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def status(self, name):
+        payment = Payment.objects.select_related("order").get(pk=self.payments[name].pk)
+        return payment.status, payment.order.status, Ticket.objects.filter(order=payment.order).first()
+
+    def test_export_corrections(self):
+        out, err = self.reconcile()
+
+        self.assertIn("7 sessions", out)
+        self.assertIn("5 matched, 1 marked paid, 1 expired, 2 to review, 1 unknown, 1 invalid", out)
+        self.assertIn(f"payment {self.payments['paid'].pk}, session cs_paid: Paid here but expired at Stripe.", err)
+        self.assertIn("session cs_late: Paid after the hold expired.", err)
+
+        status, order_status, ticket = self.status("lost_paid")
+        self.assertEqual((status, order_status, ticket.status), ("paid", "completed", Ticket.Status.BOOKED))
+        self.assertEqual(Payment.objects.get(pk=self.payments["lost_paid"].pk).stripe_payment_intent,
+                         f"pi_{self.payments['lost_paid'].pk}")
+        status, order_status, ticket = self.status("lost_expired")
+        self.assertEqual((status, order_status, ticket), ("expired", "cancelled", None))
+        self.assertEqual(self.status("late")[:2], ("pending", "pending"))
+        self.assertEqual(self.status("open")[:2], ("pending", "pending"))
+
+        # A second run finds nothing left to correct.
+        out, _ = self.reconcile()
+        self.assertIn("0 marked paid, 0 expired, 2 to review", out)
+
+    def test_dry_run_changes_nothing(self):
+        out, _ = self.reconcile("--dry-run")
+        self.assertIn("1 marked paid, 1 expired", out)
+        self.assertEqual(set(Payment.objects.values_list("status", flat=True)), {"pending", "paid"})
+        self.assertFalse(Ticket.objects.filter(status=Ticket.Status.BOOKED).exists())
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_fake", STRIPE_RETRY_BACKOFF=0)
+    def test_sessions_paged_from_stripe(self):
+        with fake_stripe_server() as (url, state), override_settings(STRIPE_API_BASE=url):
+            get_gateway.cache_clear()
+            self.addCleanup(get_gateway.cache_clear)
+            for line in self.export()[:-1]:
+                session = json.loads(line)
+                state["sessions"][session["id"]] = session
+            state["failures"].append(500)
+            now = timezone.now()
+            report = reconcile_payments(get_gateway().checkout_sessions(now - timedelta(days=1), now, page_size=4))
+
+        self.assertEqual((report["sessions"], report["paid"], report["expired"]), (6, 1, 1))
+        self.assertEqual([path for path, _ in state["requests"]], ["/v1/checkout/sessions"] * 3)
+
+
+class PaymentReconciliationVolumeTests(TestCase):
+    # Three chunks of RECONCILE_CHUNK sessions.
+    payments = 6_000
+
+    def test_reconciliation_spanning_chunks(self):
+        user = User.objects.create_user(username="payer", email="payer@example.com", password="x")
+        orders = Order.objects.bulk_create(
+            Order(user=user, amount=100, payment_method="card") for _ in range(self.payments)
+        )
+        expires_at = timezone.now() + timedelta(hours=1)
+        payments = Payment.objects.bulk_create(
+            Payment(user=user, order=order, amount=100, stripe_session_id=f"cs_{order.pk}", expires_at=expires_at)
+            for order in orders
+        )
+        statuses = ["complete", "complete", "expired", "open"]
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as export:
+            for n, payment in enumerate(payments):
+                export.write(json.dumps(checkout_session(payment, status=statuses[n % 4])) + "\n")
+            export.flush()
+            call_command("reconcile_payments", export.name, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(Payment.objects.filter(status="paid").count(), self.payments // 2)
+        self.assertEqual(Order.objects.filter(status="cancelled").count(), self.payments // 4)
@@ -1,11 +1,10 @@
+import json
 import logging
-import traceback
-from decimal import Decimal
 from datetime import timedelta
 
 import stripe
 from django.conf import settings
-from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse
 from django.utils import timezone
 from django.utils.decorators import method_decorator
@@ -17,13 +16,20 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema
 
-from .models import Payment
+from core.pagination import NewestFirstCursorPagination
+from .gateway import PaymentProviderUnavailable, get_gateway
+from .models import Payment, StripeEvent
 from .serializers import CheckoutSessionSerializer, PaymentSerializer
+from .tasks import enqueue_stripe_event
+from orders.booking import extend_order_holds
 from orders.models import Order
 
 logger = logging.getLogger(__name__)
-stripe.api_key = settings.STRIPE_SECRET_KEY
-User = get_user_model()
+
+
+def checkout_lifetime():
+    # Stripe refuses sessions that expire in less than 30 minutes.
+    return timedelta(minutes=max(settings.TICKET_HOLD_MINUTES, 30))
 
 
 @extend_schema(tags=["Payments"])
@@ -31,6 +37,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all().order_by("-id")
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NewestFirstCursorPagination
 
     def get_queryset(self):
         return Payment.objects.filter(user=self.request.user).order_by("-id")
@@ -54,36 +61,39 @@ class CheckoutSessionViewSet(viewsets.ViewSet):
             order = Order.objects.get(id=order_id, user=request.user)
         except Order.DoesNotExist:
             return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": order.currency.lower(),
-                        "product_data": {"name": f"Order #{order.id}"},
-                        "unit_amount": int(order.amount * 100),
-                    },
-                    "quantity": 1,
-                }
-            ],
-            mode="payment",
-            success_url=settings.STRIPE_SUCCESS_URL,
-            cancel_url=settings.STRIPE_CANCEL_URL,
-            client_reference_id=request.user.id,
-            metadata={"order_id": str(order.id)},
-        )
-
-        expires_at = timezone.now() + timedelta(minutes=45)
-        Payment.objects.create(
-            user=request.user,
-            order=order,
-            stripe_session_id=session.id,
-            amount=order.amount,
-            currency=order.currency,
-            status="pending",
-            expires_at=expires_at,
-        )
+        # A paid session for a settled order could not be applied, and its seats may be gone.
+        if order.status != "pending":
+            return Response({"error": f"Order is {order.status}"}, status=status.HTTP_409_CONFLICT)
+
+        now = timezone.now()
+        payments = Payment.objects.filter(order=order)
+        # Every ended attempt (paid, failed or past its hold) moves on to a new idempotency key.
+        attempt = payments.exclude(status="pending", expires_at__gt=now).count()
+        # A double submit must repeat the live attempt's parameters, expiry included;
+        # a new attempt's expiry is whole minutes, so concurrent submits agree on it too.
+        live = payments.filter(status="pending", expires_at__gt=now).order_by("-expires_at").first()
+        expires_at = live.expires_at if live else (now + checkout_lifetime()).replace(second=0, microsecond=0)
+        try:
+            session = get_gateway().create_checkout_session(order, request.user, attempt, expires_at)
+        except PaymentProviderUnavailable as exc:
+            logger.warning("Checkout for order %s failed: %s", order.id, exc)
+            return Response(
+                {"error": "Payment provider is unavailable, please try again shortly"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(exc.retry_after)},
+            )
+
+        with transaction.atomic():
+            # A double submit gets the same session back from Stripe and finds its row here.
+            payment, created = Payment.objects.get_or_create(
+                stripe_session_id=session.id,
+                defaults={
+                    "user": request.user, "order": order, "amount": order.amount,
+                    "currency": order.currency, "status": "pending", "expires_at": expires_at,
+                },
+            )
+            # The seats stay held exactly as long as the session can be paid.
+            if created:
+                extend_order_holds(order, payment.expires_at)
 
         return Response({"id": session.id, "url": session.url}, status=status.HTTP_201_CREATED)
 
@@ -91,90 +101,30 @@ class CheckoutSessionViewSet(viewsets.ViewSet):
 @extend_schema(tags=["Payments"])
 @method_decorator(csrf_exempt, name="dispatch")
 class StripeWebhookView(APIView):
+    """
+    Verifies and stores a Stripe event, then acks at once; payments.tasks applies
+    it. A redelivered event hits the unique event id and is acked without work.
+    """
     serializer_class = None
 
     def post(self, request):
-        logger.info("Webhook triggered!")
         payload = request.body
         sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
 
         try:
             event = stripe.Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
-        except stripe.error.SignatureVerificationError:
+        except (ValueError, stripe.error.SignatureVerificationError):
             logger.error("Signature verification failed")
             return HttpResponse(status=400)
 
         try:
-            event_type = event.get("type")
-            obj = event.get("data", {}).get("object", {})
-
-            if event_type == "checkout.session.completed":
-                session = obj
-                user_id = session.get("client_reference_id")
-                order_id = session.get("metadata", {}).get("order_id")
-
-                if not user_id or not order_id:
-                    logger.warning("Missing client_reference_id or order_id")
-                    return HttpResponse(status=200)
-
-                try:
-                    user = User.objects.get(id=user_id)
-                    order = Order.objects.get(id=order_id, user=user)
-                except (User.DoesNotExist, Order.DoesNotExist):
-                    logger.warning("User or Order not found")
-                    return HttpResponse(status=200)
-
-                payment = Payment.objects.filter(stripe_session_id=session.get("id")).first()
-                if not payment:
-                    logger.warning("Payment not found for session")
-                    return HttpResponse(status=200)
-
-                if payment.expires_at and timezone.now() > payment.expires_at:
-                    payment.status = "expired"
-                    payment.save()
-                    logger.info("Payment expired, ignoring webhook")
-                    return HttpResponse(status=200)
-
-                intent_id = session.get("payment_intent")
-                if intent_id and Payment.objects.filter(stripe_payment_intent=intent_id).exists():
-                    logger.info("Payment already exists, skipping duplicate")
-                    return HttpResponse(status=200)
-
-                payment.status = "paid"
-                payment.stripe_payment_intent = intent_id
-                amount_total = session.get("amount_total")
-                if amount_total is not None:
-                    payment.amount = Decimal(amount_total) / 100
-                currency = session.get("currency")
-                if currency:
-                    payment.currency = currency.upper()
-                payment.save()
-
-                order.status = "completed"
-                order.save()
-                logger.info("Payment and Order updated successfully")
-
-            elif event_type == "payment_intent.payment_failed":
-                intent = obj
-                payment = Payment.objects.filter(stripe_payment_intent=intent.get("id")).first()
-                if payment:
-                    payment.status = "failed"
-                    payment.save()
-                    logger.info("Payment marked as failed")
-
-            elif event_type == "checkout.session.expired":
-                session = obj
-                payment = Payment.objects.filter(stripe_session_id=session.get("id")).first()
-                if payment and payment.status == "pending":
-                    payment.status = "expired"
-                    payment.save()
-                    logger.info("Payment marked as expired from Stripe event")
-
-            else:
-                logger.info(f"Ignored event type: {event_type}")
-
-        except Exception:
-            logger.error("Webhook processing error", exc_info=True)
-            traceback.print_exc()
-
-        return HttpResponse(status=200)
\ No newline at end of file
+            with transaction.atomic():
+                stored = StripeEvent.objects.create(
+                    event_id=event["id"], type=event["type"], payload=json.loads(payload),
+                )
+        except IntegrityError:
+            logger.info("Duplicate Stripe event %s", event["id"])
+            return HttpResponse(status=200)
+
+        enqueue_stripe_event(stored.pk)
+        return HttpResponse(status=200)
@@ -0,0 +1,116 @@
+"""
+Processing of stored Stripe webhook events.
+
+The webhook view only verifies and stores an event; ``process_event`` then
+applies it to Payment, Order and Ticket rows through orders.lifecycle in a
+single transaction with the event and payment rows locked, so a redelivered,
+replayed or concurrently processed event changes nothing twice.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from orders.lifecycle import EXPIRE, FAIL, PAY, REFUND, transition, transition_payments
+from .models import Payment, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+
+def locked_payment(**lookup):
+    return Payment.objects.select_for_update().filter(**lookup).first()
+
+
+def session_completed(session):
+    payment = locked_payment(stripe_session_id=session.get("id"))
+    if payment is None:
+        logger.warning("Payment not found for session %s", session.get("id"))
+        return
+    if payment.status == "paid":
+        return
+    order_id = session.get("metadata", {}).get("order_id")
+    if str(payment.user_id) != str(session.get("client_reference_id")) or str(payment.order_id) != str(order_id):
+        logger.warning("Session %s does not match its payment's user and order", session.get("id"))
+        return
+
+    if payment.is_expired():
+        transition_payments(EXPIRE, [payment.pk])
+        logger.info("Payment expired, ignoring session %s", session.get("id"))
+        return
+
+    intent_id = session.get("payment_intent")
+    if intent_id and Payment.objects.filter(stripe_payment_intent=intent_id).exclude(pk=payment.pk).exists():
+        logger.info("Payment intent %s already recorded, skipping duplicate", intent_id)
+        return
+
+    payment.stripe_payment_intent = intent_id
+    if session.get("amount_total") is not None:
+        payment.amount = Decimal(session["amount_total"]) / 100
+    if session.get("currency"):
+        payment.currency = session["currency"].upper()
+    payment.save(update_fields=["stripe_payment_intent", "amount", "currency", "updated_at"])
+    if not transition(PAY, [payment.order_id], [payment.pk]):
+        logger.warning("Session %s paid for order %s, which is no longer pending", session.get("id"), payment.order_id)
+
+
+def payment_failed(intent):
+    payment = locked_payment(stripe_payment_intent=intent.get("id"))
+    if payment:
+        transition_payments(FAIL, [payment.pk])
+
+
+def session_expired(session):
+    payment = locked_payment(stripe_session_id=session.get("id"))
+    if payment and payment.status == "pending":
+        transition(EXPIRE, [payment.order_id])
+
+
+def charge_refunded(charge):
+    # Partial refunds leave the order and its seats as they are.
+    if not charge.get("refunded"):
+        return
+    payment = locked_payment(stripe_payment_intent=charge.get("payment_intent"))
+    if payment is None:
+        logger.warning("Payment not found for refunded intent %s", charge.get("payment_intent"))
+        return
+    transition(REFUND, [payment.order_id])
+
+
+HANDLERS = {
+    "checkout.session.completed": session_completed,
+    "payment_intent.payment_failed": payment_failed,
+    "checkout.session.expired": session_expired,
+    "charge.refunded": charge_refunded,
+}
+
+
+def process_event(event_pk):
+    """
+    Applies a stored event unless it was already processed and returns it. If
+    the handler raises, its changes are rolled back, the event is marked failed
+    with the error and the exception propagates.
+    """
+    try:
+        with transaction.atomic():
+            event = StripeEvent.objects.select_for_update().get(pk=event_pk)
+            if event.status == "processed":
+                return event
+            handler = HANDLERS.get(event.type)
+            if handler is None:
+                logger.info("Ignored event type: %s", event.type)
+            else:
+                handler(event.payload.get("data", {}).get("object", {}))
+            event.status = "processed"
+            event.error = ""
+            event.attempts += 1
+            event.processed_at = timezone.now()
+            event.save(update_fields=["status", "error", "attempts", "processed_at"])
+            return event
+    except Exception as exc:
+        logger.exception("Stripe event %s processing failed", event_pk)
+        StripeEvent.objects.filter(pk=event_pk).exclude(status="processed").update(
+            status="failed", error=repr(exc), attempts=F("attempts") + 1,
+        )
+        raise